@@ -0,0 +1,272 @@
+"""Cohort aggregates maintained as results are saved.
+
+save_grading_results and save_summary feed every graded attempt into a
+SQLite database of per-attempt scores plus running per-section and
+per-question totals, so rankings and difficulty statistics are index
+lookups instead of a scan over every result folder. Rebuild it from the
+stored results with:
+
+    python analytics.py rebuild
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from grading.engine import percentage
+from results_db import SQLiteStore, as_text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    attempt TEXT PRIMARY KEY, student_id TEXT NOT NULL, total_score REAL, total_max REAL, percentage REAL,
+    graded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS attempts_rank ON attempts (percentage DESC, total_score DESC, attempt);
+CREATE INDEX IF NOT EXISTS attempts_student ON attempts (student_id);
+CREATE TABLE IF NOT EXISTS subject_scores (
+    attempt TEXT NOT NULL, student_id TEXT NOT NULL, subject TEXT NOT NULL, exam_set TEXT NOT NULL,
+    score REAL NOT NULL, max_marks REAL NOT NULL, percentage REAL NOT NULL,
+    PRIMARY KEY (attempt, subject)
+);
+CREATE INDEX IF NOT EXISTS subject_scores_rank
+    ON subject_scores (subject, exam_set, percentage DESC, score DESC, attempt);
+CREATE TABLE IF NOT EXISTS attempt_questions (
+    attempt TEXT NOT NULL, subject TEXT NOT NULL, exam_set TEXT NOT NULL, section_id TEXT NOT NULL,
+    question_id TEXT NOT NULL, score REAL NOT NULL, max_marks REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempt_questions_attempt ON attempt_questions (attempt);
+CREATE TABLE IF NOT EXISTS question_stats (
+    subject TEXT NOT NULL, exam_set TEXT NOT NULL, section_id TEXT NOT NULL, question_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL, score_sum REAL NOT NULL, max_sum REAL NOT NULL, full_marks INTEGER NOT NULL,
+    PRIMARY KEY (subject, exam_set, section_id, question_id)
+);
+CREATE TABLE IF NOT EXISTS section_stats (
+    subject TEXT NOT NULL, exam_set TEXT NOT NULL, section_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL, score_sum REAL NOT NULL, max_sum REAL NOT NULL, score_sq_sum REAL NOT NULL,
+    PRIMARY KEY (subject, exam_set, section_id)
+);
+"""
+
+# Matches the attempts_rank / subject_scores_rank indexes so a page is an index walk
+RANK_ORDER = {"attempts": "percentage DESC, total_score DESC, attempt",
+              "subject_scores": "percentage DESC, score DESC, attempt"}
+QUESTION_SORTS = {
+    "hardest": "score_sum / max_sum ASC",
+    "easiest": "score_sum / max_sum DESC",
+    "attempts": "attempts DESC",
+}
+
+
+def number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class CohortAnalytics(SQLiteStore):
+    """The aggregates database; see the module docstring."""
+
+    schema = SCHEMA
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def record_grading(self, attempt: str, student_id: str, results: list, exam_sets: Optional[dict] = None):
+        """Replace the attempt's per-question scores and move the running totals by the difference."""
+        exam_sets = exam_sets or {}
+        questions = []
+        for r in results:
+            section_id = as_text(r.get("section_id"))
+            subject = as_text(r.get("subject")) or ("maths" if section_id == "maths-mcq" else "english")
+            exam_set = as_text(r.get("exam_set")) or exam_sets.get(subject, "A")
+            questions.append((subject, exam_set, section_id, as_text(r.get("question_id")),
+                              number(r.get("final_score")), number(r.get("max_marks"))))
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = conn.execute(
+                    "SELECT subject, exam_set, section_id, question_id, score, max_marks FROM attempt_questions "
+                    "WHERE attempt = ?", (attempt,)
+                ).fetchall()
+                self._apply(conn, old, -1)
+                conn.execute("DELETE FROM attempt_questions WHERE attempt = ?", (attempt,))
+                conn.executemany(
+                    "INSERT INTO attempt_questions (attempt, subject, exam_set, section_id, question_id, score, max_marks) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", [(attempt, *q) for q in questions]
+                )
+                self._apply(conn, questions, 1)
+
+                subjects = {}
+                for subject, exam_set, _, _, score, max_marks in questions:
+                    totals = subjects.setdefault(subject, [exam_set, 0.0, 0.0])
+                    totals[1] += score
+                    totals[2] += max_marks
+                conn.execute("DELETE FROM subject_scores WHERE attempt = ?", (attempt,))
+                conn.executemany(
+                    "INSERT INTO subject_scores (attempt, student_id, subject, exam_set, score, max_marks, percentage) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(attempt, student_id, subject, exam_set, score, max_marks, percentage(score, max_marks))
+                     for subject, (exam_set, score, max_marks) in subjects.items()]
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, questions: list, sign: int):
+        sections = {}
+        for subject, exam_set, section_id, question_id, score, max_marks in questions:
+            conn.execute(
+                "INSERT INTO question_stats (subject, exam_set, section_id, question_id, attempts, score_sum, max_sum, full_marks) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (subject, exam_set, section_id, question_id) DO UPDATE SET "
+                "attempts = attempts + excluded.attempts, score_sum = score_sum + excluded.score_sum, "
+                "max_sum = max_sum + excluded.max_sum, full_marks = full_marks + excluded.full_marks",
+                (subject, exam_set, section_id, question_id, sign, sign * score, sign * max_marks,
+                 sign * int(max_marks > 0 and score >= max_marks))
+            )
+            totals = sections.setdefault((subject, exam_set, section_id), [0.0, 0.0])
+            totals[0] += score
+            totals[1] += max_marks
+        for (subject, exam_set, section_id), (score, max_marks) in sections.items():
+            conn.execute(
+                "INSERT INTO section_stats (subject, exam_set, section_id, attempts, score_sum, max_sum, score_sq_sum) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (subject, exam_set, section_id) DO UPDATE SET "
+                "attempts = attempts + excluded.attempts, score_sum = score_sum + excluded.score_sum, "
+                "max_sum = max_sum + excluded.max_sum, score_sq_sum = score_sq_sum + excluded.score_sq_sum",
+                (subject, exam_set, section_id, sign, sign * score, sign * max_marks, sign * score * score)
+            )
+
+    def record_summary(self, attempt: str, summary: dict):
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO attempts (attempt, student_id, total_score, total_max, percentage, graded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (attempt, summary.get("student_id", ""), number(summary.get("total_score")),
+                 number(summary.get("total_max")), number(summary.get("percentage")), summary.get("graded_at"))
+            )
+
+    def leaderboard(self, subject: Optional[str] = None, exam_set: Optional[str] = None,
+                    limit: int = 50, offset: int = 0) -> dict:
+        """Attempts ranked by percentage, overall or within one subject (and exam set)."""
+        if subject:
+            where, params = "WHERE subject = ?", [subject]
+            if exam_set:
+                where, params = where + " AND exam_set = ?", params + [exam_set]
+            table = "subject_scores"
+            columns = "attempt, student_id, subject, exam_set, score, max_marks, percentage"
+        else:
+            where, params, table = "", [], "attempts"
+            columns = "attempt, student_id, total_score AS score, total_max AS max_marks, percentage"
+        total = self._query(f"SELECT COUNT(*) AS n FROM {table} {where}", tuple(params))[0]["n"]
+        rows = self._query(
+            f"SELECT {columns} FROM {table} {where} ORDER BY {RANK_ORDER[table]} LIMIT ? OFFSET ?",
+            tuple(params + [limit, offset])
+        )
+        for i, row in enumerate(rows):
+            row["rank"] = offset + i + 1
+        return {"total": total, "offset": offset, "limit": limit, "results": rows}
+
+    def student_rank(self, student_id: str) -> list:
+        """The rank of each of the student's attempts overall and within each subject."""
+        ranks = []
+        for row in self._query("SELECT * FROM attempts WHERE student_id = ? ORDER BY graded_at", (student_id,)):
+            row["rank"] = 1 + self._query(
+                "SELECT COUNT(*) AS n FROM attempts WHERE percentage > ? OR (percentage = ? AND total_score > ?)",
+                (row["percentage"], row["percentage"], row["total_score"])
+            )[0]["n"]
+            row["of"] = self._query("SELECT COUNT(*) AS n FROM attempts")[0]["n"]
+            row["subjects"] = []
+            for subject in self._query("SELECT * FROM subject_scores WHERE attempt = ?", (row["attempt"],)):
+                subject["rank"] = 1 + self._query(
+                    "SELECT COUNT(*) AS n FROM subject_scores WHERE subject = ? AND exam_set = ? AND "
+                    "(percentage > ? OR (percentage = ? AND score > ?))",
+                    (subject["subject"], subject["exam_set"], subject["percentage"], subject["percentage"], subject["score"])
+                )[0]["n"]
+                row["subjects"].append(subject)
+            ranks.append(row)
+        return ranks
+
+    def sections(self, subject: Optional[str] = None, exam_set: Optional[str] = None) -> list:
+        where, params = self._filters(subject=subject, exam_set=exam_set)
+        rows = self._query(f"SELECT * FROM section_stats {where} ORDER BY subject, exam_set, section_id", params)
+        for row in rows:
+            n = row["attempts"]
+            mean = row["score_sum"] / n if n else 0
+            row["mean_score"] = round(mean, 3)
+            row["mean_percentage"] = percentage(row["score_sum"], row["max_sum"])
+            row["stddev"] = round(max(row["score_sq_sum"] / n - mean * mean, 0) ** 0.5, 3) if n else 0
+            del row["score_sq_sum"]
+        return rows
+
+    def questions(self, subject: Optional[str] = None, exam_set: Optional[str] = None,
+                  section_id: Optional[str] = None, sort: str = "hardest", limit: int = 50, offset: int = 0) -> dict:
+        where, params = self._filters(subject=subject, exam_set=exam_set, section_id=section_id)
+        where += (" AND" if where else "WHERE") + " attempts > 0 AND max_sum > 0"
+        total = self._query(f"SELECT COUNT(*) AS n FROM question_stats {where}", params)[0]["n"]
+        rows = self._query(
+            f"SELECT * FROM question_stats {where} ORDER BY {QUESTION_SORTS[sort]}, question_id LIMIT ? OFFSET ?",
+            params + (limit, offset)
+        )
+        for row in rows:
+            # Classical difficulty index: mean fraction of the marks earned (lower is harder)
+            row["difficulty"] = round(row["score_sum"] / row["max_sum"], 3)
+            row["full_marks_rate"] = round(row["full_marks"] / row["attempts"], 3)
+        return {"total": total, "offset": offset, "limit": limit, "results": rows}
+
+    @staticmethod
+    def _filters(**filters) -> tuple:
+        clauses = [(f"{column} = ?", value) for column, value in filters.items() if value]
+        if not clauses:
+            return "", ()
+        return "WHERE " + " AND ".join(c for c, _ in clauses), tuple(v for _, v in clauses)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            for table in ("attempts", "subject_scores", "attempt_questions", "question_stats", "section_stats"):
+                conn.execute(f"DELETE FROM {table}")
+
+
+def exam_sets_of(summary: dict) -> dict:
+    """{"english": "A", ...} from a summary's ["english:A", ...] list."""
+    return dict(item.split(":", 1) for item in summary.get("exam_sets", []) if ":" in item)
+
+
+def rebuild(analytics: CohortAnalytics) -> int:
+    import storage
+
+    analytics.clear()
+    count = 0
+    for attempt, summary, grading in storage.iter_results():
+        analytics.record_grading(attempt, summary.get("student_id", ""), grading, exam_sets_of(summary))
+        analytics.record_summary(attempt, summary)
+        count += 1
+    return count
+
+
+def main(argv=None) -> int:
+    import storage
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recompute every aggregate from the stored results")
+    parser.parse_args(argv)
+
+    started = time.monotonic()
+    count = rebuild(storage.cohort_analytics or CohortAnalytics(storage.ANALYTICS_DB_PATH))
+    print(f"rebuilt aggregates from {count} attempts ({time.monotonic() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
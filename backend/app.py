@@ -1,22 +1,135 @@
-from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, Form, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import os
 import time
 
 from storage import (
-    get_student_folder, create_student_folder, init_student_files,
-    save_answer_row, save_incident_row, read_answers,
-    save_grading_results, save_summary, read_summary, read_grading
+    folder_registry, get_student_folder, create_student_folder, init_student_files, read_answers,
+    read_answer_history, save_answer_row, save_grading_results, save_summary, read_summary, read_grading,
+    cohort_analytics
 )
-from grading import (
-    grade_mcq, grade_keyword_with_ai_fallback, grade_speaking_with_ai,
-    load_rubric, load_question_bank, get_correct_option, get_passage_context
+from grading import lookup_question, get_engine, build_summary, grading_cache
+from proctoring import (
+    detector_pool, DetectorBusy, analyze_upload, analyze_encoded_frame, verify_upload, unpack_frames
 )
-from proctoring import load_image, analyze_frame, verify_single_face
+from writer import row_writer
+from incidents import IncidentAggregator
+from heartbeat import heartbeat_monitor
+from shared_state import shared_state
+from grading_queue import grading_queue
+from analytics import QUESTION_SORTS
+from metrics import METRICS_ENABLED, Gauge, Histogram, MetricsMiddleware, registry
+from transcription import transcription_pool, attach_speech, read_transcripts, TRANSCRIPTION_FINISH_WAIT
+from uploads import (
+    DEFAULT_AUDIO_SECTION, UploadTooLarge, OffsetMismatch, audio_file_name, upload_chunks, save_stream, append_stream,
+    upload_offset
+)
+
+
+logger = logging.getLogger(__name__)
+
 
-app = FastAPI()
+def persist_episode(student_id: str, episode: dict):
+    folder = get_student_folder(student_id)
+    if not folder:
+        folder = create_student_folder(student_id)
+    row_writer.save_incident(folder, episode)
+
+
+incident_aggregator = IncidentAggregator(persist_episode, shared_state)
+
+
+# /stream/{student_id} sockets open on this worker
+active_streams = set()
+
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "How late the 1s housekeeping tick wakes up")
+Gauge("websocket_connections", "WebSockets open on this worker", ("kind",),
+      fn=lambda: {("heartbeat",): heartbeat_monitor.active(), ("stream",): len(active_streams)})
+Gauge("grading_queue_depth", "Answers being graded in the background", fn=lambda: grading_queue.pending())
+Gauge("detector_pending_frames", "Frames running or queued for analysis", fn=lambda: detector_pool.pending)
+Gauge("writer_pending_rows", "Rows queued for the background writer", fn=lambda: row_writer.pending())
+if transcription_pool is not None:
+    Gauge("transcription_pending", "Recordings queued or being transcribed", fn=lambda: transcription_pool.pending)
+
+
+async def sweep_incidents():
+    await shared_state.call(incident_aggregator.sweep)
+
+
+async def prune_grading():
+    grading_queue.prune()
+
+
+async def expire_heartbeats():
+    for student_id, websocket, unexpected in await shared_state.call(heartbeat_monitor.sweep):
+        # The session has already ended; its socket is closed even if the incident cannot be recorded
+        try:
+            if unexpected:
+                await shared_state.call(
+                    incident_aggregator.observe,
+                    student_id, "disconnect", details=f"no heartbeat for {heartbeat_monitor.timeout:g}s"
+                )
+        except Exception:
+            logger.exception("Failed to record the heartbeat timeout of %s", student_id)
+        try:
+            await websocket.close(code=1001)
+        except Exception:
+            pass
+
+
+async def housekeeping():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(1)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - 1))
+        for step in (sweep_incidents, prune_grading, expire_heartbeats):
+            try:
+                await step()
+            except Exception:
+                # e.g. "database is locked" from shared state; one failed step must not end housekeeping
+                logger.exception("Housekeeping step %s failed", step.__name__)
+
+
+# Heavy models and clients load on first use; list them here to load them before serving instead
+WARMUPS = {"grading": lambda: get_engine().warmup(), "proctoring": detector_pool.warmup}
+if transcription_pool is not None:
+    WARMUPS["transcription"] = transcription_pool.warmup
+STARTUP_WARMUP = [name.strip() for name in os.getenv("STARTUP_WARMUP", "").split(",") if name.strip()]
+for name in STARTUP_WARMUP:
+    if name not in WARMUPS:
+        raise ValueError(f"Unknown STARTUP_WARMUP entry: {name} (expected {', '.join(WARMUPS)})")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    folder_registry.load()
+    for name in STARTUP_WARMUP:
+        await asyncio.to_thread(WARMUPS[name])
+    await row_writer.start()
+    sweeper = asyncio.create_task(housekeeping())
+    yield
+    sweeper.cancel()
+    grading_queue.stop()
+    if not shared_state.shared:
+        # With shared state other workers still own these episodes; their sweep closes them
+        incident_aggregator.close_all()
+    await row_writer.stop()
+    detector_pool.shutdown()
+    if transcription_pool is not None:
+        transcription_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +166,7 @@ class StartExamPayload(BaseModel):
 
 class FinishExamPayload(BaseModel):
     student_id: str
+    force_regrade: bool = False
 
 
 @app.get("/")
@@ -60,6 +174,14 @@ def root():
     return {"status": "active", "service": "adira-exam-platform"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format; rendered on the event loop so gauges read loop-owned state safely."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/start_exam")
 async def start_exam(payload: StartExamPayload):
     student_id = payload.student_id.strip()
@@ -67,7 +189,9 @@ async def start_exam(payload: StartExamPayload):
         raise HTTPException(status_code=400, detail="Student ID required")
     
     folder = create_student_folder(student_id)
+    await row_writer.flush()
     init_student_files(folder)
+    grading_queue.discard(student_id)
     return {"success": True, "folder": str(folder.name)}
 
 
@@ -83,10 +207,9 @@ async def save_answer(payload: AnswerPayload):
     
     subject = "maths" if payload.section_id == "maths-mcq" else "english"
     exam_set = payload.exam_set or "A"
-    qb = load_question_bank(subject, exam_set)
-    correct_option = get_correct_option(qb, payload.section_id, payload.question_id)
+    correct_option = lookup_question(subject, exam_set, payload.section_id, payload.question_id)["correct_option"]
     
-    save_answer_row(folder, {
+    answer = {
         "student_id": student_id,
         "exam_set": exam_set,
         "subject": subject,
@@ -97,7 +220,14 @@ async def save_answer(payload: AnswerPayload):
         "correct_answer": correct_option or "",
         "selected_option": payload.selected_option or "",
         "spoken_answer": payload.answer or ""
-    })
+    }
+    if shared_state.shared:
+        # /finish_exam may run on another worker, whose flush cannot reach this worker's queue;
+        # the answer is on disk before the client hears back
+        await asyncio.to_thread(save_answer_row, folder, answer)
+    else:
+        row_writer.save_answer(folder, answer)
+    grading_queue.submit(student_id, answer)
     return {"success": True}
 
 
@@ -107,33 +237,89 @@ async def save_incident(payload: IncidentPayload):
     if not student_id:
         raise HTTPException(status_code=400, detail="Student ID required")
     
-    folder = get_student_folder(student_id)
-    if not folder:
-        folder = create_student_folder(student_id)
-    
-    save_incident_row(folder, {
-        "incident_type": payload.incident_type,
-        "details": payload.details or "",
-        "question_context": payload.question_context or ""
-    })
+    await shared_state.call(
+        incident_aggregator.observe,
+        student_id, payload.incident_type,
+        details=payload.details or "", question_context=payload.question_context or ""
+    )
     return {"success": True}
 
 
-@app.post("/save_audio")
-async def save_audio(file: UploadFile = File(...), student_id: str = Form(""), question_id: str = Form("")):
+def audio_target(student_id: str, question_id: str, section_id: str):
     student_id = student_id.strip()
     if not student_id:
         raise HTTPException(status_code=400, detail="Student ID required")
+    try:
+        name = audio_file_name(question_id, section_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     
     folder = get_student_folder(student_id)
     if not folder:
         folder = create_student_folder(student_id)
-    
-    audio_file = folder / f"speaking_{question_id}.webm"
-    contents = await file.read()
-    with open(audio_file, "wb") as f:
-        f.write(contents)
-    return {"success": True, "file": str(audio_file.name)}
+    return folder / name
+
+
+def queue_transcription(audio_file) -> bool:
+    """Hand a finished recording to the transcription workers; False if it is left for backfill."""
+    return transcription_pool is not None and transcription_pool.submit(audio_file)
+
+
+@app.post("/save_audio")
+async def save_audio(file: UploadFile = File(...), student_id: str = Form(""), question_id: str = Form(""),
+                     section_id: str = Form(DEFAULT_AUDIO_SECTION)):
+    audio_file = audio_target(student_id, question_id, section_id)
+    try:
+        await save_stream(upload_chunks(file), audio_file)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Recording too large")
+    return {"success": True, "file": str(audio_file.name), "transcription_queued": queue_transcription(audio_file)}
+
+
+@app.get("/save_audio/{student_id}/{question_id}")
+async def audio_upload_offset(student_id: str, question_id: str, section_id: str = DEFAULT_AUDIO_SECTION):
+    return upload_offset(audio_target(student_id, question_id, section_id))
+
+
+@app.put("/save_audio/{student_id}/{question_id}")
+async def save_audio_chunk(request: Request, student_id: str, question_id: str, offset: int = 0, final: bool = False,
+                           section_id: str = DEFAULT_AUDIO_SECTION):
+    """Resumable upload: PUT each chunk at ?offset=, with &final=true on the last one."""
+    audio_file = audio_target(student_id, question_id, section_id)
+    try:
+        progress = await append_stream(request.stream(), audio_file, offset, final)
+    except OffsetMismatch as exc:
+        raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": exc.offset})
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Recording too large")
+    if final:
+        progress["transcription_queued"] = queue_transcription(audio_file)
+    return {"success": True, "file": audio_file.name, **progress}
+
+
+GRADING_JOBS = "grading_jobs"
+# A job still marked as grading after this long is assumed to have died with its worker
+GRADING_JOB_STALE_AFTER = 600
+
+
+def claim_grading_job(student_id: str) -> bool:
+    now = time.time()
+
+    def apply(job):
+        if job and job["status"] == "grading" and now - job["started_at"] < GRADING_JOB_STALE_AFTER:
+            return job, False
+        return {"status": "grading", "started_at": now, "finished_at": None}, True
+
+    return shared_state.transact(GRADING_JOBS, student_id, apply)
+
+
+def finish_grading_job(student_id: str, **fields):
+    def apply(job):
+        job = job or {"started_at": None}
+        job.update(fields, finished_at=time.time())
+        return job, None
+
+    shared_state.transact(GRADING_JOBS, student_id, apply)
 
 
 @app.post("/finish_exam")
@@ -146,91 +332,51 @@ async def finish_exam(payload: FinishExamPayload):
     if not folder:
         raise HTTPException(status_code=404, detail="No exam data found for student")
     
-    answers = read_answers(folder)
-    if not answers:
-        return {"success": True, "message": "No answers to grade"}
-    
-    rubric_cache = {}
-    qb_cache = {}
+    if not await shared_state.call(claim_grading_job, student_id):
+        raise HTTPException(status_code=409, detail="Grading already in progress")
     
-    def get_rubric(subject: str, exam_set: str):
-        key = f"{subject}_{exam_set}"
-        if key not in rubric_cache:
-            rubric_cache[key] = load_rubric(subject, exam_set)
-        return rubric_cache[key]
-    
-    def get_qb(subject: str, exam_set: str):
-        key = f"{subject}_{exam_set}"
-        if key not in qb_cache:
-            qb_cache[key] = load_question_bank(subject, exam_set)
-        return qb_cache[key]
-    
-    grading_results = []
-    total_score = 0
-    total_max = 0
-    exam_sets_used = set()
-    
-    for ans in answers:
-        section_id = ans.get("section_id", "")
-        question_id = ans.get("question_id", "")
-        selected_option = ans.get("selected_option", "")
-        spoken_answer = ans.get("spoken_answer", "")
-        correct_answer = ans.get("correct_answer", "")
-        question_prompt = ans.get("question_prompt", "")
-        subject = ans.get("subject", "english")
-        exam_set = ans.get("exam_set", "A")
-        exam_sets_used.add(f"{subject}:{exam_set}")
-        
-        rubric = get_rubric(subject, exam_set)
-        question_bank = get_qb(subject, exam_set)
-        
-        section_rubric = rubric.get("sections", {}).get(section_id, {})
-        question_rubric = section_rubric.get("questions", {}).get(question_id, {})
-        grading_type = question_rubric.get("grading_type") or section_rubric.get("grading_type", "auto")
+    # Whatever happens from here on, the claim is released; a failed finish can be retried at once
+    job = {"status": "failed", "error": "Grading was interrupted"}
+    try:
+        await shared_state.call(heartbeat_monitor.finish, student_id)
+        await shared_state.call(incident_aggregator.close_student, student_id)
+        await row_writer.flush()
+        answers = read_answers(folder)
+        if not answers:
+            job = {"status": "done", "percentage": None}
+            return {"success": True, "message": "No answers to grade"}
         
-        result = {"question_id": question_id, "section_id": section_id, "grading_type": grading_type}
+        if transcription_pool is not None:
+            # The last recordings usually land just before finishing; give their timing features a moment
+            await transcription_pool.wait(folder, TRANSCRIPTION_FINISH_WAIT)
+        answers = attach_speech(folder, answers)
         
-        if grading_type == "auto":
-            grade = grade_mcq(selected_option, correct_answer)
-            result.update(grade)
-        elif grading_type == "keyword":
-            passage_context = get_passage_context(question_bank, section_id, question_id)
-            grade = grade_keyword_with_ai_fallback(spoken_answer, question_rubric, question_prompt, passage_context)
-            result.update(grade)
-        elif grading_type == "ai_rubric":
-            speaking_rubric = section_rubric.get("rubric", {})
-            grade = grade_speaking_with_ai(spoken_answer, speaking_rubric, question_prompt)
-            result["ai_score"] = grade.get("ai_score")
-            result["max_marks"] = grade.get("max_marks", 40)
-            result["feedback"] = grade.get("feedback", "")
-            result["breakdown"] = grade.get("breakdown", {})
-            result["auto_score"] = grade.get("ai_score")
+        if payload.force_regrade:
+            grading_queue.discard(student_id)
+            grading_results = await get_engine().grade_answers(answers, use_cache=False)
         else:
-            if selected_option and correct_answer:
-                grade = grade_mcq(selected_option, correct_answer)
-            else:
-                grade = {"auto_score": 0, "max_marks": 1, "feedback": "Could not grade"}
-            result.update(grade)
+            # Answers were graded as they were saved; this mostly looks results up
+            grading_results = await grading_queue.collect(student_id, answers)
+        save_grading_results(folder, grading_results)
         
-        final_score = result.get("auto_score") or result.get("ai_score") or 0
-        result["final_score"] = final_score
-        total_score += final_score
-        total_max += result.get("max_marks", 1)
-        grading_results.append(result)
-    
-    save_grading_results(folder, grading_results)
-    
-    summary = {
-        "student_id": student_id,
-        "exam_sets": list(exam_sets_used),
-        "total_score": total_score,
-        "total_max": total_max,
-        "percentage": round((total_score / total_max * 100), 1) if total_max > 0 else 0,
-        "graded_at": datetime.now().isoformat()
-    }
-    save_summary(folder, summary)
+        summary = build_summary(student_id, answers, grading_results)
+        save_summary(folder, summary)
+        job = {"status": "done", "percentage": summary["percentage"]}
+    except Exception as exc:
+        job["error"] = str(exc)
+        raise
+    finally:
+        await shared_state.call(finish_grading_job, student_id, **job)
     
-    return {"success": True, "total_score": total_score, "total_max": total_max, "percentage": summary["percentage"]}
+    return {"success": True, "total_score": summary["total_score"], "total_max": summary["total_max"], "percentage": summary["percentage"]}
+
+
+@app.get("/grading/status/{student_id}")
+async def grading_status(student_id: str):
+    job = shared_state.get(GRADING_JOBS, student_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No grading job for student")
+    return {"student_id": student_id, **job}
 
 
 @app.get("/results/{student_id}")
@@ -249,11 +395,139 @@ async def get_results(student_id: str):
     return result
 
 
+def analytics_store():
+    if cohort_analytics is None:
+        raise HTTPException(status_code=503, detail="Cohort analytics are disabled")
+    return cohort_analytics
+
+
+@app.get("/cohort/leaderboard")
+async def cohort_leaderboard(subject: Optional[str] = None, exam_set: Optional[str] = None,
+                             limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    return analytics_store().leaderboard(subject, exam_set, limit, offset)
+
+
+@app.get("/cohort/students/{student_id}")
+async def cohort_student(student_id: str):
+    attempts = analytics_store().student_rank(student_id)
+    if not attempts:
+        raise HTTPException(status_code=404, detail="No graded attempts for student")
+    return {"student_id": student_id, "attempts": attempts}
+
+
+@app.get("/cohort/sections")
+async def cohort_sections(subject: Optional[str] = None, exam_set: Optional[str] = None):
+    return {"sections": analytics_store().sections(subject, exam_set)}
+
+
+@app.get("/cohort/questions")
+async def cohort_questions(subject: Optional[str] = None, exam_set: Optional[str] = None,
+                           section_id: Optional[str] = None, sort: str = "hardest",
+                           limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    if sort not in QUESTION_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(QUESTION_SORTS)}")
+    return analytics_store().questions(subject, exam_set, section_id, sort, limit, offset)
+
+
+@app.get("/results/{student_id}/answers")
+async def get_answers(student_id: str, history: bool = False):
+    folder = get_student_folder(student_id)
+    if not folder:
+        raise HTTPException(status_code=404, detail="No results found")
+    
+    await row_writer.flush()
+    result = {"student_id": student_id, "answers": read_answers(folder)}
+    if history:
+        result["history"] = read_answer_history(folder)
+    return result
+
+
+@app.get("/results/{student_id}/transcripts")
+async def get_transcripts(student_id: str):
+    folder = get_student_folder(student_id)
+    if not folder:
+        raise HTTPException(status_code=404, detail="No results found")
+    transcripts = {}
+    for (section_id, question_id), transcript in read_transcripts(folder).items():
+        transcripts.setdefault(section_id, {})[question_id] = transcript
+    return {"student_id": student_id, "transcripts": transcripts}
+
+
+@app.get("/grading/cache")
+async def grading_cache_stats():
+    if grading_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **grading_cache.stats()}
+
+
+def detector_busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="Frame analysis is at capacity, retry shortly", headers={"Retry-After": "1"})
+
+
 @app.post("/analyze")
-async def analyze(file: UploadFile = File(...)):
-    image_rgb = load_image(await file.read())
+async def analyze(file: UploadFile = File(...), student_id: str = Form("")):
+    contents = await file.read()
+    student_id = student_id.strip()
     ts = int(time.time() * 1000)
-    return analyze_frame(image_rgb, ts)
+    try:
+        result = await detector_pool.run(analyze_upload, contents, ts, student_id)
+    except DetectorBusy:
+        raise detector_busy()
+    if student_id:
+        await shared_state.call(incident_aggregator.observe_frame, student_id, result)
+    return result
+
+
+MAX_BATCH_FRAMES = 64
+
+
+@app.post("/analyze_batch")
+async def analyze_batch(request: Request):
+    """Analyze many frames per request.
+
+    Accepts either multipart form data with repeated `files` parts (and an
+    optional `student_id` and `timestamp` part per file), or an
+    `application/octet-stream` body in the packed format of
+    proctoring.pack_frames. Timestamps are capture times in ms; frames
+    without one are stamped on arrival. Each student's frames are analyzed
+    one after another in the order sent.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        files = form.getlist("files")
+        student_ids = form.getlist("student_id")
+        timestamps = form.getlist("timestamp")
+        frames = []
+        for i, upload in enumerate(files):
+            student_id = student_ids[i] if i < len(student_ids) else (student_ids[0] if student_ids else "")
+            try:
+                captured_at = int(timestamps[i]) if i < len(timestamps) and timestamps[i] else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid timestamp for frame {i}")
+            frames.append((student_id, await upload.read(), captured_at))
+    else:
+        try:
+            frames = unpack_frames(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if not frames:
+        raise HTTPException(status_code=400, detail="No frames provided")
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FRAMES} frames per batch")
+
+    ts = int(time.time() * 1000)
+    try:
+        results = await detector_pool.map_ordered(
+            lambda frame: analyze_encoded_frame(frame[0], frame[1], frame[2] or ts), frames, key=lambda frame: frame[0]
+        )
+    except DetectorBusy:
+        raise detector_busy()
+    for result in results:
+        if result.get("student_id"):
+            await shared_state.call(incident_aggregator.observe_frame, result["student_id"], result)
+    return {"count": len(results), "results": results}
 
 
 @app.post("/train_face")
@@ -262,8 +536,10 @@ async def train_face(file: UploadFile = File(...), student_id: str = Form("")):
     if not student_id:
         return {"success": False, "message": "Student ID required"}
 
-    image_rgb = load_image(await file.read())
-    result = verify_single_face(image_rgb)
+    try:
+        result = await detector_pool.run(verify_upload, await file.read())
+    except DetectorBusy:
+        raise detector_busy()
     
     if result["success"]:
         result["message"] = f"Face verified for {student_id}"
@@ -271,19 +547,99 @@ async def train_face(file: UploadFile = File(...), student_id: str = Form("")):
     return result
 
 
-active_connections = {}
+@app.websocket("/stream/{student_id}")
+async def frame_stream(websocket: WebSocket, student_id: str):
+    """Persistent per-student frame channel.
+
+    The client sends encoded frames as binary messages and receives one JSON
+    analysis result per analyzed frame. Only the newest frame is kept: if
+    analysis falls behind, older unanalyzed frames are dropped and counted.
+    """
+    await websocket.accept()
+    active_streams.add(websocket)
+    state = {"frame": None, "dropped": 0}
+    frame_ready = asyncio.Event()
+
+    async def analyze_latest():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame, state["frame"] = state["frame"], None
+            ts = int(time.time() * 1000)
+            try:
+                result = await detector_pool.run(analyze_encoded_frame, student_id, frame, ts)
+            except DetectorBusy:
+                state["dropped"] += 1
+                continue
+            except Exception:
+                # Answer the frame anyway; a silently dead analyzer would leave the socket accepting frames forever
+                logger.exception("Frame analysis failed for %s", student_id)
+                result = {"student_id": student_id, "error": "Frame analysis failed", "timestamp": ts}
+            else:
+                try:
+                    await shared_state.call(incident_aggregator.observe_frame, student_id, result)
+                except Exception:
+                    logger.exception("Failed to record frame incidents for %s", student_id)
+            result["dropped"] = state["dropped"]
+            try:
+                await websocket.send_json(result)
+            except (WebSocketDisconnect, RuntimeError, OSError):
+                # The client is gone; the receive loop sees the disconnect and cleans up
+                return
+
+    analyzer = asyncio.create_task(analyze_latest())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("bytes")
+            if not frame:
+                continue
+            if state["frame"] is not None:
+                state["dropped"] += 1
+            state["frame"] = frame
+            frame_ready.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        analyzer.cancel()
+        active_streams.discard(websocket)
+
 
 @app.websocket("/heartbeat/{student_id}")
 async def websocket_heartbeat(websocket: WebSocket, student_id: str):
     await websocket.accept()
-    active_connections[student_id] = {"ws": websocket, "last_ping": time.time()}
+    await shared_state.call(heartbeat_monitor.connect, student_id, websocket)
+    close_code = None
     
     try:
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                active_connections[student_id]["last_ping"] = time.time()
+                await shared_state.call(heartbeat_monitor.ping, student_id)
                 await websocket.send_text("pong")
-    except WebSocketDisconnect:
-        if student_id in active_connections:
-            del active_connections[student_id]
+    except WebSocketDisconnect as exc:
+        close_code = exc.code
+    finally:
+        if await shared_state.call(heartbeat_monitor.disconnect, student_id, websocket):
+            await shared_state.call(
+                incident_aggregator.observe, student_id, "disconnect", details=f"socket closed (code {close_code})"
+            )
+
+
+@app.get("/status")
+async def all_status(status: Optional[str] = None):
+    return {
+        "timeout": heartbeat_monitor.timeout,
+        "counts": heartbeat_monitor.counts(),
+        "students": heartbeat_monitor.all_statuses(status)
+    }
+
+
+@app.get("/status/{student_id}")
+async def student_status(student_id: str):
+    status = heartbeat_monitor.status(student_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No heartbeat seen for student")
+    return status
@@ -0,0 +1,94 @@
+"""Compare frame throughput of /analyze (one frame per request) and /analyze_batch.
+
+Runs in-process through FastAPI's TestClient by default, or against a
+running server with --url:
+
+    python benchmarks/bench_analyze_batch.py --frames 256 --batch-size 32
+    python benchmarks/bench_analyze_batch.py --url http://localhost:8000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proctoring import pack_frames  # noqa: E402
+
+
+def make_frame(seed: int, width: int = 640, height: int = 480) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:] = rng.integers(40, 200, size=3, dtype=np.uint8)
+    cv2.circle(image, (width // 2, height // 2), height // 4, (180, 160, 140), -1)
+    noise = rng.integers(0, 20, size=image.shape, dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", cv2.add(image, noise), [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return encoded.tobytes()
+
+
+def make_client(url: str):
+    if url:
+        import httpx
+        return httpx.Client(base_url=url, timeout=60)
+    from fastapi.testclient import TestClient
+    from app import app
+    return TestClient(app)
+
+
+def run_single(client, frames: list) -> float:
+    start = time.perf_counter()
+    for student_id, frame in frames:
+        response = client.post("/analyze", files={"file": ("frame.jpg", frame, "image/jpeg")})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch_multipart(client, frames: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        chunk = frames[i:i + batch_size]
+        files = [("files", (f"{sid}.jpg", frame, "image/jpeg")) for sid, frame in chunk]
+        data = {"student_id": [sid for sid, _ in chunk]}
+        response = client.post("/analyze_batch", files=files, data=data)
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch_packed(client, frames: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        body = pack_frames(frames[i:i + batch_size])
+        response = client.post("/analyze_batch", content=body, headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--students", type=int, default=16)
+    parser.add_argument("--url", default="", help="benchmark a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    frames = [(f"student{i % args.students}", make_frame(i)) for i in range(args.frames)]
+    with make_client(args.url) as client:
+        # Warm up the model so the first timed run doesn't pay for initialization
+        run_single(client, frames[:2])
+        timings = {
+            "/analyze (1 frame/request)": run_single(client, frames),
+            f"/analyze_batch multipart ({args.batch_size}/request)": run_batch_multipart(client, frames, args.batch_size),
+            f"/analyze_batch packed ({args.batch_size}/request)": run_batch_packed(client, frames, args.batch_size),
+        }
+
+    baseline = next(iter(timings.values()))
+    for name, elapsed in timings.items():
+        print(f"{name:45s} {args.frames / elapsed:8.1f} frames/s  {elapsed / args.frames * 1000:7.2f} ms/frame"
+              f"  x{baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
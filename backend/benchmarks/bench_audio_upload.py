@@ -0,0 +1,121 @@
+"""Load-test /save_audio and check the server's memory stays bounded.
+
+Starts uvicorn on a throwaway RESULTS_DIR, then has --clients concurrent
+uploaders send a --size-mb recording each, either as one multipart POST
+or as resumable PUT chunks. Reports throughput and the server's peak RSS
+(VmHWM, Linux only) above its idle baseline; holding whole recordings in
+memory would cost about clients x size.
+
+    python benchmarks/bench_audio_upload.py --clients 32 --size-mb 20
+    python benchmarks/bench_audio_upload.py --mode chunked --chunk-kb 512
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+async def upload_multipart(client: httpx.AsyncClient, path: Path, student_id: str):
+    with open(path, "rb") as f:
+        res = await client.post("/save_audio", data={"student_id": student_id, "question_id": "bench"},
+                                files={"file": ("speaking.webm", f, "audio/webm")})
+    res.raise_for_status()
+
+
+async def upload_chunked(client: httpx.AsyncClient, path: Path, student_id: str, chunk_bytes: int):
+    size = path.stat().st_size
+    offset = 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_bytes)
+            res = await client.put(f"/save_audio/{student_id}/bench",
+                                   params={"offset": offset, "final": str(offset + len(chunk) >= size).lower()},
+                                   content=chunk)
+            res.raise_for_status()
+            offset = res.json()["offset"]
+
+
+async def run_load(url: str, path: Path, clients: int, mode: str, chunk_bytes: int) -> float:
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        started = time.perf_counter()
+        if mode == "multipart":
+            jobs = [upload_multipart(client, path, f"bench-audio-{i}") for i in range(clients)]
+        else:
+            jobs = [upload_chunked(client, path, f"bench-audio-{i}", chunk_bytes) for i in range(clients)]
+        await asyncio.gather(*jobs)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--mode", choices=["multipart", "chunked"], default="multipart")
+    parser.add_argument("--chunk-kb", type=int, default=512, help="PUT chunk size in chunked mode")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-audio-"))
+    recording = workdir / "recording.webm"
+    with open(recording, "wb") as f:
+        for _ in range(int(args.size_mb)):
+            f.write(os.urandom(1024 * 1024))
+        f.write(os.urandom(int((args.size_mb % 1) * 1024 * 1024)))
+
+    port = free_port()
+    env = dict(os.environ, RESULTS_DIR=str(workdir / "results"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            try:
+                httpx.get(url + "/", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        baseline = memory_kb(server.pid, "VmRSS")
+        elapsed = asyncio.run(run_load(url, recording, args.clients, args.mode, args.chunk_kb * 1024))
+        peak = memory_kb(server.pid, "VmHWM")
+
+        saved = list((workdir / "results").glob("bench-audio-*/speaking_bench.webm"))
+        assert len(saved) == args.clients and all(p.stat().st_size == recording.stat().st_size for p in saved)
+
+        total_mb = args.clients * args.size_mb
+        print(f"{args.clients} clients x {args.size_mb:g} MB ({args.mode}): {elapsed:.2f}s, {total_mb / elapsed:.1f} MB/s")
+        print(f"server RSS idle {baseline / 1024:.0f} MB, peak {peak / 1024:.0f} MB "
+              f"(+{(peak - baseline) / 1024:.0f} MB for {total_mb:g} MB uploaded)")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Time the cohort analytics queries on a large synthetic cohort.
+
+Feeds --attempts graded attempts through CohortAnalytics.record_grading
+and record_summary (the same calls save_grading_results/save_summary
+make), then times the queries behind the /cohort endpoints, including a
+deep leaderboard page and the per-student rank lookup, and prints their
+query plans.
+
+    python benchmarks/bench_cohort_queries.py --attempts 50000
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import CohortAnalytics  # noqa: E402
+
+SECTIONS = [("maths", "maths-mcq", 20, 1), ("english", "reading", 10, 2), ("english", "speaking", 4, 5)]
+
+
+def grading(rng: random.Random, exam_set: str) -> list:
+    rows = []
+    for subject, section_id, count, max_marks in SECTIONS:
+        for q in range(count):
+            rows.append({"question_id": f"{section_id}-{q}", "section_id": section_id, "subject": subject,
+                         "exam_set": exam_set, "max_marks": max_marks,
+                         "final_score": min(max_marks, max(0, round(rng.gauss(max_marks * 0.6, max_marks * 0.4))))})
+    return rows
+
+
+def populate(analytics: CohortAnalytics, attempts: int) -> float:
+    rng = random.Random(7)
+    started = time.perf_counter()
+    for n in range(attempts):
+        attempt, student_id = f"s{n:06d}_2026-10-17", f"s{n:06d}"
+        results = grading(rng, rng.choice("AB"))
+        score = sum(r["final_score"] for r in results)
+        total = sum(r["max_marks"] for r in results)
+        analytics.record_grading(attempt, student_id, results)
+        analytics.record_summary(attempt, {"student_id": student_id, "total_score": score, "total_max": total,
+                                           "percentage": round(score / total * 100, 2),
+                                           "graded_at": f"2026-10-17T10:{n // 60 % 60:02d}:{n % 60:02d}"})
+    return time.perf_counter() - started
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    analytics = CohortAnalytics(Path(tempfile.mkdtemp(prefix="bench-cohort-")) / "analytics.sqlite3")
+    elapsed = populate(analytics, args.attempts)
+    print(f"recorded {args.attempts} attempts in {elapsed:.1f}s "
+          f"({elapsed / args.attempts * 1000:.2f} ms per graded attempt)")
+
+    middle = f"s{args.attempts // 2:06d}"
+    queries = {
+        "leaderboard first page": lambda: analytics.leaderboard(limit=50),
+        "leaderboard page at 90%": lambda: analytics.leaderboard(limit=50, offset=args.attempts * 9 // 10),
+        "subject leaderboard": lambda: analytics.leaderboard("maths", "A", limit=50),
+        "student rank": lambda: analytics.student_rank(middle),
+        "section stats": lambda: analytics.sections(),
+        "hardest questions": lambda: analytics.questions(sort="hardest", limit=20),
+    }
+    for name, fn in queries.items():
+        print(f"{name:26s} {timed(fn, args.repeat):8.2f} ms")
+
+    print("\nquery plans:")
+    conn = analytics._connection()
+    for sql in ("SELECT * FROM attempts ORDER BY percentage DESC, total_score DESC, attempt LIMIT 50",
+                "SELECT * FROM subject_scores WHERE subject = 'maths' AND exam_set = 'A' "
+                "ORDER BY percentage DESC, score DESC, attempt LIMIT 50",
+                "SELECT COUNT(*) FROM attempts WHERE percentage > 50 OR (percentage = 50 AND total_score > 10)"):
+        print(" ", sql[:60], "->", "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Per-frame decode cost of the old PIL path against decode_image.
+
+Decodes the same camera-sized JPEG repeatedly with:
+  - legacy: PIL.Image.open(BytesIO) -> np.array -> cv2.cvtColor (what load_image did)
+  - full:   decode_image at full size (imdecode on the buffer, in-place RGB swap)
+  - reduced: decode_image at FRAME_DECODE_WIDTH (libjpeg DCT-scaled decoding)
+
+and reports the median time and the Python-visible memory allocated per
+frame (tracemalloc; numpy and OpenCV arrays are included).
+
+    python benchmarks/bench_frame_decode.py --width 640 --height 480 --frames 500
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proctoring import FRAME_DECODE_WIDTH, decode_image  # noqa: E402
+
+
+def load_image_legacy(contents: bytes):
+    from PIL import Image
+    return cv2.cvtColor(np.array(Image.open(io.BytesIO(contents))), cv2.COLOR_BGR2RGB)
+
+
+def make_frame(width: int, height: int, seed: int = 5) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:] = rng.integers(40, 200, size=3, dtype=np.uint8)
+    cv2.ellipse(image, (width // 2, height // 2), (width // 6, height // 4), 0, 0, 360, (150, 170, 200), -1)
+    noise = rng.integers(0, 20, size=image.shape, dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", cv2.add(image, noise), [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return encoded.tobytes()
+
+
+def measure(decode, frame: bytes, frames: int) -> tuple:
+    decode(frame)
+    samples = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        decode(frame)
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    peaks, totals = [], []
+    for _ in range(20):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        image = decode(frame)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        totals.append(current - before)
+        del image
+    tracemalloc.stop()
+    return statistics.median(samples) * 1000, statistics.median(peaks), statistics.median(totals), decode(frame).shape
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--decode-width", type=int, default=FRAME_DECODE_WIDTH or 320)
+    args = parser.parse_args()
+    cv2.setNumThreads(1)
+
+    frame = make_frame(args.width, args.height)
+    print(f"{args.width}x{args.height} JPEG, {len(frame)} bytes, {args.frames} decodes")
+    for name, decode in (("legacy (PIL)", load_image_legacy),
+                         ("full", lambda buf: decode_image(memoryview(buf), 0)),
+                         (f"reduced ({args.decode_width})", lambda buf: decode_image(memoryview(buf), args.decode_width))):
+        ms, peak, kept, shape = measure(decode, frame, args.frames)
+        print(f"{name:16s} {ms:6.2f} ms/frame  peak {peak / 1024:7.1f} KiB  result {kept / 1024:7.1f} KiB  {shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare per-answer and passage-batched keyword LLM fallbacks.
+
+Grades a cohort whose reading answers all miss their keywords (so every
+one needs the LLM) through GradingEngine against a fake async client
+with a fixed per-request latency, once with batching off and once on.
+Reports LLM requests, prompt characters sent (roughly 4 per token) and
+wall time for grading every student at once. --malformed makes the fake
+answer batch prompts with junk to exercise the single-item fallback.
+
+    python benchmarks/bench_keyword_batching.py --students 50 --passages 3 --questions 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["GRADING_CACHE_ENABLED"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from grading import rubric_loader  # noqa: E402
+from grading.engine import GradingEngine  # noqa: E402
+
+PASSAGE = "The river town grew around its mill, and the mill grew around the river. " * 40
+
+
+class FakeClient:
+    def __init__(self, latency: float, malformed: bool):
+        self.latency = latency
+        self.malformed = malformed
+        self.requests = 0
+        self.prompt_chars = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, temperature, max_tokens):
+        prompt = messages[0]["content"]
+        self.requests += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.latency)
+        items = len(re.findall(r"^ANSWER \d+$", prompt, re.M))
+        if not items:
+            content = json.dumps({"score": 1, "feedback": "ok"})
+        elif self.malformed:
+            content = "I graded them all, they are fine."
+        else:
+            content = json.dumps({"results": [{"id": n, "score": 1, "feedback": "ok"} for n in range(1, items + 1)]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def write_exam(root: Path, passages: int, questions: int):
+    (root / "rubrics").mkdir()
+    (root / "QuestionBank").mkdir()
+    rubric = {"sections": {"reading": {"grading_type": "keyword", "questions": {}}}}
+    bank = {"sections": [{"id": "reading", "references": [], "questions": []}]}
+    for p in range(passages):
+        bank["sections"][0]["references"].append({"id": f"p{p}", "title": f"Passage {p}", "text": PASSAGE})
+        for q in range(questions):
+            question_id = f"p{p}q{q}"
+            bank["sections"][0]["questions"].append({"id": question_id, "referenceId": f"p{p}"})
+            rubric["sections"]["reading"]["questions"][question_id] = {
+                "max_marks": 2, "ideas": [{"id": "main", "marks": 2, "required_any": ["millstone", "weir"]}]
+            }
+    (root / "rubrics" / "english_setA.json").write_text(json.dumps(rubric))
+    (root / "QuestionBank" / "english_exam_A.json").write_text(json.dumps(bank))
+    rubric_loader.RUBRICS_DIR = root / "rubrics"
+    rubric_loader.QUESTION_BANK_DIR = root / "QuestionBank"
+
+
+def answers_for(student: int, passages: int, questions: int) -> list:
+    return [{"subject": "english", "exam_set": "A", "section_id": "reading", "question_id": f"p{p}q{q}",
+             "question_prompt": f"What does passage {p} say about question {q}?",
+             "spoken_answer": f"student {student} thinks the town depended on the river for question {q}"}
+            for p in range(passages) for q in range(questions)]
+
+
+async def run(size: int, args) -> dict:
+    client = FakeClient(args.latency, args.malformed)
+    engine = GradingEngine(client=client)
+    engine.batcher.size = size
+    cohort = [answers_for(s, args.passages, args.questions) for s in range(args.students)]
+    started = time.perf_counter()
+    graded = await asyncio.gather(*(engine.grade_answers(answers) for answers in cohort))
+    elapsed = time.perf_counter() - started
+    assert all(r["feedback"].startswith("[AI]") for results in graded for r in results)
+    return {"requests": client.requests, "prompt_chars": client.prompt_chars, "seconds": elapsed,
+            **engine.batcher.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--passages", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=4, help="keyword questions per passage")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake LLM request")
+    parser.add_argument("--malformed", action="store_true")
+    args = parser.parse_args()
+    write_exam(Path(tempfile.mkdtemp(prefix="bench-batching-")), args.passages, args.questions)
+
+    items = args.students * args.passages * args.questions
+    print(f"{items} keyword fallbacks ({args.students} students x {args.passages} passages x {args.questions} questions)")
+    for label, size in (("per answer", 1), (f"batched ({args.batch_size})", args.batch_size)):
+        r = asyncio.run(run(size, args))
+        print(f"{label:14s} requests={r['requests']:5d}  prompt chars={r['prompt_chars']:9d}  "
+              f"wall={r['seconds']:.2f}s  batch requests={r['batches']}  single-item fallbacks={r['fallbacks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark grade_keyword against the previous per-term substring scan.
+
+Run from the backend directory:
+
+    python benchmarks/bench_keyword_matcher.py --ideas 40 --terms 12 --words 1500
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from grading.grader import grade_keyword  # noqa: E402
+
+
+def grade_keyword_legacy(answer: str, rubric_config: dict) -> dict:
+    """grade_keyword as it was before rubrics were compiled (reference baseline)."""
+    if not answer:
+        return {"auto_score": 0, "max_marks": rubric_config.get("max_marks", 1), "feedback": "No answer provided"}
+
+    answer_lower = answer.lower()
+    total_score = 0
+    max_marks = rubric_config.get("max_marks", 1)
+    feedback_parts = []
+
+    correct_option = rubric_config.get("correct_option", "").lower()
+    if correct_option:
+        wrong_options = [opt for opt in ["a", "b", "c", "d"] if opt != correct_option]
+        for wrong in wrong_options:
+            if f"option {wrong}" in answer_lower or f"letter {wrong}" in answer_lower or (f" {wrong} " in f" {answer_lower} " and len(wrong) == 1):
+                return {"auto_score": 0, "max_marks": max_marks,
+                        "feedback": f"Wrong option selected. Correct answer: {correct_option.upper()}"}
+
+    for idea in rubric_config.get("ideas", []):
+        idea_marks = idea.get("marks", 1)
+        if any(b.lower() in answer_lower for b in idea.get("banned", []) if b):
+            feedback_parts.append(f"[{idea.get('id')}] Contains misconception - 0 marks")
+            continue
+        if any(r.lower() in answer_lower for r in idea.get("required_any", []) if r):
+            score = idea_marks
+            if sum(1 for s in idea.get("supporting", []) if s and s.lower() in answer_lower) > 0:
+                score = min(score + 0.25, idea_marks)
+            total_score += score
+            feedback_parts.append(f"[{idea.get('id')}] Matched - {score} marks")
+        else:
+            feedback_parts.append(f"[{idea.get('id')}] Not matched - 0 marks")
+
+    return {"auto_score": min(total_score, max_marks), "max_marks": max_marks,
+            "feedback": "; ".join(feedback_parts) if feedback_parts else "Graded by keyword matching"}
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def make_rubric(rng: random.Random, vocab: list, ideas: int, terms: int) -> dict:
+    def phrase():
+        return " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 3)))
+
+    return {
+        "max_marks": ideas,
+        "ideas": [
+            {
+                "id": f"idea{i}",
+                "marks": 1,
+                "required_any": [phrase() for _ in range(terms)],
+                "banned": [phrase() for _ in range(max(1, terms // 4))],
+                "supporting": [phrase() for _ in range(max(1, terms // 2))],
+            }
+            for i in range(ideas)
+        ],
+    }
+
+
+def timeit(fn, answers, rubric, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for answer in answers:
+            fn(answer, rubric)
+        best = min(best, time.perf_counter() - start)
+    return best / len(answers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ideas", type=int, default=40)
+    parser.add_argument("--terms", type=int, default=12, help="required_any terms per idea")
+    parser.add_argument("--words", type=int, default=1500, help="words per synthetic transcript")
+    parser.add_argument("--answers", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = make_vocabulary(rng, 2000)
+    rubric = make_rubric(rng, vocab, args.ideas, args.terms)
+    answers = [" ".join(rng.choice(vocab) for _ in range(args.words)) for _ in range(args.answers)]
+
+    for answer in answers:
+        assert grade_keyword(answer, rubric) == grade_keyword_legacy(answer, rubric)
+
+    legacy = timeit(grade_keyword_legacy, answers, rubric, args.repeat)
+    compiled = timeit(grade_keyword, answers, rubric, args.repeat)
+    term_count = sum(len(i["required_any"]) + len(i["banned"]) + len(i["supporting"]) for i in rubric["ideas"])
+
+    print(f"rubric: {args.ideas} ideas, {term_count} terms; transcript: {args.words} words")
+    print(f"legacy   per answer: {legacy * 1000:8.3f} ms")
+    print(f"compiled per answer: {compiled * 1000:8.3f} ms")
+    print(f"speedup: {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Overhead of the metrics instrumentation.
+
+Reports the per-call cost of the primitives on the hot paths (a counter
+increment, a histogram observation, a timed block), the added latency of
+MetricsMiddleware on a trivial FastAPI route served over the in-process
+ASGI transport, and how long one /metrics scrape takes to render.
+
+    python benchmarks/bench_metrics.py --calls 200000 --requests 3000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import Counter, Histogram, MetricsMiddleware, registry  # noqa: E402
+
+
+def per_call(fn, calls: int) -> float:
+    """Median microseconds per call over five rounds."""
+    rounds = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        rounds.append((time.perf_counter() - started) / calls * 1e6)
+    return statistics.median(rounds)
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/status/{student_id}")
+    async def status(student_id: str):
+        return {"student_id": student_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def request_latency(requests: int) -> tuple:
+    """Median microseconds per request (plain, instrumented), alternating the two apps."""
+    clients = [httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app(instrumented)), base_url="http://bench")
+               for instrumented in (False, True)]
+    samples = ([], [])
+    for i in range(200 + requests):
+        for client, kept in zip(clients, samples):
+            started = time.perf_counter()
+            await client.get(f"/status/s{i}")
+            if i >= 200:
+                kept.append(time.perf_counter() - started)
+    for client in clients:
+        await client.aclose()
+    return tuple(statistics.median(kept) * 1e6 for kept in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    counter = Counter("bench_events_total", "benchmark counter", ("kind",)).labels("a")
+    histogram = Histogram("bench_seconds", "benchmark histogram", ("stage",)).labels("a")
+
+    def timed():
+        with histogram.time():
+            pass
+
+    baseline = per_call(lambda: None, args.calls)
+    print(f"{'empty call':22s} {baseline:6.3f} us")
+    for name, fn in (("counter.inc", counter.inc),
+                     ("histogram.observe", lambda: histogram.observe(0.003)),
+                     ("histogram.time block", timed)):
+        print(f"{name:22s} {per_call(fn, args.calls) - baseline:6.3f} us")
+
+    plain, instrumented = asyncio.run(request_latency(args.requests))
+    print(f"request without middleware {plain:7.1f} us")
+    print(f"request with middleware    {instrumented:7.1f} us  (+{instrumented - plain:.1f} us)")
+
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"render /metrics            {(time.perf_counter() - started) * 1000:7.2f} ms  "
+          f"({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
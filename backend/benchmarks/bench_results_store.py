@@ -0,0 +1,106 @@
+"""Compare the files and SQLite results backends.
+
+Builds the same synthetic cohort with each backend through the storage
+functions the app uses, then times per-row answer writes and two cohort
+scans: every attempt's summary, and every summary plus its grading rows. Runs on a
+throwaway RESULTS_DIR; the scan is measured with a warm page cache.
+
+    python benchmarks/bench_results_store.py --attempts 5000 --answers 40
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="bench-results-"))
+os.environ["RESULTS_DIR"] = str(WORKDIR)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage  # noqa: E402
+from results_db import ResultsDB  # noqa: E402
+
+
+def answer(student_id: str, q: int) -> dict:
+    return {
+        "student_id": student_id, "exam_set": "A", "subject": "english", "section_id": "reading",
+        "question_id": f"q{q}", "question_number": q, "question_prompt": "Explain the passage " * 4,
+        "correct_answer": "", "spoken_answer": "the author argues that " * 6
+    }
+
+
+def grading(q: int) -> dict:
+    return {"question_id": f"q{q}", "section_id": "reading", "grading_type": "keyword", "max_marks": 2,
+            "auto_score": 1, "ai_score": None, "final_score": 1, "feedback": "Matched"}
+
+
+def build_cohort(attempts: int, answers: int) -> list:
+    latencies = []
+    for i in range(attempts):
+        student_id = f"s{i:06d}"
+        folder = storage.RESULTS_DIR / f"{student_id}_2025-01-01"
+        folder.mkdir(exist_ok=True)
+        storage.init_student_files(folder)
+        for q in range(answers):
+            started = time.perf_counter()
+            storage.save_answer_row(folder, answer(student_id, q))
+            latencies.append(time.perf_counter() - started)
+        storage.save_grading_results(folder, [grading(q) for q in range(answers)])
+        storage.save_summary(folder, {"student_id": student_id, "total_score": answers, "total_max": answers * 2,
+                                      "percentage": 50.0, "section_scores": {}})
+    return latencies
+
+
+def scan_cohort() -> tuple:
+    started = time.perf_counter()
+    results = storage.iter_results()
+    rows = sum(len(grading) for _, _, grading in results)
+    return time.perf_counter() - started, len(results), rows
+
+
+def scan_summaries() -> float:
+    started = time.perf_counter()
+    storage.iter_summaries()
+    return time.perf_counter() - started
+
+
+def run(backend: str, args) -> dict:
+    for entry in WORKDIR.iterdir():
+        shutil.rmtree(entry) if entry.is_dir() else entry.unlink()
+    storage.results_store = ResultsDB(WORKDIR / "results.sqlite3") if backend == "sqlite" else None
+    latencies = build_cohort(args.attempts, args.answers)
+    scan = min(scan_cohort()[0] for _ in range(args.repeat))
+    summaries = min(scan_summaries() for _ in range(args.repeat))
+    _, attempts, rows = scan_cohort()
+    assert attempts == args.attempts and rows == args.attempts * args.answers
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1e6,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "scan": scan,
+        "summaries": summaries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--answers", type=int, default=40, help="answers (and graded questions) per attempt")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        print(f"{args.attempts} attempts x {args.answers} answers")
+        for backend in ("files", "sqlite"):
+            r = run(backend, args)
+            print(f"{backend:6}  save_answer_row p50 {r['p50']:7.1f} us  p99 {r['p99']:7.1f} us  "
+                  f"summaries {r['summaries'] * 1000:7.1f} ms  summaries+grading {r['scan'] * 1000:7.1f} ms")
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Measure cold start: import time and time to the first served request.
+
+Each run starts a fresh uvicorn worker on a throwaway RESULTS_DIR and
+reports how long until it accepts connections and how long the first
+request on each path then takes:
+
+  grading:    /start_exam + /save_answer (what answer-only workers serve)
+  proctoring: /analyze with a camera-sized JPEG (loads FaceMesh)
+
+--warmup passes STARTUP_WARMUP so models load before the worker serves.
+--backend-dir points at another checkout to compare against it.
+
+    python benchmarks/bench_startup.py --runs 3
+    python benchmarks/bench_startup.py --warmup grading,proctoring
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def camera_frame() -> bytes:
+    image = np.full((480, 640, 3), 120, dtype=np.uint8)
+    cv2.circle(image, (320, 240), 120, (180, 160, 140), -1)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+
+def import_time(backend_dir: Path, env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def first_request(backend_dir: Path, env: dict, path: str, frame: bytes) -> tuple:
+    """(seconds until the worker accepts requests, seconds for the first request on `path`)"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            while True:
+                try:
+                    client.get("/")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("uvicorn exited during startup")
+                    time.sleep(0.01)
+            ready = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if path == "grading":
+                client.post("/start_exam", json={"student_id": "bench"}).raise_for_status()
+                client.post("/save_answer", json={"student_id": "bench", "section_id": "maths-mcq",
+                                                   "question_id": "q1", "selected_option": "A"}).raise_for_status()
+            else:
+                client.post("/analyze", files={"file": ("frame.jpg", frame, "image/jpeg")}).raise_for_status()
+            return ready, time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", default="", help="STARTUP_WARMUP value, e.g. grading,proctoring")
+    parser.add_argument("--backend-dir", type=Path, default=BACKEND_DIR)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    # A key (pointing nowhere) so the grading path builds its LLM client as it would in production
+    env = dict(os.environ, RESULTS_DIR=str(workdir / "results"), STARTUP_WARMUP=args.warmup,
+               GROQ_API_KEY="bench", GROQ_BASE_URL="http://127.0.0.1:9", GRADING_CACHE_PATH=str(workdir / "cache.sqlite3"),
+               SHARED_STATE_PATH=str(workdir / "state.sqlite3"))
+    frame = camera_frame()
+    try:
+        imports = [import_time(args.backend_dir, env) for _ in range(args.runs)]
+        print(f"import app: {statistics.median(imports):.2f}s")
+        for path in ("grading", "proctoring"):
+            runs = [first_request(args.backend_dir, env, path, frame) for _ in range(args.runs)]
+            ready = statistics.median(r[0] for r in runs)
+            first = statistics.median(r[1] for r in runs)
+            print(f"{path:10s} ready {ready:5.2f}s  first request {first:5.2f}s  time to first response {ready + first:5.2f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Measure per-frame CPU with and without per-student tracking sessions.
+
+Simulates a candidate's feed: a mostly static scene with sensor noise and
+an occasional scene change (the subject moving). Reports analysis time per
+frame, how many frames needed full FaceMesh inference, and whether every
+scene change was picked up by a fresh inference.
+
+    python benchmarks/bench_tracking.py --frames 200 --change-every 25
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proctoring import TrackingSession, analyze_frame  # noqa: E402
+
+
+def make_feed(frames: int, change_every: int, seed: int = 3) -> list:
+    rng = np.random.default_rng(seed)
+    feed = []
+    center = (320, 240)
+    for i in range(frames):
+        if i and i % change_every == 0:
+            center = (int(rng.integers(160, 480)), int(rng.integers(120, 360)))
+        image = np.full((480, 640, 3), 90, dtype=np.uint8)
+        cv2.circle(image, center, 110, (180, 160, 140), -1)
+        noise = rng.integers(0, 6, size=image.shape, dtype=np.uint8)
+        feed.append((i, cv2.add(image, noise)))
+    return feed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--change-every", type=int, default=25)
+    args = parser.parse_args()
+
+    feed = make_feed(args.frames, args.change_every)
+    analyze_frame(feed[0][1], 0)
+
+    start = time.perf_counter()
+    for i, image in feed:
+        analyze_frame(image, i)
+    untracked = (time.perf_counter() - start) / len(feed)
+
+    session = TrackingSession()
+    missed_changes = 0
+    start = time.perf_counter()
+    for i, image in feed:
+        result = session.analyze(image, i)
+        if i and i % args.change_every == 0 and result["tracked"]:
+            missed_changes += 1
+    tracked = (time.perf_counter() - start) / len(feed)
+
+    print(f"untracked: {untracked * 1000:7.2f} ms/frame (full inference on all {len(feed)} frames)")
+    print(f"tracked:   {tracked * 1000:7.2f} ms/frame (full inference on {session.full_inferences} frames, "
+          f"{session.reused} reused)")
+    print(f"CPU saved: {(1 - tracked / untracked) * 100:.0f}%; scene changes missed: {missed_changes}")
+
+
+if __name__ == "__main__":
+    main()
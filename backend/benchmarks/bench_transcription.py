@@ -0,0 +1,147 @@
+"""Transcription throughput against what a cohort's speaking section produces.
+
+Writes speech-like test recordings, pushes them through TranscriptionPool
+and reports audio seconds transcribed per wall second, per-recording
+latency from upload to transcript, and whether that keeps up with
+--students recording --questions answers of --seconds each within
+--section-minutes (and how many workers would).
+
+By default the real model (faster-whisper, TRANSCRIPTION_MODEL) runs; it
+must be installed. --simulate RTF replaces it with a stand-in that takes
+RTF seconds per second of audio, to check the pool and capacity maths
+on machines without the model.
+
+    python benchmarks/bench_transcription.py --workers 2 --clips 12 --seconds 45
+    python benchmarks/bench_transcription.py --simulate 0.15 --workers 2 --students 300
+"""
+import argparse
+import importlib.util
+import math
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from transcription import TranscriptionPool, transcribe_audio, transcript_path  # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def write_recording(path: Path, seconds: float, seed: int):
+    """Voiced bursts (harmonics of a wandering pitch) separated by short silences."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    t = 0.5
+    while t < seconds - 0.5:
+        length = rng.uniform(0.15, 0.45)
+        start, end = int(t * SAMPLE_RATE), int(min(t + length, seconds) * SAMPLE_RATE)
+        x = np.arange(end - start) / SAMPLE_RATE
+        pitch = rng.uniform(110, 220)
+        burst = sum(np.sin(2 * np.pi * pitch * k * x) / k for k in range(1, 5))
+        audio[start:end] = 0.3 * burst * np.hanning(end - start)
+        t += length + (rng.uniform(0.4, 1.5) if rng.random() < 0.1 else rng.uniform(0.03, 0.12))
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+def simulated(rtf: float):
+    def transcribe(path: Path) -> dict:
+        with wave.open(str(path), "rb") as f:
+            duration = f.getnframes() / f.getframerate()
+        time.sleep(duration * rtf)
+        words, t = [], 0.6
+        while t < duration - 0.5:
+            words.append((t, t + 0.3, "word", 0.9))
+            t += 0.46 if len(words) % 12 else 1.2
+        return {"text": " ".join(w[2] for w in words), "duration": duration, "words": words}
+    return transcribe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clips", type=int, default=8, help="recordings to transcribe for the measurement")
+    parser.add_argument("--seconds", type=float, default=45, help="length of each recording")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=4, help="speaking answers per student")
+    parser.add_argument("--section-minutes", type=float, default=15)
+    parser.add_argument("--simulate", type=float, metavar="RTF", help="stand-in model taking RTF s per audio second")
+    args = parser.parse_args()
+
+    if args.simulate is not None:
+        transcribe, label = simulated(args.simulate), f"simulated model (RTF {args.simulate:g})"
+    else:
+        if importlib.util.find_spec("faster_whisper") is None:
+            sys.exit("faster-whisper is not installed (pip install faster-whisper), or pass --simulate RTF")
+        transcribe, label = transcribe_audio, "faster-whisper"
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-transcription-"))
+    try:
+        clips = []
+        for i in range(args.clips):
+            path = workdir / f"speaking_q{i}.wav"
+            write_recording(path, args.seconds, i)
+            clips.append(path)
+
+        finished = {}
+        lock = threading.Lock()
+
+        def timed(path: Path) -> dict:
+            result = transcribe(path)
+            with lock:
+                finished[path] = time.perf_counter()
+            return result
+
+        pool = TranscriptionPool(timed, workers=args.workers, max_pending=len(clips))
+        if args.simulate is None:
+            started = time.perf_counter()
+            pool.warmup()
+            print(f"model load: {time.perf_counter() - started:.1f}s for {args.workers} worker(s)")
+
+        started = time.perf_counter()
+        for path in clips:
+            pool.submit(path)
+        while pool.pending:
+            time.sleep(0.01)
+        wall = time.perf_counter() - started
+        pool.shutdown()
+
+        written = [path for path in clips if transcript_path(path).exists()]
+        if len(written) != len(clips):
+            sys.exit(f"only {len(written)} of {len(clips)} recordings were transcribed")
+        latencies = sorted(finished[path] - started for path in clips)
+        audio = args.seconds * len(clips)
+        speed = audio / wall
+        print(f"{label}, {args.workers} worker(s): {len(clips)} x {args.seconds:g}s recordings in {wall:.1f}s")
+        print(f"throughput {speed:.2f}x real time ({speed * 60:.0f} audio s per minute)  "
+              f"upload->transcript median {statistics.median(latencies):.1f}s, last {latencies[-1]:.1f}s")
+
+        produced = args.students * args.questions * args.seconds
+        needed = produced / (args.section_minutes * 60)
+        per_worker = speed / args.workers
+        print(f"cohort: {args.students} students x {args.questions} answers x {args.seconds:g}s = "
+              f"{produced / 60:.0f} audio min over {args.section_minutes:g} min, needs {needed:.2f}x real time")
+        if speed >= needed:
+            print(f"keeps up: the queue drains as fast as recordings arrive ({speed / needed:.1f}x headroom)")
+        else:
+            backlog = produced - speed * args.section_minutes * 60
+            print(f"falls behind: {backlog / 60:.1f} audio min queued at the end of the section, "
+                  f"drained {backlog / speed:.0f}s later; about {math.ceil(needed / per_worker)} workers "
+                  f"would keep up (if the cores are there)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
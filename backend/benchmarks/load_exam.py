@@ -0,0 +1,352 @@
+"""Load-test one backend instance with a simulated exam cohort.
+
+Every simulated student runs the flow the frontend does:
+- /start_exam
+- a /heartbeat/{student_id} socket pinging every --ping-interval seconds
+- an /analyze camera frame every --frame-interval seconds
+- one /save_answer per question after some think time, with occasional
+  /save_incident calls
+- a /save_audio recording for each speaking question
+- /finish_exam
+
+Students start spread over --ramp seconds. The LLM is a stub served by
+this script, answering after --llm-latency seconds. The exam is a
+synthetic one with MCQ, keyword (reading) and AI-rubric (speaking)
+questions, so grading takes the same paths as a real cohort. The report
+gives requests, errors, throughput and p50/p95/p99 latency per endpoint.
+
+By default the app runs in a fresh uvicorn process on a throwaway
+RESULTS_DIR. --in-process serves it from a thread of this process.
+--url targets a server you started yourself; that server's own rubrics
+and LLM settings then apply.
+
+    python benchmarks/load_exam.py --students 50
+    python benchmarks/load_exam.py --students 200 --think 2 --ramp 30 --json report.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PASSAGE = "The river town grew around its mill, and the mill grew around the river. " * 30
+INCIDENT_TYPES = ["tab_switch", "window_blur", "fullscreen_exit", "copy_attempt"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fake_llm_app(latency: float):
+    """OpenAI-compatible chat endpoint answering grading prompts in the shape the graders parse."""
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt = body["messages"][0]["content"]
+        await asyncio.sleep(latency)
+        items = len(re.findall(r"^ANSWER \d+$", prompt, re.M))
+        if "examiner" in prompt:
+            part = {"score": 7, "level": 3, "reason": "stub"}
+            content = {"grammar": part, "vocabulary": part, "development": part, "pronunciation": part,
+                       "total": 28, "overall_feedback": "stub"}
+        elif items:
+            content = {"results": [{"id": n, "score": 1, "feedback": "stub"} for n in range(1, items + 1)]}
+        else:
+            content = {"score": 1, "feedback": "stub"}
+        return {"id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(content)}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20, "total_tokens": len(prompt) // 4 + 20}}
+
+    return app
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def write_exam(root: Path, mcq: int, reading: int, speaking: int) -> list:
+    """Synthetic maths/english set A; returns the question plan students answer."""
+    (root / "rubrics").mkdir(parents=True)
+    (root / "QuestionBank").mkdir(parents=True)
+    maths_bank = {"sections": [{"id": "maths-mcq", "questions": [
+        {"id": f"m{i}", "options": [{"key": k, "correct": k == "B"} for k in "ABCD"]} for i in range(mcq)
+    ]}]}
+    english_bank = {"sections": [
+        {"id": "reading", "references": [{"id": "p1", "title": "The Mill", "text": PASSAGE}],
+         "questions": [{"id": f"r{i}", "referenceId": "p1"} for i in range(reading)]},
+        {"id": "speaking", "questions": [{"id": f"s{i}"} for i in range(speaking)]}
+    ]}
+    english_rubric = {"sections": {
+        "reading": {"grading_type": "keyword", "questions": {
+            f"r{i}": {"max_marks": 2, "ideas": [{"id": "mill", "marks": 2, "required_any": ["mill"]}]}
+            for i in range(reading)
+        }},
+        "speaking": {"grading_type": "ai_rubric", "rubric": {
+            c: {"max": 10, "levels": [{"level": 3, "marks": "5-7", "description": "adequate"}]}
+            for c in ("grammar", "vocabulary", "development", "pronunciation")
+        }}
+    }}
+    (root / "QuestionBank" / "maths_exam_A.json").write_text(json.dumps(maths_bank))
+    (root / "QuestionBank" / "english_exam_A.json").write_text(json.dumps(english_bank))
+    (root / "rubrics" / "maths_setA.json").write_text(json.dumps({"sections": {"maths-mcq": {"grading_type": "auto"}}}))
+    (root / "rubrics" / "english_setA.json").write_text(json.dumps(english_rubric))
+    return ([("maths-mcq", f"m{i}") for i in range(mcq)] + [("reading", f"r{i}") for i in range(reading)]
+            + [("speaking", f"s{i}") for i in range(speaking)])
+
+
+def camera_frame(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = np.full((480, 640, 3), rng.integers(60, 180), dtype=np.uint8)
+    cv2.ellipse(image, (320, 240), (100, 130), 0, 0, 360, (150, 170, 200), -1)
+    image = cv2.add(image, rng.integers(0, 20, size=image.shape, dtype=np.uint8))
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, endpoint: str, seconds: float, error: str = None):
+        if error is None:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+        else:
+            codes = self.errors.setdefault(endpoint, {})
+            codes[error] = codes.get(error, 0) + 1
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            self.add(endpoint, 0, type(exc).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+        self.add(endpoint, elapsed, None if response.is_success else str(response.status_code))
+        return response
+
+    def report(self, wall: float) -> dict:
+        report = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies.get(endpoint, []))
+            errors = self.errors.get(endpoint, {})
+            report[endpoint] = {
+                "ok": len(samples),
+                "errors": errors,
+                "rps": round(len(samples) / wall, 2),
+                **{f"p{p}_ms": round(percentile(samples, p) * 1000, 1) for p in (50, 95, 99)},
+                "max_ms": round(samples[-1] * 1000, 1) if samples else 0
+            }
+        return report
+
+
+def percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+
+async def heartbeat(ws_url: str, student_id: str, interval: float, stop: asyncio.Event, rec: Recorder):
+    try:
+        async with websockets.connect(f"{ws_url}/heartbeat/{student_id}") as ws:
+            while not stop.is_set():
+                started = time.perf_counter()
+                await ws.send("ping")
+                await ws.recv()
+                rec.add("WS /heartbeat ping", time.perf_counter() - started)
+                try:
+                    await asyncio.wait_for(stop.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+    except (OSError, websockets.WebSocketException) as exc:
+        rec.add("WS /heartbeat ping", 0, type(exc).__name__)
+
+
+async def camera(client, student_id: str, frame: bytes, interval: float, stop: asyncio.Event, rec: Recorder):
+    await asyncio.sleep(random.uniform(0, interval))
+    while not stop.is_set():
+        await rec.request(client, "POST /analyze", "POST", "/analyze", data={"student_id": student_id},
+                          files={"file": ("frame.jpg", frame, "image/jpeg")})
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def student(n: int, client, ws_url: str, plan: list, frame: bytes, audio: bytes, args, rec: Recorder):
+    student_id = f"load{n:05d}"
+    await asyncio.sleep(args.ramp * n / max(args.students, 1))
+    if await rec.request(client, "POST /start_exam", "POST", "/start_exam", json={"student_id": student_id}) is None:
+        return
+    stop = asyncio.Event()
+    background = [asyncio.create_task(heartbeat(ws_url, student_id, args.ping_interval, stop, rec)),
+                  asyncio.create_task(camera(client, student_id, frame, args.frame_interval, stop, rec))]
+    try:
+        for number, (section_id, question_id) in enumerate(plan, 1):
+            await asyncio.sleep(random.expovariate(1 / args.think) if args.think else 0)
+            payload = {"student_id": student_id, "exam_set": "A", "section_id": section_id,
+                       "question_id": question_id, "question_number": number,
+                       "question_prompt": f"Question {number}"}
+            if section_id == "maths-mcq":
+                payload["selected_option"] = random.choice("ABCD")
+            elif section_id == "reading":
+                # About half miss the keyword and go to the LLM fallback
+                payload["answer"] = random.choice(["the mill made the town grow", "people lived by the water"]) + f" ({student_id})"
+            else:
+                await rec.request(client, "POST /save_audio", "POST", "/save_audio",
+                                  data={"student_id": student_id, "question_id": question_id},
+                                  files={"file": ("speaking.webm", audio, "audio/webm")})
+                payload["answer"] = f"I would like to talk about my town and its river, said {student_id}."
+            await rec.request(client, "POST /save_answer", "POST", "/save_answer", json=payload)
+            if random.random() < args.incident_rate:
+                await rec.request(client, "POST /save_incident", "POST", "/save_incident",
+                                  json={"student_id": student_id, "incident_type": random.choice(INCIDENT_TYPES),
+                                        "question_context": question_id})
+        await rec.request(client, "POST /finish_exam", "POST", "/finish_exam", json={"student_id": student_id})
+    finally:
+        stop.set()
+        await asyncio.gather(*background)
+
+
+async def run_cohort(url: str, plan: list, args) -> tuple:
+    rec = Recorder()
+    frames = [camera_frame(seed) for seed in range(8)]
+    audio = os.urandom(args.audio_kb * 1024)
+    ws_url = "ws" + url[len("http"):]
+    # Drop idle connections before uvicorn's 5s keep-alive timeout does, or a request can race the close
+    limits = httpx.Limits(max_connections=args.students * 3, max_keepalive_connections=args.students * 3,
+                          keepalive_expiry=2)
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(student(n, client, ws_url, plan, frames[n % len(frames)], audio, args, rec)
+                               for n in range(args.students)))
+        return rec, time.perf_counter() - started
+
+
+def start_server(args, workdir: Path, llm_port: int):
+    """Start the app; returns (base url, stop callable)."""
+    port = free_port()
+    env = {
+        "RESULTS_DIR": str(workdir / "results"),
+        "RUBRICS_DIR": str(workdir / "exam" / "rubrics"),
+        "QUESTION_BANK_DIR": str(workdir / "exam" / "QuestionBank"),
+        "GRADING_CACHE_PATH": str(workdir / "llm_cache.sqlite3"),
+        "SHARED_STATE_PATH": str(workdir / "shared_state.sqlite3"),
+        "GROQ_API_KEY": "load-test",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{llm_port}",
+    }
+    if args.in_process:
+        os.environ.update(env)
+        sys.path.insert(0, str(BACKEND_DIR))
+        from app import app
+        server = serve_in_thread(app, port)
+
+        def stop():
+            server.should_exit = True
+    else:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=dict(os.environ, **env)
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+                break
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.05)
+
+        def stop():
+            process.terminate()
+            process.wait()
+    return f"http://127.0.0.1:{port}", stop
+
+
+def print_report(report: dict, wall: float, args):
+    print(f"\n{args.students} students, {wall:.1f}s wall\n")
+    print(f"{'endpoint':22s} {'ok':>7s} {'errors':>8s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for endpoint, row in report.items():
+        errors = sum(row["errors"].values())
+        print(f"{endpoint:22s} {row['ok']:7d} {errors:8d} {row['rps']:8.2f} {row['p50_ms']:8.1f} "
+              f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['max_ms']:8.1f}")
+    for endpoint, row in report.items():
+        if row["errors"]:
+            print(f"  {endpoint} errors: {row['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--mcq", type=int, default=10, help="maths MCQ questions per student")
+    parser.add_argument("--reading", type=int, default=5, help="keyword-graded reading questions")
+    parser.add_argument("--speaking", type=int, default=2, help="AI-graded speaking questions (each uploads audio)")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between answers")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which students start")
+    parser.add_argument("--frame-interval", type=float, default=2.0)
+    parser.add_argument("--ping-interval", type=float, default=5.0)
+    parser.add_argument("--incident-rate", type=float, default=0.1, help="chance of an incident after each answer")
+    parser.add_argument("--audio-kb", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds the stub LLM takes per request")
+    parser.add_argument("--in-process", action="store_true", help="serve the app from a thread of this process")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    workdir = Path(tempfile.mkdtemp(prefix="load-exam-"))
+    plan = write_exam(workdir / "exam", args.mcq, args.reading, args.speaking)
+    stop_server = None
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            llm_port = free_port()
+            llm = serve_in_thread(fake_llm_app(args.llm_latency), llm_port)
+            url, stop_server = start_server(args, workdir, llm_port)
+        rec, wall = asyncio.run(run_cohort(url, plan, args))
+        report = rec.report(wall)
+        print_report(report, wall, args)
+        if args.json:
+            args.json.write_text(json.dumps({"students": args.students, "wall_s": round(wall, 2),
+                                             "endpoints": report}, indent=2))
+    finally:
+        if stop_server:
+            stop_server()
+            llm.should_exit = True
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 from .grader import grade_mcq, grade_keyword, grade_keyword_with_ai_fallback, grade_speaking_with_ai
-from .rubric_loader import load_rubric, load_question_bank, get_correct_option, get_passage_context
+from .rubric_loader import (
+    load_rubric, load_question_bank, get_correct_option, get_passage_context,
+    question_index, lookup_question
+)
+from .cache import grading_cache
+from .engine import GradingEngine, get_engine, build_summary
 
 __all__ = [
     "grade_mcq",
@@ -9,5 +14,11 @@ __all__ = [
     "load_rubric",
     "load_question_bank",
     "get_correct_option",
-    "get_passage_context"
+    "get_passage_context",
+    "question_index",
+    "lookup_question",
+    "GradingEngine",
+    "get_engine",
+    "build_summary",
+    "grading_cache"
 ]
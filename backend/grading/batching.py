@@ -0,0 +1,82 @@
+import asyncio
+import os
+from typing import Optional
+
+from .grader import KEYWORD_MODEL, CompleteFn, build_keyword_batch_prompt, parse_keyword_batch_response
+
+# Most keyword fallbacks graded in one LLM request (1 turns batching off)
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "8"))
+# How long the first fallback for a passage waits for others to join its request (s)
+GRADING_BATCH_WINDOW = float(os.getenv("GRADING_BATCH_WINDOW", "0.05"))
+# Completion budget per answer in a batched request
+BATCH_TOKENS_PER_ITEM = 150
+
+
+class KeywordBatcher:
+    """Groups keyword fallbacks that share a reference passage into one request.
+
+    Items for the same passage, from any student, collect for up to
+    `window` seconds (or until `size` of them arrive) and are sent as one
+    prompt that carries the passage once. The JSON reply is split back per
+    item. `grade` resolves to None for an item the batch could not grade
+    (a lone item, a failed request or a malformed/partial reply) so the
+    caller falls back to its single-item prompt.
+    """
+
+    def __init__(self, complete: CompleteFn, size: int = GRADING_BATCH_SIZE, window: float = GRADING_BATCH_WINDOW):
+        self.complete = complete
+        self.size = size
+        self.window = window
+        self._groups = {}
+        self._tasks = set()
+        self.batches = 0
+        self.batched = 0
+        self.fallbacks = 0
+
+    async def grade(self, answer: str, rubric_config: dict, question_prompt: str,
+                    passage_context: str) -> Optional[dict]:
+        if self.size <= 1:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        group = self._groups.get(passage_context)
+        if group is None:
+            group = self._groups[passage_context] = {"items": []}
+            group["timer"] = asyncio.get_running_loop().call_later(self.window, self._flush, passage_context)
+        group["items"].append(({"answer": answer, "rubric": rubric_config, "question_prompt": question_prompt}, future))
+        if len(group["items"]) >= self.size:
+            self._flush(passage_context)
+        return await future
+
+    def _flush(self, passage_context: str):
+        group = self._groups.pop(passage_context, None)
+        if group is None:
+            return
+        group["timer"].cancel()
+        items = group["items"]
+        if len(items) == 1:
+            if not items[0][1].done():
+                items[0][1].set_result(None)
+            return
+        task = asyncio.ensure_future(self._send(items, passage_context))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, items: list, passage_context: str):
+        prompt = build_keyword_batch_prompt([item for item, _ in items], passage_context)
+        max_marks = [item["rubric"].get("max_marks", 1) for item, _ in items]
+        self.batches += 1
+        try:
+            text = await self.complete(KEYWORD_MODEL, prompt, 0.2, BATCH_TOKENS_PER_ITEM * len(items))
+            results = parse_keyword_batch_response(text, max_marks)
+        except Exception:
+            results = [None] * len(items)
+        for (_, future), result in zip(items, results):
+            if result is None:
+                self.fallbacks += 1
+            else:
+                self.batched += 1
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "batched": self.batched, "fallbacks": self.fallbacks}
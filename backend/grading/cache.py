@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .rubric_loader import BASE_DIR
+
+GRADING_CACHE_PATH = Path(os.getenv("GRADING_CACHE_PATH", str(BASE_DIR / "cache" / "llm_grading.sqlite3")))
+GRADING_CACHE_MAX_ENTRIES = int(os.getenv("GRADING_CACHE_MAX_ENTRIES", "200000"))
+GRADING_CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "1") not in ("0", "false", "no")
+
+
+def normalize_answer(answer: str) -> str:
+    return " ".join((answer or "").casefold().split())
+
+
+def cache_key(kind: str, model: str, answer: str, question_prompt: str, rubric: dict, context: str = "") -> str:
+    payload = json.dumps(
+        [kind, model, normalize_answer(answer), question_prompt or "", rubric, context or ""],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradingCache:
+    """Content-addressed SQLite cache of LLM grading results.
+
+    Entries are keyed by a hash of the normalized answer, question prompt,
+    rubric config, reference context and model name. Least recently used
+    entries are evicted once the table grows past max_entries. The database
+    is opened on first use, so importing the grading package (CLIs,
+    benchmarks, MCQ-only workers) never creates the file.
+    """
+
+    def __init__(self, path: Path, max_entries: int = GRADING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+
+    def _db(self) -> sqlite3.Connection:
+        """The connection, opened on first use; call with _lock held."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grades (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS grades_last_used ON grades (last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            conn = self._db()
+            row = conn.execute("SELECT value FROM grades WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            conn.execute("UPDATE grades SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            conn = self._db()
+            exists = conn.execute("SELECT 1 FROM grades WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO grades (key, value, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                # Evict down to 90% so eviction runs once per batch of inserts, not on every put
+                excess = self._count - int(self.max_entries * 0.9)
+                conn.execute(
+                    "DELETE FROM grades WHERE key IN (SELECT key FROM grades ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._db()
+            return {"hits": self.hits, "misses": self.misses, "entries": self._count, "max_entries": self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM grades")
+            self._count = 0
+
+
+grading_cache = GradingCache(GRADING_CACHE_PATH) if GRADING_CACHE_ENABLED else None
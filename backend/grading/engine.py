@@ -0,0 +1,232 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from .grader import (
+    GROQ_API_KEY, GROQ_BASE_URL, record_llm_call, grade_mcq, grade_keyword, needs_ai_fallback,
+    grade_keyword_with_ai_fallback_async, grade_speaking_with_ai_async
+)
+from .batching import KeywordBatcher
+from .rubric_loader import lookup_question
+
+GRADING_LLM_CONCURRENCY = int(os.getenv("GRADING_LLM_CONCURRENCY", "8"))
+GRADING_LLM_TIMEOUT = float(os.getenv("GRADING_LLM_TIMEOUT", "30"))
+GRADING_LLM_RETRIES = int(os.getenv("GRADING_LLM_RETRIES", "2"))
+GRADING_LLM_BACKOFF = 0.5
+# Requests per second across this engine's LLM calls (0 = unlimited)
+GRADING_LLM_RATE = float(os.getenv("GRADING_LLM_RATE", "0"))
+
+
+class RateLimiter:
+    """Spaces out acquisitions so at most `rate` pass per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class GradingEngine:
+    """Grades a student's answer rows concurrently.
+
+    MCQ and keyword matching run inline; only items that need the LLM are
+    fanned out, through an async client bounded by a semaphore with a
+    per-call timeout, retries and an optional request rate limit. Keyword
+    fallbacks that share a passage go through a KeywordBatcher, so answers
+    graded around the same time (for any student) share one request.
+    Results keep the order of the input rows.
+    """
+
+    def __init__(self, client=None, concurrency: int = GRADING_LLM_CONCURRENCY,
+                 timeout: float = GRADING_LLM_TIMEOUT, retries: int = GRADING_LLM_RETRIES,
+                 rate: float = GRADING_LLM_RATE):
+        self._client = client
+        # The Groq SDK is imported by the first LLM call, so MCQ-only traffic never loads it
+        self.llm_enabled = client is not None or bool(GROQ_API_KEY)
+        self.timeout = timeout
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._rate_limiter = RateLimiter(rate) if rate > 0 else None
+        self.batcher = KeywordBatcher(self.complete) if self.llm_enabled else None
+
+    @property
+    def client(self):
+        if self._client is None and GROQ_API_KEY:
+            from groq import AsyncGroq
+            self._client = AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_retries=0)
+        return self._client
+
+    def warmup(self):
+        """Create the LLM client now instead of on the first call."""
+        return self.client
+
+    async def complete(self, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    if self._rate_limiter:
+                        await self._rate_limiter.acquire()
+                    started = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(
+                                model=model,
+                                messages=[{"role": "user", "content": prompt}],
+                                temperature=temperature,
+                                max_tokens=max_tokens
+                            ),
+                            self.timeout
+                        )
+                    except Exception as e:
+                        record_llm_call(model, started, error=e)
+                        raise
+                    record_llm_call(model, started, response)
+                return response.choices[0].message.content
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                await asyncio.sleep(GRADING_LLM_BACKOFF * 2 ** (attempt - 1))
+
+    def _start(self, ans: dict, use_cache: bool = True) -> tuple:
+        """Grade what can be graded inline; return (result, pending LLM coroutine or None)."""
+        section_id = ans.get("section_id", "")
+        question_id = ans.get("question_id", "")
+        selected_option = ans.get("selected_option", "")
+        spoken_answer = ans.get("spoken_answer", "")
+        correct_answer = ans.get("correct_answer", "")
+        question_prompt = ans.get("question_prompt", "")
+        subject = ans.get("subject", "english")
+        exam_set = ans.get("exam_set", "A")
+        complete = self.complete if self.llm_enabled else None
+
+        entry = lookup_question(subject, exam_set, section_id, question_id)
+        question_rubric = entry["question_rubric"]
+        grading_type = entry["grading_type"]
+
+        result = {"question_id": question_id, "section_id": section_id, "grading_type": grading_type,
+                  "subject": subject, "exam_set": exam_set}
+        pending = None
+
+        if grading_type == "auto":
+            result.update(grade_mcq(selected_option, correct_answer))
+        elif grading_type == "keyword":
+            keyword_result = grade_keyword(spoken_answer, question_rubric)
+            if complete and needs_ai_fallback(spoken_answer, keyword_result):
+                pending = grade_keyword_with_ai_fallback_async(
+                    spoken_answer, question_rubric, question_prompt, entry["passage_context"], complete, keyword_result,
+                    use_cache, self.batcher
+                )
+            else:
+                result.update(keyword_result)
+        elif grading_type == "ai_rubric":
+            speech = ans.get("speech")
+            if speech and not (spoken_answer or "").strip():
+                # Nothing came through from the browser's recognizer; grade what the recording says
+                spoken_answer = speech.get("text", "")
+            pending = grade_speaking_with_ai_async(
+                spoken_answer, entry["section_rubric"], question_prompt, complete, use_cache, speech
+            )
+        else:
+            if selected_option and correct_answer:
+                grade = grade_mcq(selected_option, correct_answer)
+            else:
+                grade = {"auto_score": 0, "max_marks": 1, "feedback": "Could not grade"}
+            result.update(grade)
+
+        if pending is None:
+            _finalize(result)
+        return result, pending
+
+    def begin(self, ans: dict, use_cache: bool = True) -> tuple:
+        """Return (result, None) when the answer grades inline, else (None, coroutine resolving to the result)."""
+        result, pending = self._start(ans, use_cache)
+        if pending is None:
+            return result, None
+        return None, self._resolve(result, pending)
+
+    async def _resolve(self, result: dict, pending) -> dict:
+        _merge(result, await pending)
+        return result
+
+    async def grade_answer(self, ans: dict, use_cache: bool = True) -> dict:
+        result, pending = self.begin(ans, use_cache)
+        return result if pending is None else await pending
+
+    async def grade_answers(self, answers: list, use_cache: bool = True) -> list:
+        results = []
+        pending = []
+        for ans in answers:
+            result, coro = self._start(ans, use_cache)
+            results.append(result)
+            if coro is not None:
+                pending.append((result, coro))
+
+        if pending:
+            grades = await asyncio.gather(*(coro for _, coro in pending))
+            for (result, _), grade in zip(pending, grades):
+                _merge(result, grade)
+        return results
+
+
+def _finalize(result: dict):
+    result["final_score"] = result.get("auto_score") or result.get("ai_score") or 0
+
+
+def _merge(result: dict, grade: dict):
+    if result["grading_type"] == "ai_rubric":
+        result["ai_score"] = grade.get("ai_score")
+        result["max_marks"] = grade.get("max_marks", 40)
+        result["feedback"] = grade.get("feedback", "")
+        result["breakdown"] = grade.get("breakdown", {})
+        result["auto_score"] = grade.get("ai_score")
+    else:
+        result.update(grade)
+    _finalize(result)
+
+
+def percentage(score: float, max_marks: float) -> float:
+    return round((score / max_marks * 100), 1) if max_marks > 0 else 0
+
+
+def build_summary(student_id: str, answers: list, results: list) -> dict:
+    exam_sets_used = {f"{ans.get('subject', 'english')}:{ans.get('exam_set', 'A')}" for ans in answers}
+    total_score = sum(r["final_score"] for r in results)
+    total_max = sum(r.get("max_marks", 1) for r in results)
+
+    subjects = {}
+    for r in results:
+        subject = subjects.setdefault(r.get("subject", "english"), {"exam_set": r.get("exam_set", "A"), "score": 0, "max": 0})
+        subject["score"] += r["final_score"]
+        subject["max"] += r.get("max_marks", 1)
+    for subject in subjects.values():
+        subject["percentage"] = percentage(subject["score"], subject["max"])
+
+    return {
+        "student_id": student_id,
+        "exam_sets": list(exam_sets_used),
+        "subjects": subjects,
+        "total_score": total_score,
+        "total_max": total_max,
+        "percentage": percentage(total_score, total_max),
+        "graded_at": datetime.now().isoformat()
+    }
+
+
+_engine: Optional[GradingEngine] = None
+
+
+def get_engine() -> GradingEngine:
+    global _engine
+    if _engine is None:
+        _engine = GradingEngine()
+    return _engine
@@ -1,15 +1,115 @@
 import os
+import asyncio
 import json
+import logging
 import re
+import sqlite3
+import time
+from typing import Awaitable, Callable, Optional
 from dotenv import load_dotenv
-from groq import Groq
+
+from metrics import Counter, Histogram
+
+from .cache import grading_cache, cache_key
+from .matcher import compile_keyword_rubric
 
 load_dotenv()
 
-groq_client = None
+logger = logging.getLogger(__name__)
+
+SPEAKING_MODEL = "llama-3.3-70b-versatile"
+KEYWORD_MODEL = "llama-3.1-8b-instant"
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if GROQ_API_KEY:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+# Point at an OpenAI-compatible stand-in (e.g. a local fake server) for testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+_groq_client = None
+
+
+def get_groq_client():
+    """Sync Groq client, created on first use; None without GROQ_API_KEY."""
+    global _groq_client
+    if _groq_client is None and GROQ_API_KEY:
+        # The SDK is slow to import; workers that never call the LLM skip it
+        from groq import Groq
+        _groq_client = Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
+    return _groq_client
+
+# async (model, prompt, temperature, max_tokens) -> response text
+CompleteFn = Callable[[str, str, float, int], Awaitable[str]]
+
+LLM_LATENCY = Histogram("llm_request_seconds", "LLM API call latency, one observation per attempt", ("model", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API", ("model", "kind"))
+
+
+def record_llm_call(model: str, started: float, response=None, error: Optional[BaseException] = None):
+    """Observe one LLM API attempt and the token usage it reports."""
+    if error is None:
+        outcome = "ok"
+    else:
+        outcome = "timeout" if isinstance(error, asyncio.TimeoutError) else "error"
+    LLM_LATENCY.labels(model, outcome).observe(time.perf_counter() - started)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def _cache_lookup(kind: str, model: str, answer: str, question_prompt: str, rubric: dict,
+                  context: str, use_cache: bool) -> tuple:
+    if grading_cache is None:
+        return None, None
+    key = cache_key(kind, model, answer, question_prompt, rubric, context)
+    # A forced regrade skips the lookup but still refreshes the stored result
+    if not use_cache:
+        return key, None
+    try:
+        return key, grading_cache.get(key)
+    except sqlite3.Error:
+        # e.g. "database is locked" with several writers; grade as a miss rather than fail the answer
+        logger.warning("Grading cache lookup failed, grading without it", exc_info=True)
+        return key, None
+
+
+def _cache_store(key: Optional[str], result: dict):
+    if key is None:
+        return
+    try:
+        grading_cache.put(key, result)
+    except sqlite3.Error:
+        logger.warning("Could not store a grading result in the cache", exc_info=True)
+
+
+_inflight = {}
+
+
+async def _coalesce(key: Optional[str], call: Callable[[], Awaitable[dict]]) -> dict:
+    """Share one in-flight LLM call between identical concurrent requests."""
+    if key is None:
+        return await call()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(call())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return dict(await asyncio.shield(task))
+
+
+def _complete(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    started = time.perf_counter()
+    try:
+        response = get_groq_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    except Exception as e:
+        record_llm_call(model, started, error=e)
+        raise
+    record_llm_call(model, started, response)
+    return response.choices[0].message.content
 
 
 def grade_mcq(selected_option: str, correct_option: str) -> dict:
@@ -25,43 +125,37 @@ def grade_keyword(answer: str, rubric_config: dict) -> dict:
     if not answer:
         return {"auto_score": 0, "max_marks": rubric_config.get("max_marks", 1), "feedback": "No answer provided"}
     
-    answer_lower = answer.lower()
+    compiled = compile_keyword_rubric(rubric_config)
+    inner, anywhere = compiled.scan(answer.lower())
     total_score = 0
-    max_marks = rubric_config.get("max_marks", 1)
+    max_marks = compiled.max_marks
     feedback_parts = []
     
-    correct_option = rubric_config.get("correct_option", "").lower()
-    if correct_option:
-        wrong_options = [opt for opt in ["a", "b", "c", "d"] if opt != correct_option]
-        for wrong in wrong_options:
-            if f"option {wrong}" in answer_lower or f"letter {wrong}" in answer_lower or (f" {wrong} " in f" {answer_lower} " and len(wrong) == 1):
-                return {
-                    "auto_score": 0,
-                    "max_marks": max_marks,
-                    "feedback": f"Wrong option selected. Correct answer: {correct_option.upper()}"
-                }
-    
-    for idea in rubric_config.get("ideas", []):
-        idea_marks = idea.get("marks", 1)
-        required_any = idea.get("required_any", [])
-        banned = idea.get("banned", [])
-        supporting = idea.get("supporting", [])
+    if compiled.correct_option and compiled.wrong_option_selected(inner, anywhere):
+        return {
+            "auto_score": 0,
+            "max_marks": max_marks,
+            "feedback": f"Wrong option selected. Correct answer: {compiled.correct_option.upper()}"
+        }
+    
+    for idea in compiled.ideas:
+        idea_marks = idea["marks"]
         
-        has_banned = any(b.lower() in answer_lower for b in banned if b)
+        has_banned = any(b in inner for b in idea["banned"])
         if has_banned:
-            feedback_parts.append(f"[{idea.get('id')}] Contains misconception - 0 marks")
+            feedback_parts.append(f"[{idea['id']}] Contains misconception - 0 marks")
             continue
         
-        has_required = any(r.lower() in answer_lower for r in required_any if r)
+        has_required = any(r in inner for r in idea["required_any"])
         if has_required:
             score = idea_marks
-            supporting_count = sum(1 for s in supporting if s and s.lower() in answer_lower)
+            supporting_count = sum(1 for s in idea["supporting"] if s in inner)
             if supporting_count > 0:
                 score = min(score + 0.25, idea_marks)
             total_score += score
-            feedback_parts.append(f"[{idea.get('id')}] Matched - {score} marks")
+            feedback_parts.append(f"[{idea['id']}] Matched - {score} marks")
         else:
-            feedback_parts.append(f"[{idea.get('id')}] Not matched - 0 marks")
+            feedback_parts.append(f"[{idea['id']}] Not matched - 0 marks")
     
     return {
         "auto_score": min(total_score, max_marks),
@@ -70,89 +164,157 @@ def grade_keyword(answer: str, rubric_config: dict) -> dict:
     }
 
 
-def grade_speaking_with_ai(answer: str, rubric: dict, question_prompt: str) -> dict:
-    if not groq_client:
-        return {"ai_score": None, "max_marks": 40, "feedback": "AI grading unavailable - API key not configured"}
-    
-    if not answer or len(answer.strip()) < 10:
-        return {"ai_score": 0, "max_marks": 40, "feedback": "Response too short to evaluate"}
-    
+def speech_context(speech: Optional[dict]) -> str:
+    """Prompt lines describing how the answer was delivered, from its recording's transcript."""
+    if not speech or not speech.get("word_count"):
+        return ""
+    return (
+        f"Words per minute: {speech['wpm']:g}\n"
+        f"Pause ratio: {speech['pause_ratio']:.0%} of the speaking time was pauses "
+        f"(pauses over 0.3s: {speech['pauses']}, of which 1s or longer: {speech['long_pauses']})\n"
+        f"Seconds before speaking started: {speech['response_delay']:g}\n"
+        f"Recognizer confidence: {speech['clarity']:.0%} (low confidence suggests unclear pronunciation)\n"
+        f"Transcript of the recording: {speech.get('text', '')}"
+    )
+
+
+def build_speaking_prompt(answer: str, rubric: dict, question_prompt: str, speech: Optional[dict] = None) -> str:
     rubric_text = ""
     for category, config in rubric.items():
         rubric_text += f"\n{category.upper()} (max {config['max']} marks):\n"
         for level in config.get("levels", []):
             rubric_text += f"  Level {level['level']} ({level['marks']} marks): {level['description']}\n"
     
-    prompt = f"""You are an English language examiner. Grade the following spoken response using ONLY the rubric provided.
+    delivery = speech_context(speech)
+    if delivery:
+        delivery = f"\nDELIVERY (measured from the recording):\n{delivery}\n"
+        pronunciation_note = (
+            "2. For pronunciation and fluency, use the delivery measurements: a steady pace of roughly 100-160 words "
+            "per minute with few long pauses indicates fluent speech; where the recording transcript differs from "
+            "the response, words may have been unclear"
+        )
+    else:
+        pronunciation_note = (
+            "2. For pronunciation, since this is a transcript, evaluate based on word choice clarity and sentence structure"
+        )
+    
+    return f"""You are an English language examiner. Grade the following spoken response using ONLY the rubric provided.
 
 QUESTION/PROMPT:
 {question_prompt}
 
 STUDENT'S RESPONSE:
 {answer}
-
+{delivery}
 GRADING RUBRIC:
 {rubric_text}
 
 Instructions:
 1. Evaluate the response for each category: grammar, vocabulary, development, pronunciation
-2. For pronunciation, since this is a transcript, evaluate based on word choice clarity and sentence structure
+{pronunciation_note}
 3. Assign a specific mark within each level range based on how well the response meets the criteria
 4. Be fair but strict - award marks only where criteria are clearly met
 
 Respond in this exact JSON format:
 {{"grammar": {{"score": <number 0-10>, "level": <1-5>, "reason": "<brief explanation>"}}, "vocabulary": {{"score": <number 0-10>, "level": <1-5>, "reason": "<brief explanation>"}}, "development": {{"score": <number 0-10>, "level": <1-5>, "reason": "<brief explanation>"}}, "pronunciation": {{"score": <number 0-10>, "level": <1-5>, "reason": "<brief explanation>"}}, "total": <sum of all scores>, "overall_feedback": "<2-3 sentence summary>"}}"""
 
-    try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        result_text = response.choices[0].message.content
-        json_match = re.search(r'\{[\s\S]*\}', result_text)
-        if json_match:
-            result = json.loads(json_match.group())
-            return {
-                "ai_score": result.get("total", 0),
-                "max_marks": 40,
-                "feedback": result.get("overall_feedback", ""),
-                "breakdown": {
-                    "grammar": result.get("grammar", {}),
-                    "vocabulary": result.get("vocabulary", {}),
-                    "development": result.get("development", {}),
-                    "pronunciation": result.get("pronunciation", {})
-                }
+
+def parse_speaking_response(result_text: str) -> dict:
+    json_match = re.search(r'\{[\s\S]*\}', result_text)
+    if json_match:
+        result = json.loads(json_match.group())
+        return {
+            "ai_score": result.get("total", 0),
+            "max_marks": 40,
+            "feedback": result.get("overall_feedback", ""),
+            "breakdown": {
+                "grammar": result.get("grammar", {}),
+                "vocabulary": result.get("vocabulary", {}),
+                "development": result.get("development", {}),
+                "pronunciation": result.get("pronunciation", {})
             }
+        }
+    return {"ai_score": None, "max_marks": 40, "feedback": "Could not parse AI response"}
+
+
+def _speaking_precheck(answer: str, has_client: bool) -> Optional[dict]:
+    if not has_client:
+        return {"ai_score": None, "max_marks": 40, "feedback": "AI grading unavailable - API key not configured"}
+    
+    if not answer or len(answer.strip()) < 10:
+        return {"ai_score": 0, "max_marks": 40, "feedback": "Response too short to evaluate"}
+    return None
+
+
+def grade_speaking_with_ai(answer: str, rubric: dict, question_prompt: str, use_cache: bool = True,
+                           speech: Optional[dict] = None) -> dict:
+    early = _speaking_precheck(answer, get_groq_client() is not None)
+    if early:
+        return early
+    
+    key, cached = _cache_lookup("speaking", SPEAKING_MODEL, answer, question_prompt, rubric,
+                                speech_context(speech), use_cache)
+    if cached:
+        return cached
+    
+    prompt = build_speaking_prompt(answer, rubric, question_prompt, speech)
+    try:
+        result = parse_speaking_response(_complete(SPEAKING_MODEL, prompt, 0.3, 1000))
     except Exception as e:
         return {"ai_score": None, "max_marks": 40, "feedback": f"AI grading error: {str(e)}"}
-    
-    return {"ai_score": None, "max_marks": 40, "feedback": "Could not parse AI response"}
+    if result["ai_score"] is not None:
+        _cache_store(key, result)
+    return result
 
 
-def grade_keyword_with_ai_fallback(answer: str, rubric_config: dict, question_prompt: str, passage_context: str = "") -> dict:
-    keyword_result = grade_keyword(answer, rubric_config)
+async def grade_speaking_with_ai_async(answer: str, rubric: dict, question_prompt: str,
+                                       complete: Optional[CompleteFn], use_cache: bool = True,
+                                       speech: Optional[dict] = None) -> dict:
+    early = _speaking_precheck(answer, complete is not None)
+    if early:
+        return early
     
-    if keyword_result["auto_score"] > 0:
-        return keyword_result
+    key, cached = _cache_lookup("speaking", SPEAKING_MODEL, answer, question_prompt, rubric,
+                                speech_context(speech), use_cache)
+    if cached:
+        return cached
     
-    if groq_client and answer and len(answer.strip()) > 5:
-        max_marks = rubric_config.get("max_marks", 1)
-        ideas_desc = "\n".join([
-            f"- {idea.get('id')}: Award {idea.get('marks')} mark(s) if answer contains any of: {', '.join(idea.get('required_any', []))}"
-            for idea in rubric_config.get("ideas", [])
-        ])
-        
-        context_section = ""
-        if passage_context:
-            context_section = f"""
+    async def call() -> dict:
+        prompt = build_speaking_prompt(answer, rubric, question_prompt, speech)
+        try:
+            result = parse_speaking_response(await complete(SPEAKING_MODEL, prompt, 0.3, 1000))
+        except Exception as e:
+            return {"ai_score": None, "max_marks": 40, "feedback": f"AI grading error: {str(e)}"}
+        if result["ai_score"] is not None:
+            _cache_store(key, result)
+        return result
+    
+    return await _coalesce(key, call)
+
+
+def needs_ai_fallback(answer: str, keyword_result: dict) -> bool:
+    return keyword_result["auto_score"] <= 0 and bool(answer) and len(answer.strip()) > 5
+
+
+def _criteria(rubric_config: dict) -> str:
+    return "\n".join([
+        f"- {idea.get('id')}: Award {idea.get('marks')} mark(s) if answer contains any of: {', '.join(idea.get('required_any', []))}"
+        for idea in rubric_config.get("ideas", [])
+    ])
+
+
+def build_keyword_prompt(answer: str, rubric_config: dict, question_prompt: str, passage_context: str = "") -> str:
+    max_marks = rubric_config.get("max_marks", 1)
+    ideas_desc = _criteria(rubric_config)
+    
+    context_section = ""
+    if passage_context:
+        context_section = f"""
 REFERENCE PASSAGE (use this to verify the student's answer):
 {passage_context}
 """
-        
-        prompt = f"""Grade this student answer. Be strict but fair. The answer must be based on information from the reference passage.
+    
+    return f"""Grade this student answer. Be strict but fair. The answer must be based on information from the reference passage.
 {context_section}
 Question: {question_prompt}
 Student Answer: {answer}
@@ -164,23 +326,127 @@ Grading Criteria:
 Respond with JSON only:
 {{"score": <number 0 to {max_marks}>, "feedback": "<brief explanation>"}}"""
 
+
+def parse_keyword_response(result_text: str, max_marks) -> Optional[dict]:
+    json_match = re.search(r'\{[\s\S]*?\}', result_text)
+    if json_match:
+        result = json.loads(json_match.group())
+        return {
+            "auto_score": min(result.get("score", 0), max_marks),
+            "max_marks": max_marks,
+            "feedback": f"[AI] {result.get('feedback', '')}"
+        }
+    return None
+
+
+def build_keyword_batch_prompt(items: list, passage_context: str = "") -> str:
+    """One prompt for several keyword fallbacks that share a reference passage.
+
+    items: [{"answer", "rubric", "question_prompt"}]; the response is keyed by
+    each item's 1-based position.
+    """
+    context_section = ""
+    if passage_context:
+        context_section = f"""
+REFERENCE PASSAGE (use this to verify every answer):
+{passage_context}
+"""
+    
+    answers = "\n\n".join(
+        f"""ANSWER {n}
+Question: {item['question_prompt']}
+Student Answer: {item['answer']}
+Max Marks: {item['rubric'].get('max_marks', 1)}
+Grading Criteria:
+{_criteria(item['rubric'])}"""
+        for n, item in enumerate(items, 1)
+    )
+    
+    return f"""Grade each of these {len(items)} student answers independently. Be strict but fair. Each answer must be based on information from the reference passage.
+{context_section}
+{answers}
+
+Respond with JSON only, one entry per answer:
+{{"results": [{{"id": <answer number>, "score": <number 0 to that answer's max marks>, "feedback": "<brief explanation>"}}]}}"""
+
+
+def parse_keyword_batch_response(result_text: str, max_marks: list) -> list:
+    """Per-item results in input order; None for any item the response did not grade cleanly."""
+    parsed = [None] * len(max_marks)
+    json_match = re.search(r'\{[\s\S]*\}', result_text)
+    if not json_match:
+        return parsed
+    try:
+        entries = json.loads(json_match.group()).get("results")
+    except (ValueError, AttributeError):
+        return parsed
+    if not isinstance(entries, list):
+        return parsed
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        n, score = entry.get("id"), entry.get("score")
+        if (not isinstance(n, int) or not 1 <= n <= len(max_marks) or parsed[n - 1] is not None
+                or not isinstance(score, (int, float)) or isinstance(score, bool)):
+            continue
+        parsed[n - 1] = {
+            "auto_score": max(0, min(score, max_marks[n - 1])),
+            "max_marks": max_marks[n - 1],
+            "feedback": f"[AI] {entry.get('feedback', '')}"
+        }
+    return parsed
+
+
+def grade_keyword_with_ai_fallback(answer: str, rubric_config: dict, question_prompt: str, passage_context: str = "",
+                                   use_cache: bool = True) -> dict:
+    keyword_result = grade_keyword(answer, rubric_config)
+    
+    if get_groq_client() and needs_ai_fallback(answer, keyword_result):
+        key, cached = _cache_lookup("keyword", KEYWORD_MODEL, answer, question_prompt, rubric_config,
+                                    passage_context, use_cache)
+        if cached:
+            return cached
+        prompt = build_keyword_prompt(answer, rubric_config, question_prompt, passage_context)
         try:
-            response = groq_client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=200
-            )
-            result_text = response.choices[0].message.content
-            json_match = re.search(r'\{[\s\S]*?\}', result_text)
-            if json_match:
-                result = json.loads(json_match.group())
-                return {
-                    "auto_score": min(result.get("score", 0), max_marks),
-                    "max_marks": max_marks,
-                    "feedback": f"[AI] {result.get('feedback', '')}"
-                }
+            result = parse_keyword_response(_complete(KEYWORD_MODEL, prompt, 0.2, 200), keyword_result["max_marks"])
+            if result:
+                _cache_store(key, result)
+                return result
         except:
             pass
     
     return keyword_result
+
+
+async def grade_keyword_with_ai_fallback_async(answer: str, rubric_config: dict, question_prompt: str,
+                                               passage_context: str, complete: Optional[CompleteFn],
+                                               keyword_result: Optional[dict] = None, use_cache: bool = True,
+                                               batcher=None) -> dict:
+    if keyword_result is None:
+        keyword_result = grade_keyword(answer, rubric_config)
+    
+    if complete and needs_ai_fallback(answer, keyword_result):
+        key, cached = _cache_lookup("keyword", KEYWORD_MODEL, answer, question_prompt, rubric_config,
+                                    passage_context, use_cache)
+        if cached:
+            return cached
+        
+        async def call() -> dict:
+            if batcher is not None:
+                result = await batcher.grade(answer, rubric_config, question_prompt, passage_context)
+                if result:
+                    _cache_store(key, result)
+                    return result
+            prompt = build_keyword_prompt(answer, rubric_config, question_prompt, passage_context)
+            try:
+                result = parse_keyword_response(await complete(KEYWORD_MODEL, prompt, 0.2, 200), keyword_result["max_marks"])
+                if result:
+                    _cache_store(key, result)
+                    return result
+            except Exception:
+                pass
+            return keyword_result
+        
+        return await _coalesce(key, call)
+    
+    return keyword_result
@@ -0,0 +1,117 @@
+import threading
+from typing import Optional
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+WRONG_OPTION_KEYS = ["a", "b", "c", "d"]
+
+
+class MultiPatternMatcher:
+    """Finds which of a fixed set of patterns occur in a text.
+
+    Uses a pyahocorasick automaton (one pass over the text, overlapping
+    matches included) when the extension is installed, and falls back to a
+    substring check per distinct pattern otherwise.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p for p in patterns if p})
+        self._automaton = None
+        if ahocorasick is not None and self.patterns:
+            automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                automaton.add_word(pattern, pattern)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def finditer(self, text: str):
+        """Yield (start, pattern) for every occurrence of every pattern."""
+        if self._automaton is not None:
+            for end, pattern in self._automaton.iter(text):
+                yield end - len(pattern) + 1, pattern
+            return
+        for pattern in self.patterns:
+            start = text.find(pattern)
+            while start != -1:
+                yield start, pattern
+                start = text.find(pattern, start + 1)
+
+
+class CompiledKeywordRubric:
+    """A keyword rubric compiled for single-pass scoring in grade_keyword.
+
+    All idea terms (required_any, banned, supporting) and the wrong-option
+    probes are matched together against the answer padded with one space on
+    each side. Idea terms only count when they fall inside the original
+    answer, which keeps the `term in answer_lower` semantics, while the
+    " x " option probes may use the padding, as they did before.
+    """
+
+    def __init__(self, rubric_config: dict):
+        self.max_marks = rubric_config.get("max_marks", 1)
+        self.correct_option = rubric_config.get("correct_option", "").lower()
+        self.ideas = []
+        terms = []
+
+        for idea in rubric_config.get("ideas", []):
+            compiled = {
+                "id": idea.get("id"),
+                "marks": idea.get("marks", 1),
+                "required_any": [r.lower() for r in idea.get("required_any", []) if r],
+                "banned": [b.lower() for b in idea.get("banned", []) if b],
+                "supporting": [s.lower() for s in idea.get("supporting", []) if s],
+            }
+            terms += compiled["required_any"] + compiled["banned"] + compiled["supporting"]
+            self.ideas.append(compiled)
+
+        self.wrong_option_probes = []
+        self.wrong_option_padded = []
+        if self.correct_option:
+            for wrong in WRONG_OPTION_KEYS:
+                if wrong != self.correct_option:
+                    self.wrong_option_probes += [f"option {wrong}", f"letter {wrong}"]
+                    self.wrong_option_padded.append(f" {wrong} ")
+
+        self.matcher = MultiPatternMatcher(terms + self.wrong_option_probes + self.wrong_option_padded)
+
+    def scan(self, answer_lower: str) -> tuple:
+        """Return (terms found in the answer, terms found in the space-padded answer)."""
+        padded = f" {answer_lower} "
+        limit = len(padded) - 1
+        inner = set()
+        anywhere = set()
+        for start, pattern in self.matcher.finditer(padded):
+            anywhere.add(pattern)
+            if start >= 1 and start + len(pattern) <= limit:
+                inner.add(pattern)
+        return inner, anywhere
+
+    def wrong_option_selected(self, inner: set, anywhere: set) -> bool:
+        return any(p in inner for p in self.wrong_option_probes) or any(p in anywhere for p in self.wrong_option_padded)
+
+
+_compiled_lock = threading.Lock()
+_compiled = {}
+_COMPILED_CACHE_SIZE = 4096
+
+
+def compile_keyword_rubric(rubric_config: dict) -> CompiledKeywordRubric:
+    """Compile a rubric once and reuse it for as long as the same dict is in use.
+
+    Rubric dicts come from the question index and are never mutated, so the
+    object identity is a safe cache key; the cache keeps a reference to the
+    dict so its id cannot be recycled while the entry is alive.
+    """
+    key = id(rubric_config)
+    cached: Optional[tuple] = _compiled.get(key)
+    if cached is not None and cached[0] is rubric_config:
+        return cached[1]
+    compiled = CompiledKeywordRubric(rubric_config)
+    with _compiled_lock:
+        if len(_compiled) >= _COMPILED_CACHE_SIZE:
+            _compiled.clear()
+        _compiled[key] = (rubric_config, compiled)
+    return compiled
@@ -1,46 +1,57 @@
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
-RUBRICS_DIR = BASE_DIR / "rubrics"
-QUESTION_BANK_DIR = BASE_DIR / "QuestionBank"
+RUBRICS_DIR = Path(os.getenv("RUBRICS_DIR", str(BASE_DIR / "rubrics")))
+QUESTION_BANK_DIR = Path(os.getenv("QUESTION_BANK_DIR", str(BASE_DIR / "QuestionBank")))
+
+# Minimum seconds between mtime checks of the files behind a compiled index
+INDEX_CHECK_INTERVAL = 1.0
+
+
+def _read_json(path: Optional[Path]) -> dict:
+    if path is None:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_rubric_file(subject: str, exam_set: str) -> Optional[Path]:
+    for name in (f"{subject}_set{exam_set}.json", f"{subject}_{exam_set}.json"):
+        rubric_file = RUBRICS_DIR / name
+        if rubric_file.exists():
+            return rubric_file
+    return None
+
+
+def resolve_question_bank_file(subject: str, exam_set: Optional[str] = None) -> Optional[Path]:
+    names = []
+    if exam_set:
+        names += [f"{subject}_exam_{exam_set}.json", f"{subject}_{exam_set}.json"]
+    # Fallback to default (for backwards compatibility)
+    names.append(f"{subject}_exam.json")
+    for name in names:
+        qb_file = QUESTION_BANK_DIR / name
+        if qb_file.exists():
+            return qb_file
+    return None
 
 
 def load_rubric(subject: str, exam_set: str) -> dict:
-    rubric_file = RUBRICS_DIR / f"{subject}_set{exam_set}.json"
-    if rubric_file.exists():
-        with open(rubric_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    rubric_file = RUBRICS_DIR / f"{subject}_{exam_set}.json"
-    if rubric_file.exists():
-        with open(rubric_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return _read_json(resolve_rubric_file(subject, exam_set))
 
 
 def load_question_bank(subject: str, exam_set: Optional[str] = None) -> dict:
     """Load question bank for a subject, optionally for a specific exam set.
-    
+
     If exam_set is provided (e.g., 'A', 'B', 'C'), loads {subject}_exam_{exam_set}.json
     Otherwise falls back to {subject}_exam.json for backwards compatibility.
     """
-    if exam_set:
-        qb_file = QUESTION_BANK_DIR / f"{subject}_exam_{exam_set}.json"
-        if qb_file.exists():
-            with open(qb_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        qb_file = QUESTION_BANK_DIR / f"{subject}_{exam_set}.json"
-        if qb_file.exists():
-            with open(qb_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-    
-    # Fallback to default (for backwards compatibility)
-    qb_file = QUESTION_BANK_DIR / f"{subject}_exam.json"
-    if qb_file.exists():
-        with open(qb_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return _read_json(resolve_question_bank_file(subject, exam_set))
 
 
 def get_correct_option(question_bank: dict, section_id: str, question_id: str) -> Optional[str]:
@@ -70,3 +81,111 @@ def get_passage_context(question_bank: dict, section_id: str, question_id: str)
                     if references:
                         return "\n\n".join([f"{r.get('title', '')}\n{r.get('text', '')}" for r in references])
     return ""
+
+
+def _make_entry(section_rubric: dict, question_rubric: dict) -> dict:
+    return {
+        "correct_option": None,
+        "passage_context": "",
+        "grading_type": question_rubric.get("grading_type") or section_rubric.get("grading_type", "auto"),
+        "question_rubric": question_rubric,
+        "section_rubric": section_rubric.get("rubric", {})
+    }
+
+
+def compile_question_index(question_bank: dict, rubric: dict) -> dict:
+    """Flatten a question bank and its rubric into {(section_id, question_id): entry}.
+
+    Each entry carries the correct option, passage context and the merged
+    rubric config so grading and answer saves never walk the raw JSON.
+    """
+    rubric_sections = rubric.get("sections", {})
+    entries = {}
+
+    for section in question_bank.get("sections", []):
+        section_id = section.get("id")
+        section_rubric = rubric_sections.get(section_id, {})
+        references = section.get("references", [])
+        refs_by_id = {ref.get("id"): ref for ref in references}
+        all_refs = "\n\n".join([f"{r.get('title', '')}\n{r.get('text', '')}" for r in references])
+
+        for q in section.get("questions", []):
+            question_id = q.get("id")
+            if (section_id, question_id) in entries:
+                continue
+            entry = _make_entry(section_rubric, section_rubric.get("questions", {}).get(question_id, {}))
+            for opt in q.get("options", []):
+                if opt.get("correct"):
+                    entry["correct_option"] = opt.get("key")
+                    break
+            ref = refs_by_id.get(q.get("referenceId")) if q.get("referenceId") else None
+            if ref is not None:
+                entry["passage_context"] = f"{ref.get('title', '')}\n\n{ref.get('text', '')}"
+            else:
+                entry["passage_context"] = all_refs
+            entries[(section_id, question_id)] = entry
+
+    # Questions that only appear in the rubric still need their grading config
+    for section_id, section_rubric in rubric_sections.items():
+        for question_id, question_rubric in section_rubric.get("questions", {}).items():
+            if (section_id, question_id) not in entries:
+                entries[(section_id, question_id)] = _make_entry(section_rubric, question_rubric)
+
+    return {"entries": entries, "sections": rubric_sections}
+
+
+class QuestionIndex:
+    """Process-wide cache of compiled question indexes per (subject, exam_set).
+
+    A compiled index is rebuilt only when the mtime of its question bank or
+    rubric file changes (or a file appears/disappears).
+    """
+
+    def __init__(self, check_interval: float = INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._compiled = {}
+
+    def _fingerprint(self, subject: str, exam_set: str) -> tuple:
+        qb_file = resolve_question_bank_file(subject, exam_set)
+        rubric_file = resolve_rubric_file(subject, exam_set)
+        return tuple(
+            (str(p), p.stat().st_mtime_ns) if p else None
+            for p in (qb_file, rubric_file)
+        ), qb_file, rubric_file
+
+    def get(self, subject: str, exam_set: str) -> dict:
+        key = (subject, exam_set)
+        cached = self._compiled.get(key)
+        now = time.monotonic()
+        if cached and now - cached["checked_at"] < self.check_interval:
+            return cached["index"]
+
+        with self._lock:
+            cached = self._compiled.get(key)
+            fingerprint, qb_file, rubric_file = self._fingerprint(subject, exam_set)
+            if cached and cached["fingerprint"] == fingerprint:
+                cached["checked_at"] = now
+                return cached["index"]
+
+            index = compile_question_index(_read_json(qb_file), _read_json(rubric_file))
+            self._compiled[key] = {"fingerprint": fingerprint, "checked_at": now, "index": index}
+            return index
+
+    def lookup(self, subject: str, exam_set: str, section_id: str, question_id: str) -> dict:
+        index = self.get(subject, exam_set)
+        entry = index["entries"].get((section_id, question_id))
+        if entry is None:
+            entry = _make_entry(index["sections"].get(section_id, {}), {})
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+
+
+question_index = QuestionIndex()
+
+
+def lookup_question(subject: str, exam_set: str, section_id: str, question_id: str) -> dict:
+    return question_index.lookup(subject, exam_set, section_id, question_id)
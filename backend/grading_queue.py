@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+import time
+
+from grading import get_engine
+from grading.grader import speech_context
+from results_db import as_text
+from storage import ANSWER_FIELDS, answer_row
+
+logger = logging.getLogger(__name__)
+
+# Students who never call /finish_exam are forgotten after this many seconds
+GRADING_QUEUE_TTL = float(os.getenv("GRADING_QUEUE_TTL", str(6 * 3600)))
+
+
+def stored_answer(ans: dict) -> dict:
+    """The answer as read_answers will return it (plus any attached speech), which is what gets graded."""
+    stored = dict(zip(ANSWER_FIELDS, map(as_text, answer_row(ans))))
+    if ans.get("speech"):
+        stored["speech"] = ans["speech"]
+    return stored
+
+
+def answer_fingerprint(ans: dict) -> tuple:
+    """The answer as it is stored, so a saved dict and the row read back compare equal.
+
+    Speech features from a recording transcribed after the answer was saved
+    change the fingerprint, so collect() grades that answer again with them.
+    """
+    return tuple(map(as_text, answer_row(ans))) + (speech_context(ans.get("speech")),)
+
+
+class IncrementalGrader:
+    """Grades each answer when it is saved instead of all at /finish_exam.
+
+    MCQ and keyword-only answers are scored inline in submit(); answers
+    that need the LLM become background tasks (bounded by the engine's
+    semaphore). A changed answer replaces the question's entry and is
+    graded again; the stale task's result is simply dropped. collect()
+    then only has to look results up, wait for what is still in flight and
+    grade anything it has no current result for (answers saved through
+    another worker, or before a restart).
+    """
+
+    def __init__(self, ttl: float = GRADING_QUEUE_TTL):
+        self.ttl = ttl
+        self._students = {}
+        self.precomputed = 0
+        self.waited = 0
+        self.regraded = 0
+
+    def submit(self, student_id: str, ans: dict):
+        student = self._students.setdefault(student_id, {"items": {}, "touched": 0.0})
+        student["touched"] = time.monotonic()
+        key = (ans.get("section_id", ""), ans.get("question_id", ""))
+        fingerprint = answer_fingerprint(ans)
+        current = student["items"].get(key)
+        if current is not None and current["fingerprint"] == fingerprint:
+            return
+
+        # Graded in its stored form, so collect(), force_regrade and regrade.py all see the same answer
+        result, pending = get_engine().begin(stored_answer(ans))
+        item = {"fingerprint": fingerprint, "result": result, "task": None}
+        if pending is not None:
+            item["task"] = asyncio.create_task(self._run(item, pending))
+        student["items"][key] = item
+
+    async def _run(self, item: dict, pending):
+        try:
+            item["result"] = await pending
+        except Exception:
+            logger.exception("Background grading failed; it will be retried at finish")
+        finally:
+            item["task"] = None
+        return item["result"]
+
+    def pending(self) -> int:
+        return sum(
+            1 for student in self._students.values() for item in student["items"].values() if item["task"] is not None
+        )
+
+    def discard(self, student_id: str):
+        self._students.pop(student_id, None)
+
+    async def collect(self, student_id: str, answers: list) -> list:
+        """Results for `answers` (the latest answer per question), in the same order."""
+        student = self._students.pop(student_id, None)
+        items = student["items"] if student else {}
+        results = [None] * len(answers)
+        waiting = []
+        missing = []
+
+        for i, ans in enumerate(answers):
+            item = items.get((ans.get("section_id", ""), ans.get("question_id", "")))
+            if item is None or item["fingerprint"] != answer_fingerprint(ans):
+                missing.append(i)
+            elif item["result"] is not None:
+                results[i] = item["result"]
+                self.precomputed += 1
+            elif item["task"] is not None:
+                waiting.append((i, item["task"]))
+            else:
+                missing.append(i)
+
+        if waiting:
+            done = await asyncio.gather(*(task for _, task in waiting))
+            for (i, _), result in zip(waiting, done):
+                if result is None:
+                    missing.append(i)
+                else:
+                    results[i] = result
+                    self.waited += 1
+
+        if missing:
+            self.regraded += len(missing)
+            graded = await get_engine().grade_answers([answers[i] for i in missing])
+            for i, result in zip(missing, graded):
+                results[i] = result
+        return results
+
+    def prune(self):
+        cutoff = time.monotonic() - self.ttl
+        for student_id in [s for s, student in self._students.items() if student["touched"] < cutoff]:
+            del self._students[student_id]
+
+    def stop(self):
+        for student in self._students.values():
+            for item in student["items"].values():
+                if item["task"] is not None:
+                    item["task"].cancel()
+        self._students.clear()
+
+
+grading_queue = IncrementalGrader()
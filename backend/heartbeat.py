@@ -0,0 +1,198 @@
+import heapq
+import os
+import time
+from typing import Optional
+
+from shared_state import MemoryState, shared_state
+
+# Client pings every 5s; a socket silent for longer than this is considered dead
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "15"))
+# How long a disconnected or finished student stays visible in /status
+HEARTBEAT_RETENTION = float(os.getenv("HEARTBEAT_RETENTION", "3600"))
+
+# Shared-state namespace holding one presence record per student
+PRESENCE = "presence"
+
+
+class HeartbeatMonitor:
+    """Tracks heartbeat sockets and expires silent ones.
+
+    Sockets belong to the worker that accepted them, so each worker keeps
+    its own sessions and a min-heap keyed by the time each should next be
+    looked at. A ping only updates `last_ping` (O(1)); when the sweeper pops
+    an entry whose session has pinged since, it re-arms it at
+    `last_ping + timeout`. A sweep therefore touches only the sessions that
+    are due, not every open socket. However a session ends (disconnect,
+    finish-then-close or timeout), it is scheduled once more at
+    `ended_at + retention` and forgotten only then.
+
+    What /status reports is the presence record in `state`, written on
+    connect/close/timeout and at most every timeout/3 seconds on ping, so
+    any worker can answer for any student when the state is shared. Records
+    carry an owner token; a worker only changes records it still owns.
+    """
+
+    def __init__(self, state=None, timeout: float = HEARTBEAT_TIMEOUT, retention: float = HEARTBEAT_RETENTION):
+        self.state = state if state is not None else MemoryState()
+        self.timeout = timeout
+        self.retention = retention
+        self.publish_interval = timeout / 3
+        self._sessions = {}
+        self._heap = []
+        self._generation = 0
+
+    def connect(self, student_id: str, websocket, now: Optional[float] = None) -> dict:
+        now = now if now is not None else time.time()
+        self._generation += 1
+        session = {
+            "student_id": student_id,
+            "ws": websocket,
+            "generation": self._generation,
+            "owner": f"{os.getpid()}:{self._generation}",
+            "last_ping": now,
+            "published_ping": now,
+            "ended": False,
+            "ended_at": None
+        }
+        self._sessions[student_id] = session
+
+        def apply(record):
+            return {
+                "status": "connected",
+                "owner": session["owner"],
+                "connected_at": now,
+                "last_ping": now,
+                "disconnected_at": None,
+                "disconnects": record["disconnects"] if record else 0
+            }, None
+
+        self.state.transact(PRESENCE, student_id, apply)
+        heapq.heappush(self._heap, (now + self.timeout, session["generation"], student_id))
+        return session
+
+    def ping(self, student_id: str, now: Optional[float] = None):
+        session = self._sessions.get(student_id)
+        if session is None or session["ended"]:
+            return
+        now = now if now is not None else time.time()
+        session["last_ping"] = now
+        if now - session["published_ping"] >= self.publish_interval:
+            session["published_ping"] = now
+            self._update(session, lambda record: record.update(last_ping=now))
+
+    def disconnect(self, student_id: str, websocket, now: Optional[float] = None) -> bool:
+        """Mark a socket closed; returns True if this was an unexpected drop."""
+        session = self._sessions.get(student_id)
+        if session is None or session["ws"] is not websocket or session["ended"]:
+            return False
+        return self._end(session, "disconnected", now if now is not None else time.time())
+
+    def finish(self, student_id: str, now: Optional[float] = None):
+        """The student submitted; closing the socket afterwards is expected."""
+        now = now if now is not None else time.time()
+
+        def apply(record):
+            if record is None:
+                return None, None
+            record["status"] = "finished"
+            record["disconnected_at"] = record["disconnected_at"] or now
+            return record, None
+
+        self.state.transact(PRESENCE, student_id, apply)
+
+    def _update(self, session: dict, change) -> bool:
+        def apply(record):
+            if record is None or record["owner"] != session["owner"] or record["status"] != "connected":
+                return record, False
+            change(record)
+            return record, True
+
+        return self.state.transact(PRESENCE, session["student_id"], apply)
+
+    def _end(self, session: dict, status: str, now: float) -> bool:
+        session["ended"] = True
+        session["ended_at"] = now
+        session["ws"] = None
+        heapq.heappush(self._heap, (now + self.retention, session["generation"], session["student_id"]))
+
+        def change(record):
+            record["status"] = status
+            record["disconnected_at"] = now
+            record["disconnects"] += 1
+
+        return self._update(session, change)
+
+    def sweep(self, now: Optional[float] = None) -> list:
+        """Expire silent sockets and forget old ones.
+
+        Returns [(student_id, websocket, unexpected)] for sockets that timed
+        out; `unexpected` is False when the student had already finished.
+        """
+        now = now if now is not None else time.time()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, generation, student_id = heapq.heappop(self._heap)
+            session = self._sessions.get(student_id)
+            if session is None or session["generation"] != generation:
+                continue
+            if not session["ended"]:
+                deadline = session["last_ping"] + self.timeout
+                if deadline > now:
+                    heapq.heappush(self._heap, (deadline, generation, student_id))
+                    continue
+                websocket = session["ws"]
+                expired.append((student_id, websocket, self._end(session, "timed_out", now)))
+            elif session["ended_at"] + self.retention <= now:
+                del self._sessions[student_id]
+                self._forget(student_id, session["owner"])
+        return expired
+
+    def _forget(self, student_id: str, owner: str):
+        def apply(record):
+            if record is not None and record["owner"] == owner and record["status"] != "connected":
+                return None, None
+            return record, None
+
+        self.state.transact(PRESENCE, student_id, apply)
+
+    def _describe(self, student_id: str, record: dict, now: float) -> dict:
+        status = record["status"]
+        # A connected record nobody has refreshed belongs to a worker that went away
+        if status == "connected" and now - record["last_ping"] > self.timeout + self.publish_interval:
+            status = "stale"
+        return {
+            "student_id": student_id,
+            "status": status,
+            "connected": status == "connected",
+            "connected_at": record["connected_at"],
+            "last_ping": record["last_ping"],
+            "seconds_since_ping": round(now - record["last_ping"], 1),
+            "timeout": self.timeout,
+            "disconnected_at": record["disconnected_at"],
+            "disconnects": record["disconnects"]
+        }
+
+    def active(self) -> int:
+        """Heartbeat sockets currently open on this worker."""
+        # With shared state, sessions change on the state thread while the metrics gauge reads them
+        return sum(1 for session in list(self._sessions.values()) if not session["ended"])
+
+    def status(self, student_id: str, now: Optional[float] = None) -> Optional[dict]:
+        record = self.state.get(PRESENCE, student_id)
+        if record is None:
+            return None
+        return self._describe(student_id, record, now if now is not None else time.time())
+
+    def all_statuses(self, status: Optional[str] = None) -> list:
+        now = time.time()
+        statuses = [self._describe(student_id, record, now) for student_id, record in self.state.items(PRESENCE)]
+        return [s for s in statuses if status is None or s["status"] == status]
+
+    def counts(self) -> dict:
+        counts = {}
+        for student in self.all_statuses():
+            counts[student["status"]] = counts.get(student["status"], 0) + 1
+        return counts
+
+
+heartbeat_monitor = HeartbeatMonitor(shared_state)
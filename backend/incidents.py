@@ -0,0 +1,138 @@
+import os
+import time
+from typing import Callable, Optional
+
+from shared_state import MemoryState
+
+# Flags produced by frame analysis; a frame without one of these ends its episode
+FRAME_FLAGS = ("no_face", "multiple_faces", "gaze_away")
+
+# Observations of the same type closer together than this extend one episode
+INCIDENT_EPISODE_GAP_MS = int(os.getenv("INCIDENT_EPISODE_GAP_MS", "8000"))
+
+# Shared-state namespace holding each student's open episodes, keyed by incident type
+EPISODES = "incident_episodes"
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class IncidentAggregator:
+    """Per-student incident state machine that compacts events into episodes.
+
+    Every flagged frame or client-reported incident is an observation. An
+    observation of the same type within INCIDENT_EPISODE_GAP_MS of the last
+    one extends the open episode (so duplicates are merged rather than
+    logged again); otherwise the open episode is closed and a new one starts.
+    Only closed episodes are handed to `persist`, so storage grows with the
+    number of episodes, not frames.
+
+    Open episodes live in `state` (one record per student), so with a shared
+    backend observations arriving at different workers extend the same
+    episode and exactly one worker persists it when it closes.
+    """
+
+    def __init__(self, persist: Callable[[str, dict], None], state=None, gap_ms: int = INCIDENT_EPISODE_GAP_MS):
+        self.persist = persist
+        self.state = state if state is not None else MemoryState()
+        self.gap_ms = gap_ms
+        self.observed = 0
+        self.persisted = 0
+
+    def observe(self, student_id: str, incident_type: str, timestamp: Optional[int] = None,
+                details: str = "", question_context: str = ""):
+        timestamp = timestamp if timestamp is not None else now_ms()
+
+        def apply(episodes):
+            episodes = episodes or {}
+            closed = self._observe(episodes, incident_type, timestamp, details, question_context)
+            return episodes, closed
+
+        self._persist(student_id, self.state.transact(EPISODES, student_id, apply))
+
+    def observe_frame(self, student_id: str, result: dict):
+        """Feed one /analyze result; a clean frame ends any open frame-flag episode."""
+        if result.get("error"):
+            return
+        flag = result.get("flag")
+        if not flag and self.state.get(EPISODES, student_id) is None:
+            return
+        timestamp = result.get("timestamp") or now_ms()
+        details = f"faces={result.get('faces')}"
+        if result.get("yaw") is not None:
+            details += f" yaw={result.get('yaw')} pitch={result.get('pitch')}"
+
+        def apply(episodes):
+            episodes = episodes or {}
+            closed = [
+                self._finish(episodes.pop(frame_flag))
+                for frame_flag in FRAME_FLAGS if frame_flag != flag and frame_flag in episodes
+            ]
+            if flag:
+                closed += self._observe(episodes, flag, timestamp, details, "")
+            return episodes or None, closed
+
+        self._persist(student_id, self.state.transact(EPISODES, student_id, apply))
+
+    def _observe(self, episodes: dict, incident_type: str, timestamp: int, details: str, question_context: str) -> list:
+        self.observed += 1
+        closed = []
+        episode = episodes.get(incident_type)
+        if episode is not None:
+            if timestamp - episode["ended_at"] <= self.gap_ms:
+                episode["ended_at"] = max(episode["ended_at"], timestamp)
+                episode["count"] += 1
+                if question_context and not episode["question_context"]:
+                    episode["question_context"] = question_context
+                return closed
+            closed.append(self._finish(episodes.pop(incident_type)))
+        episodes[incident_type] = {
+            "incident_type": incident_type,
+            "details": details,
+            "question_context": question_context,
+            "started_at": timestamp,
+            "ended_at": timestamp,
+            "count": 1
+        }
+        return closed
+
+    @staticmethod
+    def _finish(episode: dict) -> dict:
+        episode["duration_ms"] = episode["ended_at"] - episode["started_at"]
+        return episode
+
+    def _persist(self, student_id: str, closed: list):
+        for episode in closed:
+            self.persisted += 1
+            self.persist(student_id, episode)
+
+    def _close(self, student_id: str, predicate: Callable[[dict], bool]):
+        def apply(episodes):
+            episodes = episodes or {}
+            closed = [
+                self._finish(episodes.pop(incident_type))
+                for incident_type in [t for t, episode in episodes.items() if predicate(episode)]
+            ]
+            return episodes or None, closed
+
+        self._persist(student_id, self.state.transact(EPISODES, student_id, apply))
+
+    def sweep(self, timestamp: Optional[int] = None) -> int:
+        """Close episodes that have seen no observation for longer than the gap."""
+        timestamp = timestamp if timestamp is not None else now_ms()
+        before = self.persisted
+        for student_id, episodes in self.state.items(EPISODES):
+            if any(timestamp - episode["ended_at"] > self.gap_ms for episode in episodes.values()):
+                self._close(student_id, lambda episode: timestamp - episode["ended_at"] > self.gap_ms)
+        return self.persisted - before
+
+    def close_student(self, student_id: str):
+        self._close(student_id, lambda episode: True)
+
+    def close_all(self):
+        for student_id, _ in self.state.items(EPISODES):
+            self.close_student(student_id)
+
+    def open_episodes(self, student_id: str) -> list:
+        return [dict(episode) for episode in (self.state.get(EPISODES, student_id) or {}).values()]
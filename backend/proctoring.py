@@ -1,21 +1,273 @@
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import mediapipe as mp
+import asyncio
+import os
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-# MediaPipe setup
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(max_num_faces=3, refine_landmarks=True, min_detection_confidence=0.7, min_tracking_confidence=0.6)
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+from metrics import Counter, Histogram
+
+DETECTOR_POOL_SIZE = int(os.getenv("DETECTOR_POOL_SIZE", "0")) or os.cpu_count() or 1
+# Frames allowed in flight (running + queued) before requests are rejected with 429;
+# the floor keeps a full /analyze_batch admissible on small machines
+DETECTOR_MAX_PENDING = int(os.getenv("DETECTOR_MAX_PENDING", "0")) or max(DETECTOR_POOL_SIZE * 16, 128)
 
 GAZE_YAW_THRESHOLD = 25.0
 GAZE_PITCH_UP_THRESHOLD = 15.0
 GAZE_PITCH_DOWN_THRESHOLD = -25.0
 
+# Per-student tracking: reuse the last analysis while the scene is static
+TRACKING_THUMBNAIL_SIZE = (32, 24)
+# A thumbnail cell counts as changed when its gray level moves by more than this
+TRACKING_CELL_DELTA = 12
+# Run full inference when more than this fraction of cells changed since the last keyframe
+TRACKING_MOTION_THRESHOLD = float(os.getenv("TRACKING_MOTION_THRESHOLD", "0.02"))
+# Run full inference at least every N frames, even for a static scene
+TRACKING_KEYFRAME_INTERVAL = int(os.getenv("TRACKING_KEYFRAME_INTERVAL", "5"))
+TRACKING_SMOOTHING_WINDOW = int(os.getenv("TRACKING_SMOOTHING_WINDOW", "3"))
+TRACKING_SESSION_TTL = 15 * 60
+
+# Proctoring frames are decoded down toward this width (0 = full size). FaceMesh runs its
+# detector at 128px and its landmark model at 192px, so 640x480 camera frames lose
+# nothing at 320x240; JPEGs are shrunk during decoding (libjpeg DCT scaling)
+FRAME_DECODE_WIDTH = int(os.getenv("FRAME_DECODE_WIDTH", "320"))
+# imdecode flags for 1/2, 1/4 and 1/8 scale decoding
+REDUCED_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                        8: cv2.IMREAD_REDUCED_COLOR_8}
+# JPEG start-of-frame markers (baseline, progressive, ...), which carry the image size
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_SEGMENT = struct.Struct(">BBH")
+JPEG_SOF_SIZE = struct.Struct(">xHH")
+
+FRAME_STAGE = Histogram("frame_stage_seconds", "Time per proctoring frame stage", ("stage",))
+DECODE_TIME = FRAME_STAGE.labels("decode")
+FACE_MESH_TIME = FRAME_STAGE.labels("face_mesh")
+THUMBNAIL_TIME = FRAME_STAGE.labels("thumbnail")
+FRAMES = Counter("frames_analyzed_total", "Proctoring frames by how they were analyzed", ("path",))
+FRAMES_INFERRED = FRAMES.labels("inference")
+FRAMES_TRACKED = FRAMES.labels("tracked")
+FRAMES_UNDECODABLE = FRAMES.labels("undecodable")
+
+# Packed frame batch, big-endian, repeated: [u16 student_id length][student_id utf-8]
+# [u64 capture time, ms since the epoch; 0 = unknown][u32 image length][image bytes]
+FRAME_HEADER = struct.Struct(">H")
+FRAME_LENGTH = struct.Struct(">QI")
+
+
+_detectors = threading.local()
+
+
+def get_face_mesh():
+    """FaceMesh for the calling thread; instances are not safe to share between threads."""
+    face_mesh = getattr(_detectors, "face_mesh", None)
+    if face_mesh is None:
+        # mediapipe takes most of a second to import, so it is loaded by the first
+        # frame (or DetectorPool.warmup), not by every worker that imports this module
+        import mediapipe as mp
+        # Each pooled instance sees interleaved frames from many candidates, so
+        # cross-frame landmark tracking would follow the wrong face; temporal
+        # reuse is handled per student by TrackingSession instead
+        face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=3, refine_landmarks=True, min_detection_confidence=0.7, min_tracking_confidence=0.6)
+        _detectors.face_mesh = face_mesh
+    return face_mesh
+
+
+def get_face_cascade():
+    face_cascade = getattr(_detectors, "face_cascade", None)
+    if face_cascade is None:
+        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _detectors.face_cascade = face_cascade
+    return face_cascade
+
+
+class DetectorBusy(Exception):
+    pass
+
+
+class DetectorPool:
+    """Runs frame analysis on a fixed set of worker threads, one detector set each.
+
+    Work beyond max_pending in-flight frames is rejected with DetectorBusy
+    instead of queueing without bound.
+    """
+
+    def __init__(self, size: int = DETECTOR_POOL_SIZE, max_pending: int = DETECTOR_MAX_PENDING):
+        self.size = size
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="detector")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _reserve(self, count: int):
+        with self._lock:
+            if self._pending + count > self.max_pending:
+                raise DetectorBusy(f"{self._pending} frames already pending")
+            self._pending += count
+
+    def _release(self, count: int):
+        with self._lock:
+            self._pending -= count
+
+    async def run(self, fn, *args):
+        self._reserve(1)
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._release(1)
+
+    async def map(self, fn, items: list) -> list:
+        """Run fn over items in parallel; all-or-nothing admission."""
+        self._reserve(len(items))
+        try:
+            futures = [asyncio.wrap_future(self._executor.submit(fn, item)) for item in items]
+            return list(await asyncio.gather(*futures))
+        finally:
+            self._release(len(items))
+
+    async def map_ordered(self, fn, items: list, key) -> list:
+        """Like map, but items sharing a non-empty key(item) run one after another, in list order.
+
+        Frames of one student feed a TrackingSession, which must see them in
+        capture order; different students still run in parallel.
+        """
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(key(item) or ("", index), []).append(index)
+        results = [None] * len(items)
+
+        def run_group(indices):
+            for index in indices:
+                results[index] = fn(items[index])
+
+        self._reserve(len(items))
+        try:
+            futures = [asyncio.wrap_future(self._executor.submit(run_group, indices)) for indices in groups.values()]
+            await asyncio.gather(*futures)
+            return results
+        finally:
+            self._release(len(items))
+
+    def warmup(self, timeout: float = 60):
+        """Build every worker thread's detectors now instead of on its first frame."""
+        barrier = threading.Barrier(self.size)
+
+        def build():
+            get_face_cascade()
+            get_face_mesh().process(np.zeros((240, 320, 3), dtype=np.uint8))
+            # Hold this worker until all have started, so each task lands on a different thread
+            try:
+                barrier.wait(timeout)
+            except threading.BrokenBarrierError:
+                pass
+
+        for future in [self._executor.submit(build) for _ in range(self.size)]:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+detector_pool = DetectorPool()
+
+
+def jpeg_size(data) -> Optional[tuple]:
+    """(width, height) from a JPEG's start-of-frame header, or None if it is not a JPEG."""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    offset = 2
+    while offset + JPEG_SEGMENT.size <= len(data):
+        marker_start, marker, length = JPEG_SEGMENT.unpack_from(data, offset)
+        if marker_start != 0xFF:
+            return None
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 4 + JPEG_SOF_SIZE.size > len(data):
+                return None
+            height, width = JPEG_SOF_SIZE.unpack_from(data, offset + 4)
+            return width, height
+        offset += 2 + length
+    return None
+
 
-def load_image(contents: bytes):
-    return cv2.cvtColor(np.array(Image.open(io.BytesIO(contents))), cv2.COLOR_BGR2RGB)
+def decode_scale(data, max_width: int) -> int:
+    """Largest libjpeg reduction (1, 2, 4 or 8) that keeps the frame at least max_width wide."""
+    size = jpeg_size(data) if max_width else None
+    if size is None:
+        return 1
+    scale = 1
+    while scale < 8 and size[0] // (scale * 2) >= max_width:
+        scale *= 2
+    return scale
+
+
+def decode_image(buffer, max_width: int = FRAME_DECODE_WIDTH):
+    """Decode an encoded image into the RGB array FaceMesh expects.
+
+    Reads straight from any bytes-like buffer (bytes, memoryview into a
+    packed batch) without copying it. JPEGs wider than 2 * max_width are
+    decoded at 1/2, 1/4 or 1/8 scale, so the full-size bitmap is never
+    built; other formats are shrunk after decoding. The BGR to RGB swap
+    happens in place. Returns None if the buffer is not an image.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if data.size == 0:
+        return None
+    image = cv2.imdecode(data, REDUCED_DECODE_FLAGS[decode_scale(data, max_width)])
+    if image is None:
+        return None
+    if max_width and image.shape[1] >= max_width * 2:
+        height = round(image.shape[0] * max_width / image.shape[1])
+        image = cv2.resize(image, (max_width, height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+def decode_frame(buffer):
+    """Decode a proctoring frame (downscaled to FRAME_DECODE_WIDTH)."""
+    with DECODE_TIME.time():
+        image = decode_image(buffer, FRAME_DECODE_WIDTH)
+    if image is None:
+        FRAMES_UNDECODABLE.inc()
+    return image
+
+
+def pack_frames(frames) -> bytes:
+    """Pack (student_id, image_bytes[, captured_at ms]) frames into the /analyze_batch binary format."""
+    parts = []
+    for student_id, image, *captured_at in frames:
+        sid = student_id.encode("utf-8")
+        parts += [FRAME_HEADER.pack(len(sid)), sid, FRAME_LENGTH.pack(captured_at[0] if captured_at else 0, len(image)),
+                  image]
+    return b"".join(parts)
+
+
+def unpack_frames(body) -> list:
+    """Split a packed batch into (student_id, memoryview, captured_at or None) frames without copying image data."""
+    view = memoryview(body)
+    frames = []
+    offset = 0
+    while offset < len(view):
+        if offset + FRAME_HEADER.size > len(view):
+            raise ValueError("Truncated frame header")
+        (sid_len,) = FRAME_HEADER.unpack_from(view, offset)
+        offset += FRAME_HEADER.size
+        if offset + sid_len + FRAME_LENGTH.size > len(view):
+            raise ValueError("Truncated frame header")
+        student_id = str(view[offset:offset + sid_len], "utf-8")
+        offset += sid_len
+        captured_at, image_len = FRAME_LENGTH.unpack_from(view, offset)
+        offset += FRAME_LENGTH.size
+        if offset + image_len > len(view):
+            raise ValueError("Truncated frame data")
+        frames.append((student_id, view[offset:offset + image_len], captured_at or None))
+        offset += image_len
+    return frames
 
 
 def estimate_head_pose(landmarks):
@@ -46,7 +298,10 @@ def estimate_head_pose(landmarks):
 
 
 def analyze_frame(image_rgb, timestamp: int) -> dict:
-    results = face_mesh.process(image_rgb)
+    face_mesh = get_face_mesh()
+    with FACE_MESH_TIME.time():
+        results = face_mesh.process(image_rgb)
+    FRAMES_INFERRED.inc()
     face_count = len(results.multi_face_landmarks) if results.multi_face_landmarks else 0
     
     response = {"faces": face_count, "yaw": None, "pitch": None, "flag": None, "timestamp": timestamp}
@@ -74,9 +329,130 @@ def analyze_frame(image_rgb, timestamp: int) -> dict:
     return response
 
 
+def frame_thumbnail(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, TRACKING_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def motion_score(previous, current) -> float:
+    """Fraction of thumbnail cells whose brightness changed noticeably."""
+    return float(np.count_nonzero(cv2.absdiff(previous, current) > TRACKING_CELL_DELTA)) / current.size
+
+
+class TrackingSession:
+    """Temporal state for one candidate's camera feed."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keyframe = None
+        self.last_result = None
+        self.frames_since_keyframe = 0
+        self.yaw_window = deque(maxlen=TRACKING_SMOOTHING_WINDOW)
+        self.pitch_window = deque(maxlen=TRACKING_SMOOTHING_WINDOW)
+        self.last_seen = time.monotonic()
+        self.full_inferences = 0
+        self.reused = 0
+
+    def analyze(self, image, timestamp: int) -> dict:
+        """Analyze a frame, running FaceMesh only on keyframes or scene changes.
+
+        Flags always come from the latest full inference, so a static scene
+        keeps its flag and any real change (someone entering, the head
+        turning) forces a fresh inference. Reported yaw/pitch are averaged
+        over the last few inferences to damp landmark jitter.
+        """
+        with THUMBNAIL_TIME.time():
+            thumbnail = frame_thumbnail(image)
+        with self.lock:
+            self.last_seen = time.monotonic()
+            if (self.last_result is not None
+                    and self.frames_since_keyframe < TRACKING_KEYFRAME_INTERVAL
+                    and motion_score(self.keyframe, thumbnail) <= TRACKING_MOTION_THRESHOLD):
+                self.frames_since_keyframe += 1
+                self.reused += 1
+                FRAMES_TRACKED.inc()
+                return dict(self.last_result, timestamp=timestamp, tracked=True)
+
+            result = analyze_frame(image, timestamp)
+            self.full_inferences += 1
+            self.keyframe = thumbnail
+            self.frames_since_keyframe = 0
+            if result["yaw"] is None:
+                self.yaw_window.clear()
+                self.pitch_window.clear()
+            else:
+                self.yaw_window.append(result["yaw"])
+                self.pitch_window.append(result["pitch"])
+                result["yaw"] = round(sum(self.yaw_window) / len(self.yaw_window), 1)
+                result["pitch"] = round(sum(self.pitch_window) / len(self.pitch_window), 1)
+            result["tracked"] = False
+            self.last_result = result
+            return dict(result)
+
+
+class TrackingSessions:
+    def __init__(self, ttl: float = TRACKING_SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._last_prune = time.monotonic()
+
+    def get(self, student_id: str) -> TrackingSession:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_prune > 60:
+                self._sessions = {k: v for k, v in self._sessions.items() if now - v.last_seen < self.ttl}
+                self._last_prune = now
+            session = self._sessions.get(student_id)
+            if session is None:
+                session = self._sessions[student_id] = TrackingSession()
+            return session
+
+    def discard(self, student_id: str):
+        with self._lock:
+            self._sessions.pop(student_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+tracking_sessions = TrackingSessions()
+
+
+def analyze_image(image, timestamp: int, student_id: str = "") -> dict:
+    if student_id:
+        return tracking_sessions.get(student_id).analyze(image, timestamp)
+    return analyze_frame(image, timestamp)
+
+
+def analyze_encoded_frame(student_id: str, buffer, timestamp: int) -> dict:
+    """Decode and analyze one (student_id, buffer) frame from a batch or stream."""
+    image = decode_frame(buffer)
+    if image is None:
+        return {"student_id": student_id, "error": "Could not decode frame", "timestamp": timestamp}
+    result = analyze_image(image, timestamp, student_id)
+    result["student_id"] = student_id
+    return result
+
+
+def analyze_upload(contents: bytes, timestamp: int, student_id: str = "") -> dict:
+    image = decode_frame(contents)
+    if image is None:
+        return {"error": "Could not decode frame", "timestamp": timestamp}
+    return analyze_image(image, timestamp, student_id)
+
+
+def verify_upload(contents: bytes) -> dict:
+    # Full resolution: the cascade's minimum face size is in pixels
+    image = decode_image(contents, max_width=0)
+    if image is None:
+        return {"success": False, "message": "Could not decode image"}
+    return verify_single_face(image)
+
+
 def verify_single_face(image_rgb) -> dict:
     gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(80, 80))
+    faces = get_face_cascade().detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(80, 80))
     
     if len(faces) == 0:
         return {"success": False, "message": "No face detected"}
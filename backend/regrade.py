@@ -0,0 +1,139 @@
+"""Regrade every attempt in RESULTS_DIR with the current rubrics.
+
+Uses the same grading engine as /finish_exam, spreads students across a
+process pool and rate-limits LLM calls across all workers. Finished
+folders are journaled so an interrupted run can continue with --resume.
+
+    python regrade.py --workers 8 --llm-rate 20
+    python regrade.py --resume
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from storage import (
+    RESULTS_DIR, FOLDER_NAME_PATTERN, read_answers, save_grading_results, save_summary
+)
+from transcription import attach_speech
+
+DEFAULT_JOURNAL = RESULTS_DIR / "regrade.journal"
+
+_worker_loop = None
+_worker_engine = None
+
+
+def find_attempt_folders(results_dir: Path) -> list:
+    folders = []
+    for entry in os.scandir(results_dir):
+        if entry.is_dir() and FOLDER_NAME_PATTERN.match(entry.name):
+            folders.append(entry.name)
+    return sorted(folders)
+
+
+def read_journal(journal: Path) -> set:
+    if not journal.exists():
+        return set()
+    with open(journal, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _init_worker(concurrency: int, rate: float):
+    global _worker_loop, _worker_engine
+    # Imported per worker so the grading cache's SQLite connection is never
+    # opened in the parent and inherited across fork
+    from grading import GradingEngine
+
+    # One loop per process for its whole life: the async LLM client and the
+    # engine's semaphore are bound to the loop they were first used on
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    _worker_engine = GradingEngine(concurrency=concurrency, rate=rate)
+
+
+async def _regrade_folder(folder: Path, use_cache: bool) -> tuple:
+    from grading import build_summary
+
+    answers = read_answers(folder)
+    if not answers:
+        return folder.name, None
+    answers = attach_speech(folder, answers)
+    student_id = FOLDER_NAME_PATTERN.match(folder.name).group("student_id")
+    results = await _worker_engine.grade_answers(answers, use_cache=use_cache)
+    summary = build_summary(student_id, answers, results)
+    save_grading_results(folder, results)
+    save_summary(folder, summary)
+    return folder.name, summary["percentage"]
+
+
+def regrade_chunk(results_dir: str, names: list, use_cache: bool) -> list:
+    async def run():
+        return await asyncio.gather(
+            *(_regrade_folder(Path(results_dir) / name, use_cache) for name in names),
+            return_exceptions=True
+        )
+
+    outcomes = _worker_loop.run_until_complete(run())
+    return [
+        (name, None, repr(outcome)) if isinstance(outcome, BaseException) else (name, outcome[1], None)
+        for name, outcome in zip(names, outcomes)
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=16, help="students graded concurrently per task")
+    parser.add_argument("--llm-concurrency", type=int, default=32, help="in-flight LLM calls across all workers")
+    parser.add_argument("--llm-rate", type=float, default=0, help="LLM requests/second across all workers (0 = unlimited)")
+    parser.add_argument("--journal", type=Path, default=None, help=f"progress journal (default: {DEFAULT_JOURNAL.name} in the results dir)")
+    parser.add_argument("--resume", action="store_true", help="skip folders already recorded in the journal")
+    parser.add_argument("--force", action="store_true", help="bypass the LLM grading cache")
+    args = parser.parse_args(argv)
+
+    journal = args.journal or args.results_dir / DEFAULT_JOURNAL.name
+    done = read_journal(journal) if args.resume else set()
+    if not args.resume and journal.exists():
+        journal.unlink()
+
+    pending = [name for name in find_attempt_folders(args.results_dir) if name not in done]
+    print(f"{len(pending)} attempts to grade ({len(done)} already done)")
+    if not pending:
+        return 0
+
+    workers = max(1, min(args.workers, len(pending)))
+    per_worker_concurrency = max(1, args.llm_concurrency // workers)
+    per_worker_rate = args.llm_rate / workers if args.llm_rate > 0 else 0
+    chunks = [pending[i:i + args.chunk_size] for i in range(0, len(pending), args.chunk_size)]
+
+    started = time.monotonic()
+    graded = skipped = failed = 0
+    with open(journal, "a", encoding="utf-8") as journal_file, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(per_worker_concurrency, per_worker_rate)
+    ) as pool:
+        futures = [pool.submit(regrade_chunk, str(args.results_dir), chunk, not args.force) for chunk in chunks]
+        for future in as_completed(futures):
+            for name, percentage, error in future.result():
+                if error:
+                    failed += 1
+                    print(f"FAILED {name}: {error}", file=sys.stderr)
+                    continue
+                if percentage is None:
+                    skipped += 1
+                else:
+                    graded += 1
+                journal_file.write(name + "\n")
+            journal_file.flush()
+            elapsed = time.monotonic() - started
+            print(f"{graded + skipped + failed}/{len(pending)} processed ({elapsed:.1f}s)", flush=True)
+
+    print(f"graded {graded}, skipped {skipped} without answers, failed {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
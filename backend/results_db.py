@@ -0,0 +1,248 @@
+"""SQLite results store used when RESULTS_BACKEND=sqlite.
+
+Holds the same data as the per-student CSV/JSON files, one row per
+answer, incident and graded question, keyed by the attempt (the student's
+result folder name). Folders are still created for recordings and face
+samples. Import existing folders with:
+
+    python results_db.py migrate [--results-dir results] [--force]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+GRADING_FIELDS = ["question_id", "section_id", "grading_type", "max_marks",
+                  "auto_score", "ai_score", "final_score", "feedback", "subject", "exam_set"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY, attempt TEXT NOT NULL, student_id TEXT, exam_set TEXT, subject TEXT,
+    section_id TEXT, question_id TEXT, question_number TEXT, question_prompt TEXT, correct_answer TEXT,
+    selected_option TEXT, spoken_answer TEXT
+);
+CREATE INDEX IF NOT EXISTS answers_attempt ON answers (attempt, id);
+CREATE TABLE IF NOT EXISTS latest_answers (
+    attempt TEXT NOT NULL, section_id TEXT NOT NULL, question_id TEXT NOT NULL, answer_id INTEGER NOT NULL,
+    PRIMARY KEY (attempt, section_id, question_id)
+);
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY, attempt TEXT NOT NULL, incident_type TEXT, details TEXT, question_context TEXT,
+    started_at TEXT, ended_at TEXT, duration_ms TEXT, count TEXT
+);
+CREATE INDEX IF NOT EXISTS incidents_attempt ON incidents (attempt, id);
+CREATE TABLE IF NOT EXISTS grading (
+    id INTEGER PRIMARY KEY, attempt TEXT NOT NULL, question_id TEXT, section_id TEXT, grading_type TEXT,
+    max_marks TEXT, auto_score TEXT, ai_score TEXT, final_score TEXT, feedback TEXT, subject TEXT, exam_set TEXT
+);
+CREATE INDEX IF NOT EXISTS grading_attempt ON grading (attempt, id);
+CREATE TABLE IF NOT EXISTS summaries (
+    attempt TEXT PRIMARY KEY, student_id TEXT, percentage REAL, updated_at REAL NOT NULL, summary TEXT NOT NULL
+);
+"""
+
+
+def as_text(value) -> str:
+    """Stored the way csv.writer would have written it, so readers see the same strings."""
+    return "" if value is None else str(value)
+
+
+class SQLiteStore:
+    """Per-process SQLite connection (WAL) with one writer at a time.
+
+    The connection is opened on first use with `schema` applied, and
+    reopened after a fork so pool workers never share the parent's handle.
+    """
+
+    schema = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._upgrade(conn)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _upgrade(self, conn: sqlite3.Connection):
+        """Bring a database created by an older version up to `schema`."""
+
+
+class ResultsDB(SQLiteStore):
+    schema = SCHEMA
+
+    def _upgrade(self, conn: sqlite3.Connection):
+        # Databases created before grading rows carried subject/exam_set
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(grading)")}
+        for column in ("subject", "exam_set"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE grading ADD COLUMN {column} TEXT")
+
+    def _write(self, statements: list):
+        """Run [(sql, rows)] with executemany in a single transaction."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in statements:
+                    conn.executemany(sql, rows)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def _insert(self, table: str, fields: list) -> str:
+        return f"INSERT INTO {table} (attempt, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})"
+
+    def reset_attempt(self, attempt: str):
+        self._write([
+            (f"DELETE FROM {table} WHERE attempt = ?", [(attempt,)])
+            for table in ("answers", "latest_answers", "incidents")
+        ])
+
+    def append(self, table: str, fields: list, rows: list):
+        """rows: [(attempt, [values in `fields` order])]"""
+        rows = [(attempt, *map(as_text, row)) for attempt, row in rows]
+        if table != "answers":
+            self._write([(self._insert(table, fields), rows)])
+            return
+
+        # Every answer row is history; latest_answers points each question at its newest row.
+        # The upsert keeps the latest_answers rowid, so questions stay in the order first answered
+        section, question = fields.index("section_id") + 1, fields.index("question_id") + 1
+        insert = self._insert(table, fields)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row in rows:
+                    answer_id = conn.execute(insert, row).lastrowid
+                    conn.execute(
+                        "INSERT INTO latest_answers (attempt, section_id, question_id, answer_id) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (attempt, section_id, question_id) DO UPDATE SET answer_id = excluded.answer_id",
+                        (row[0], row[section], row[question], answer_id)
+                    )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def read_latest_answers(self, fields: list, attempt: str) -> list:
+        rows = self._query(
+            f"SELECT {', '.join('a.' + f for f in fields)} FROM latest_answers l JOIN answers a ON a.id = l.answer_id "
+            "WHERE l.attempt = ? ORDER BY l.rowid",
+            (attempt,)
+        )
+        return [dict(zip(fields, row)) for row in rows]
+
+    def read(self, table: str, fields: list, attempt: str) -> list:
+        rows = self._query(f"SELECT {', '.join(fields)} FROM {table} WHERE attempt = ? ORDER BY id", (attempt,))
+        return [dict(zip(fields, row)) for row in rows]
+
+    def save_grading(self, attempt: str, results: list):
+        rows = [(attempt, *(as_text(r.get(field)) for field in GRADING_FIELDS)) for r in results]
+        self._write([
+            ("DELETE FROM grading WHERE attempt = ?", [(attempt,)]),
+            (self._insert("grading", GRADING_FIELDS), rows)
+        ])
+
+    def save_summary(self, attempt: str, summary: dict):
+        self._write([(
+            "INSERT OR REPLACE INTO summaries (attempt, student_id, percentage, updated_at, summary) VALUES (?, ?, ?, ?, ?)",
+            [(attempt, summary.get("student_id"), summary.get("percentage"), time.time(), json.dumps(summary))]
+        )])
+
+    def read_summary(self, attempt: str) -> Optional[dict]:
+        rows = self._query("SELECT summary FROM summaries WHERE attempt = ?", (attempt,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def iter_summaries(self) -> list:
+        return [(attempt, json.loads(summary)) for attempt, summary in
+                self._query("SELECT attempt, summary FROM summaries ORDER BY attempt")]
+
+    def iter_results(self) -> list:
+        """[(attempt, summary, grading rows)] for every graded attempt, in two queries."""
+        grading = {}
+        for row in self._query(f"SELECT attempt, {', '.join(GRADING_FIELDS)} FROM grading ORDER BY attempt, id"):
+            grading.setdefault(row[0], []).append(dict(zip(GRADING_FIELDS, row[1:])))
+        return [(attempt, summary, grading.get(attempt, [])) for attempt, summary in self.iter_summaries()]
+
+    def has_attempt(self, attempt: str) -> bool:
+        return bool(self._query(
+            "SELECT 1 FROM answers WHERE attempt = ? UNION ALL SELECT 1 FROM summaries WHERE attempt = ? LIMIT 1",
+            (attempt, attempt)
+        ))
+
+    def delete_attempt(self, attempt: str):
+        self._write([(f"DELETE FROM {table} WHERE attempt = ?", [(attempt,)])
+                     for table in ("answers", "latest_answers", "incidents", "grading", "summaries")])
+
+
+def migrate(results_dir: Path, db: ResultsDB, force: bool = False) -> tuple:
+    """Copy every attempt folder's CSV/JSON files into db; returns (imported, skipped)."""
+    import storage
+
+    imported = skipped = 0
+    for entry in sorted(os.scandir(results_dir), key=lambda e: e.name):
+        if not (entry.is_dir() and storage.FOLDER_NAME_PATTERN.match(entry.name)):
+            continue
+        folder = Path(entry.path)
+        if db.has_attempt(entry.name):
+            if not force:
+                skipped += 1
+                continue
+            db.delete_attempt(entry.name)
+
+        answers = storage.read_answers_file(folder)
+        incidents = storage.read_incidents_file(folder)
+        db.append("answers", storage.ANSWER_FIELDS,
+                  [(entry.name, [a.get(field) for field in storage.ANSWER_FIELDS]) for a in answers])
+        db.append("incidents", storage.INCIDENT_FIELDS,
+                  [(entry.name, [i.get(field) for field in storage.INCIDENT_FIELDS]) for i in incidents])
+        grading = storage.read_grading_file(folder)
+        if grading:
+            db.save_grading(entry.name, grading)
+        summary = storage.read_summary_file(folder)
+        if summary:
+            db.save_summary(entry.name, summary)
+        imported += 1
+    return imported, skipped
+
+
+def main(argv=None) -> int:
+    import storage
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate", help="import existing result folders")
+    migrate_parser.add_argument("--results-dir", type=Path, default=storage.RESULTS_DIR)
+    migrate_parser.add_argument("--db", type=Path, default=storage.RESULTS_DB_PATH)
+    migrate_parser.add_argument("--force", action="store_true", help="re-import attempts already in the database")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    imported, skipped = migrate(args.results_dir, ResultsDB(args.db), args.force)
+    print(f"imported {imported} attempts, skipped {skipped} already present ({time.monotonic() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from storage import BASE_DIR
+
+# "memory" keeps state in this process; "sqlite" shares it between uvicorn workers on one host
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+SHARED_STATE_PATH = Path(os.getenv("SHARED_STATE_PATH", str(BASE_DIR / "cache" / "shared_state.sqlite3")))
+
+# fn(current value or None) -> (new value or None to delete, result)
+TransactFn = Callable[[Optional[dict]], tuple]
+
+
+class MemoryState:
+    """Namespaced dict store for state owned by a single process."""
+
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        return self._data.get(namespace, {}).get(key)
+
+    def put(self, namespace: str, key: str, value: dict):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = value
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def items(self, namespace: str) -> list:
+        with self._lock:
+            return list(self._data.get(namespace, {}).items())
+
+    def transact(self, namespace: str, key: str, fn: TransactFn) -> Any:
+        with self._lock:
+            bucket = self._data.setdefault(namespace, {})
+            value, result = fn(bucket.get(key))
+            if value is None:
+                bucket.pop(key, None)
+            else:
+                bucket[key] = value
+            return result
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn, which updates this store; in memory that is quick enough for the event loop."""
+        return fn(*args, **kwargs)
+
+
+class SQLiteState:
+    """The same store in a SQLite WAL database, so every worker sees one copy.
+
+    `transact` runs its read-modify-write under BEGIN IMMEDIATE, which makes
+    it atomic across processes. Values must be JSON-serializable.
+
+    BEGIN IMMEDIATE waits (up to the connection timeout) while another
+    worker holds the write lock, so handlers go through `call`, which runs
+    their updates one at a time on a dedicated thread instead of the event
+    loop.
+    """
+
+    shared = True
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: str, value: dict):
+        with self._lock:
+            self._write(namespace, key, value)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def transact(self, namespace: str, key: str, fn: TransactFn) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                value, result = fn(json.loads(row[0]) if row else None)
+                if value is None:
+                    if row:
+                        self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    self._write(namespace, key, value)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn on the state thread; calls made through here never run concurrently."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def _write(self, namespace: str, key: str, value: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time())
+        )
+
+
+def create_state(backend: str = SHARED_STATE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteState(SHARED_STATE_PATH)
+    if backend != "memory":
+        raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+    return MemoryState()
+
+
+shared_state = create_state()
@@ -1,98 +1,455 @@
 import csv
+import fcntl
+import glob
 import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
+from results_db import ResultsDB, GRADING_FIELDS, as_text
+from analytics import CohortAnalytics
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).resolve().parent.parent
-RESULTS_DIR = BASE_DIR / "results"
-RESULTS_DIR.mkdir(exist_ok=True)
+RESULTS_DIR = Path(os.getenv("RESULTS_DIR", str(BASE_DIR / "results")))
+RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+REGISTRY_FILE = RESULTS_DIR / "registry.log"
+
+# "files" keeps CSV/JSON files per student folder; "sqlite" keeps the same data in RESULTS_DB_PATH
+RESULTS_BACKEND = os.getenv("RESULTS_BACKEND", "files").lower()
+RESULTS_DB_PATH = Path(os.getenv("RESULTS_DB_PATH", str(RESULTS_DIR / "results.sqlite3")))
+# Cohort aggregates updated on every save_grading_results/save_summary (rebuild with `python analytics.py rebuild`)
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1").lower() not in ("0", "false", "no")
+ANALYTICS_DB_PATH = Path(os.getenv("ANALYTICS_DB_PATH", str(RESULTS_DIR / "analytics.sqlite3")))
+
+STORAGE_IO = Histogram("storage_io_seconds", "Time spent in results storage reads and writes", ("op",))
+
+
+def timed_io(fn):
+    """Record each call of fn in STORAGE_IO under its name."""
+    return STORAGE_IO.labels(fn.__name__).time()(fn)
+
+
+FOLDER_NAME_PATTERN = re.compile(r"^(?P<student_id>.+)_(?P<date>\d{4}-\d{2}-\d{2})$")
+
+
+class FolderRegistry:
+    """Maps student_id to the folder of their active attempt.
+
+    Loaded once from an append-only journal (or built from RESULTS_DIR when
+    the journal is missing) and kept up to date by create_student_folder, so
+    resolving a folder is a dict lookup instead of a glob + stat over every
+    result folder. The journal is compacted on load; last entry wins.
+    Reading, compacting and appending to it hold file_lock on the journal,
+    so workers starting together neither collide nor drop each other's
+    entries.
+
+    Other uvicorn workers append to the same journal, so every lookup
+    first stats it and reads whatever was appended since (the whole file
+    again if it was compacted); a /start_exam on one worker is then seen
+    by the rest on their next request for that student.
+    """
+
+    def __init__(self, results_dir: Path, registry_file: Path):
+        self.results_dir = results_dir
+        self.registry_file = registry_file
+        self._lock = threading.Lock()
+        self._folders = {}
+        self._loaded = False
+        # (inode, bytes read) of the journal as of our last read
+        self._journal_state = None
+
+    def _scan(self) -> dict:
+        latest = {}
+        for entry in os.scandir(self.results_dir):
+            match = FOLDER_NAME_PATTERN.match(entry.name)
+            if not match or not entry.is_dir():
+                continue
+            # Same rule as the old glob lookup: most recently touched attempt wins
+            mtime = entry.stat().st_mtime
+            student_id = match.group("student_id")
+            if student_id not in latest or mtime > latest[student_id][0]:
+                latest[student_id] = (mtime, entry.name)
+        return {student_id: name for student_id, (_, name) in latest.items()}
+
+    def _read_journal(self) -> Optional[dict]:
+        if not self.registry_file.exists():
+            return None
+        folders = {}
+        with open(self.registry_file, "r", encoding="utf-8") as f:
+            for line in f:
+                student_id, _, name = line.rstrip("\n").partition("\t")
+                if student_id and name:
+                    folders[student_id] = name
+        return folders
+
+    def _compact(self):
+        with atomic_write(self.registry_file) as f:
+            for student_id, name in self._folders.items():
+                f.write(f"{student_id}\t{name}\n")
+
+    def _append(self, student_id: str, name: str):
+        with file_lock(self.registry_file), open(self.registry_file, "a", encoding="utf-8") as f:
+            f.write(f"{student_id}\t{name}\n")
+
+    def load(self, rebuild: bool = False):
+        with self._lock, file_lock(self.registry_file):
+            folders = None if rebuild else self._read_journal()
+            self._folders = folders if folders is not None else self._scan()
+            self._compact()
+            stat = os.stat(self.registry_file)
+            self._journal_state = (stat.st_ino, stat.st_size)
+            self._loaded = True
+
+    def _sync(self):
+        """Apply journal entries written by other processes since our last read."""
+        try:
+            stat = os.stat(self.registry_file)
+        except FileNotFoundError:
+            return
+        if (stat.st_ino, stat.st_size) == self._journal_state:
+            return
+        with self._lock:
+            inode, offset = self._journal_state or (None, 0)
+            if stat.st_ino != inode or stat.st_size < offset:
+                # Compacted (replaced) by another worker; its entries are a superset of what we read
+                offset = 0
+            with open(self.registry_file, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # A line still being appended is picked up on the next lookup
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].decode("utf-8").splitlines():
+                student_id, _, name = line.partition("\t")
+                if student_id and name:
+                    self._folders[student_id] = name
+            self._journal_state = (stat.st_ino, offset + end)
+
+    def get(self, student_id: str) -> Optional[Path]:
+        if not self._loaded:
+            self.load()
+        self._sync()
+        name = self._folders.get(student_id)
+        if name:
+            folder = self.results_dir / name
+            if folder.is_dir():
+                return folder
+        # Registry miss or stale entry: the folder may have been created by
+        # another process, so fall back to a scan for this student only
+        return self._refresh(student_id)
+
+    def _refresh(self, student_id: str) -> Optional[Path]:
+        candidates = []
+        for p in self.results_dir.glob(f"{glob.escape(student_id)}_*"):
+            match = FOLDER_NAME_PATTERN.match(p.name)
+            if match and match.group("student_id") == student_id and p.is_dir():
+                candidates.append(p)
+        with self._lock:
+            if not candidates:
+                self._folders.pop(student_id, None)
+                return None
+            folder = max(candidates, key=lambda p: p.stat().st_mtime)
+            self._folders[student_id] = folder.name
+            self._append(student_id, folder.name)
+            return folder
+
+    def set(self, student_id: str, folder: Path):
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            if self._folders.get(student_id) != folder.name:
+                self._folders[student_id] = folder.name
+                self._append(student_id, folder.name)
+
+
+folder_registry = FolderRegistry(RESULTS_DIR, REGISTRY_FILE)
 
 
 def get_student_folder(student_id: str) -> Optional[Path]:
-    folders = list(RESULTS_DIR.glob(f"{student_id}_*"))
-    if folders:
-        return max(folders, key=lambda p: p.stat().st_mtime)
-    return None
+    return folder_registry.get(student_id)
 
 
 def create_student_folder(student_id: str) -> Path:
     timestamp = datetime.now().strftime("%Y-%m-%d")
     folder = RESULTS_DIR / f"{student_id}_{timestamp}"
     folder.mkdir(parents=True, exist_ok=True)
+    folder_registry.set(student_id, folder)
     return folder
 
 
+ANSWERS_FILE = "answers.csv"
+# Latest answer per (section_id, question_id); answers.csv keeps every revision
+ANSWERS_LATEST_FILE = "answers_latest.json"
+INCIDENTS_FILE = "incidents.csv"
+
+ANSWER_FIELDS = ["student_id", "exam_set", "subject", "section_id", "question_id",
+                 "question_number", "question_prompt", "correct_answer",
+                 "selected_option", "spoken_answer"]
+INCIDENT_FIELDS = ["incident_type", "details", "question_context",
+                   "started_at", "ended_at", "duration_ms", "count"]
+# What the episode columns mean for rows written before them: each row was one reported incident
+LEGACY_INCIDENT_DEFAULTS = {"count": "1"}
+
+# Table each row file maps to in the SQLite backend
+RESULT_TABLES = {ANSWERS_FILE: "answers", INCIDENTS_FILE: "incidents"}
+
+if RESULTS_BACKEND not in ("files", "sqlite"):
+    raise ValueError(f"Unknown RESULTS_BACKEND: {RESULTS_BACKEND}")
+results_store = ResultsDB(RESULTS_DB_PATH) if RESULTS_BACKEND == "sqlite" else None
+cohort_analytics = CohortAnalytics(ANALYTICS_DB_PATH) if ANALYTICS_ENABLED else None
+
+
+def _update_analytics(method: str, folder: Path, *args):
+    # The stored results stay the source of truth; a failed update is logged and fixed by a rebuild
+    if cohort_analytics is None:
+        return
+    try:
+        getattr(cohort_analytics, method)(folder.name, *args)
+    except Exception:
+        logger.exception("Failed to update cohort analytics for %s", folder.name)
+
+
+def answer_row(data: dict) -> list:
+    return [
+        data.get("student_id", ""),
+        data.get("exam_set", "A"),
+        data.get("subject", ""),
+        data.get("section_id", ""),
+        data.get("question_id", ""),
+        data.get("question_number", ""),
+        data.get("question_prompt", ""),
+        data.get("correct_answer", ""),
+        data.get("selected_option", "") if data.get("subject") == "maths" else "",
+        data.get("spoken_answer", "")
+    ]
+
+
+def incident_row(data: dict) -> list:
+    return [
+        data.get("incident_type", ""),
+        data.get("details", ""),
+        data.get("question_context", ""),
+        data.get("started_at", ""),
+        data.get("ended_at", ""),
+        data.get("duration_ms", ""),
+        data.get("count", 1)
+    ]
+
+
+@contextmanager
+def atomic_write(path: Path, newline: Optional[str] = None):
+    """Write to a temp file next to path and rename it into place on success."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "w", newline=newline, encoding="utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock on path across processes (uvicorn workers), held through a .lock file beside it.
+
+    A separate lock file keeps the lock valid while path itself is replaced
+    by atomic_write.
+    """
+    with open(path.with_name(f".{path.name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@timed_io
 def init_student_files(folder: Path):
-    answers_file = folder / "answers.csv"
-    incidents_file = folder / "incidents.csv"
+    if results_store is not None:
+        results_store.reset_attempt(folder.name)
+        return
+    
+    answers_file = folder / ANSWERS_FILE
+    incidents_file = folder / INCIDENTS_FILE
     
     with open(answers_file, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["student_id", "exam_set", "subject", "section_id", "question_id", 
-                        "question_number", "question_prompt", "correct_answer", 
-                        "selected_option", "spoken_answer"])
+        writer.writerow(ANSWER_FIELDS)
     
     with open(incidents_file, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["incident_type", "details", "question_context"])
+        writer.writerow(INCIDENT_FIELDS)
+    
+    with file_lock(folder / ANSWERS_LATEST_FILE), atomic_write(folder / ANSWERS_LATEST_FILE) as f:
+        json.dump([], f)
 
 
-def save_answer_row(folder: Path, data: dict):
-    answers_file = folder / "answers.csv"
-    file_exists = answers_file.exists()
-    
-    with open(answers_file, "a", newline="", encoding="utf-8") as f:
+def legacy_header(path: Path, header: list) -> Optional[list]:
+    """The file's header if it is an older, shorter version of `header` (columns were added since)."""
+    try:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            current = next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+    if current and len(current) < len(header) and header[:len(current)] == current:
+        return current
+    return None
+
+
+def upgrade_csv_header(path: Path, header: list):
+    """Rewrite a file started under a shorter header with the current one before appending to it.
+
+    Rows already in it are padded (incidents get LEGACY_INCIDENT_DEFAULTS),
+    so attempts in progress across a deploy keep one consistent layout.
+    """
+    if legacy_header(path, header) is None:
+        return
+    defaults = LEGACY_INCIDENT_DEFAULTS if path.name == INCIDENTS_FILE else {}
+    rows = _read_csv(path, header)
+    with atomic_write(path, newline="") as f:
         writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["student_id", "exam_set", "subject", "section_id", "question_id",
-                           "question_number", "question_prompt", "correct_answer",
-                           "selected_option", "spoken_answer"])
-        writer.writerow([
-            data.get("student_id", ""),
-            data.get("exam_set", "A"),
-            data.get("subject", ""),
-            data.get("section_id", ""),
-            data.get("question_id", ""),
-            data.get("question_number", ""),
-            data.get("question_prompt", ""),
-            data.get("correct_answer", ""),
-            data.get("selected_option", "") if data.get("subject") == "maths" else "",
-            data.get("spoken_answer", "")
-        ])
+        writer.writerow(header)
+        writer.writerows([[row.get(field) or defaults.get(field, "") for field in header] for row in rows])
+    logger.info("Upgraded %s to the current %d-column header", path, len(header))
 
 
-def save_incident_row(folder: Path, data: dict):
-    incidents_file = folder / "incidents.csv"
-    file_exists = incidents_file.exists()
+@timed_io
+def append_rows(path: Path, header: list, rows: list):
+    if results_store is not None:
+        results_store.append(RESULT_TABLES[path.name], header, [(path.parent.name, row) for row in rows])
+        return
     
-    with open(incidents_file, "a", newline="", encoding="utf-8") as f:
+    upgrade_csv_header(path, header)
+    file_exists = path.exists()
+    
+    with open(path, "a", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         if not file_exists:
-            writer.writerow(["incident_type", "details", "question_context"])
-        writer.writerow([
-            data.get("incident_type", ""),
-            data.get("details", ""),
-            data.get("question_context", "")
-        ])
+            writer.writerow(header)
+        writer.writerows(rows)
 
 
-def read_answers(folder: Path) -> list:
-    answers_file = folder / "answers.csv"
-    if not answers_file.exists():
+def save_answer_row(folder: Path, data: dict):
+    row = answer_row(data)
+    if results_store is not None:
+        append_rows(folder / ANSWERS_FILE, ANSWER_FIELDS, [row])
+        return
+    with file_lock(folder / ANSWERS_LATEST_FILE):
+        append_rows(folder / ANSWERS_FILE, ANSWER_FIELDS, [row])
+        update_latest_answers(folder, [row])
+
+
+def latest_by_question(answers: list) -> list:
+    """Keep the last answer per (section_id, question_id), in the order questions were first answered."""
+    latest = {}
+    for answer in answers:
+        latest[(answer.get("section_id"), answer.get("question_id"))] = answer
+    return list(latest.values())
+
+
+@timed_io
+def update_latest_answers(folder: Path, rows: list):
+    """Upsert rows (in ANSWER_FIELDS order, already appended to answers.csv) into the latest-answer index.
+
+    Callers hold file_lock(folder / ANSWERS_LATEST_FILE) across the append
+    and this call, so workers saving to one folder neither lose updates
+    nor apply them out of history order.
+    """
+    latest_file = folder / ANSWERS_LATEST_FILE
+    if not latest_file.exists():
+        # Attempts from before the index existed: build it from the full history once
+        answers = read_answers_file(folder)
+    else:
+        with open(latest_file, "r", encoding="utf-8") as f:
+            answers = json.load(f)
+        answers += [dict(zip(ANSWER_FIELDS, map(as_text, row))) for row in rows]
+    with atomic_write(latest_file) as f:
+        json.dump(latest_by_question(answers), f)
+
+
+def save_incident_row(folder: Path, data: dict):
+    append_rows(folder / INCIDENTS_FILE, INCIDENT_FIELDS, [incident_row(data)])
+
+
+def _read_csv(path: Path, fields: Optional[list] = None) -> list:
+    if not path.exists():
         return []
-    
-    with open(answers_file, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
+        if fields and reader.fieldnames and len(reader.fieldnames) < len(fields) \
+                and fields[:len(reader.fieldnames)] == reader.fieldnames:
+            # Started under an older header; rows appended since carry the newer columns
+            reader.fieldnames = fields
+            reader.restval = ""
         return list(reader)
 
 
+def read_answers_file(folder: Path) -> list:
+    return _read_csv(folder / ANSWERS_FILE)
+
+
+def read_incidents_file(folder: Path) -> list:
+    return _read_csv(folder / INCIDENTS_FILE, INCIDENT_FIELDS)
+
+
+def read_grading_file(folder: Path) -> list:
+    return _read_csv(folder / "grading.csv")
+
+
+def read_summary_file(folder: Path) -> Optional[dict]:
+    summary_file = folder / "summary.json"
+    if summary_file.exists():
+        with open(summary_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+@timed_io
+def read_answers(folder: Path) -> list:
+    """The latest answer to each question; see read_answer_history for every revision."""
+    if results_store is not None:
+        return results_store.read_latest_answers(ANSWER_FIELDS, folder.name)
+    latest_file = folder / ANSWERS_LATEST_FILE
+    if latest_file.exists():
+        with open(latest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return latest_by_question(read_answers_file(folder))
+
+
+@timed_io
+def read_answer_history(folder: Path) -> list:
+    if results_store is not None:
+        return results_store.read("answers", ANSWER_FIELDS, folder.name)
+    return read_answers_file(folder)
+
+
+@timed_io
+def read_incidents(folder: Path) -> list:
+    if results_store is not None:
+        return results_store.read("incidents", INCIDENT_FIELDS, folder.name)
+    return read_incidents_file(folder)
+
+
+@timed_io
 def save_grading_results(folder: Path, results: list):
+    match = FOLDER_NAME_PATTERN.match(folder.name)
+    _update_analytics("record_grading", folder, match.group("student_id") if match else folder.name, results)
+    if results_store is not None:
+        results_store.save_grading(folder.name, results)
+        return
+    
     grading_file = folder / "grading.csv"
-    with open(grading_file, "w", newline="", encoding="utf-8") as f:
+    with atomic_write(grading_file, newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(["question_id", "section_id", "grading_type", "max_marks", 
-                        "auto_score", "ai_score", "final_score", "feedback"])
+        writer.writerow(GRADING_FIELDS)
         for r in results:
             writer.writerow([
                 r.get("question_id"),
@@ -102,28 +459,56 @@ def save_grading_results(folder: Path, results: list):
                 r.get("auto_score"),
                 r.get("ai_score"),
                 r.get("final_score"),
-                r.get("feedback", "")
+                r.get("feedback", ""),
+                r.get("subject", ""),
+                r.get("exam_set", "")
             ])
 
 
+@timed_io
 def save_summary(folder: Path, summary: dict):
+    _update_analytics("record_summary", folder, summary)
+    if results_store is not None:
+        results_store.save_summary(folder.name, summary)
+        return
+    
     summary_file = folder / "summary.json"
-    with open(summary_file, "w", encoding="utf-8") as f:
+    with atomic_write(summary_file) as f:
         json.dump(summary, f, indent=2)
 
 
+@timed_io
 def read_summary(folder: Path) -> Optional[dict]:
-    summary_file = folder / "summary.json"
-    if summary_file.exists():
-        with open(summary_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
+    if results_store is not None:
+        return results_store.read_summary(folder.name)
+    return read_summary_file(folder)
 
 
+@timed_io
 def read_grading(folder: Path) -> list:
-    grading_file = folder / "grading.csv"
-    if grading_file.exists():
-        with open(grading_file, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            return list(reader)
-    return []
+    if results_store is not None:
+        return results_store.read("grading", GRADING_FIELDS, folder.name)
+    return read_grading_file(folder)
+
+
+def iter_summaries() -> list:
+    """[(attempt folder name, summary)] for every graded attempt."""
+    if results_store is not None:
+        return results_store.iter_summaries()
+    summaries = []
+    for entry in sorted(os.scandir(RESULTS_DIR), key=lambda e: e.name):
+        if entry.is_dir() and FOLDER_NAME_PATTERN.match(entry.name):
+            summary = read_summary_file(Path(entry.path))
+            if summary:
+                summaries.append((entry.name, summary))
+    return summaries
+
+
+def iter_results() -> list:
+    """[(attempt folder name, summary, grading rows)] for every graded attempt."""
+    if results_store is not None:
+        return results_store.iter_results()
+    return [
+        (attempt, summary, read_grading_file(RESULTS_DIR / attempt))
+        for attempt, summary in iter_summaries()
+    ]
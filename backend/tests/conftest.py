@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules are imported flat, as uvicorn runs them from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# storage creates RESULTS_DIR (and the databases under it) on import; keep that out of the repo
+os.environ.setdefault("RESULTS_DIR", tempfile.mkdtemp(prefix="exam-tests-"))
+os.environ.setdefault("GRADING_CACHE_ENABLED", "0")
@@ -0,0 +1,66 @@
+import storage
+from analytics import CohortAnalytics, rebuild
+
+
+def graded(question_id, section_id, final_score, max_marks, subject="english", exam_set="A"):
+    return {"question_id": question_id, "section_id": section_id, "grading_type": "keyword", "max_marks": max_marks,
+            "auto_score": final_score, "final_score": final_score, "subject": subject, "exam_set": exam_set}
+
+
+def grade(folder, results):
+    folder.mkdir(exist_ok=True)
+    total = sum(r["final_score"] for r in results)
+    total_max = sum(r["max_marks"] for r in results)
+    storage.save_grading_results(folder, results)
+    storage.save_summary(folder, {"student_id": folder.name.split("_")[0], "total_score": total,
+                                  "total_max": total_max, "percentage": round(100 * total / total_max, 2),
+                                  "graded_at": folder.name.split("_")[1]})
+
+
+def aggregates(analytics):
+    return {
+        "leaderboard": analytics.leaderboard(),
+        "english": analytics.leaderboard(subject="english", exam_set="A"),
+        "maths": analytics.leaderboard(subject="maths"),
+        "sections": analytics.sections(),
+        "questions": analytics.questions(sort="attempts", limit=100),
+        "rank": analytics.student_rank("s2"),
+    }
+
+
+def test_incremental_aggregates_match_rebuild_after_regrade(tmp_path, monkeypatch):
+    incremental = CohortAnalytics(tmp_path / "incremental.sqlite3")
+    monkeypatch.setattr(storage, "RESULTS_DIR", tmp_path)
+    monkeypatch.setattr(storage, "cohort_analytics", incremental)
+
+    grade(tmp_path / "s1_2024-05-01", [graded("q1", "reading", 2, 2), graded("q2", "reading", 0.5, 2),
+                                       graded("m1", "maths-mcq", 1, 1, subject="maths")])
+    grade(tmp_path / "s2_2024-05-01", [graded("q1", "reading", 1, 2), graded("q2", "reading", 2, 2),
+                                       graded("w1", "writing", 3.5, 5)])
+    grade(tmp_path / "s3_2024-05-02", [graded("q1", "reading", 0, 2), graded("m1", "maths-mcq", 0, 1, subject="maths")])
+    # Regrades: changed scores, and a question moving off full marks
+    grade(tmp_path / "s2_2024-05-01", [graded("q1", "reading", 2, 2), graded("q2", "reading", 1.5, 2),
+                                       graded("w1", "writing", 4, 5)])
+    grade(tmp_path / "s1_2024-05-01", [graded("q1", "reading", 1.5, 2), graded("q2", "reading", 0.5, 2),
+                                       graded("m1", "maths-mcq", 1, 1, subject="maths")])
+
+    rebuilt = CohortAnalytics(tmp_path / "rebuilt.sqlite3")
+    assert rebuild(rebuilt) == 3
+    assert aggregates(incremental) == aggregates(rebuilt)
+
+    reading = next(s for s in incremental.sections() if s["section_id"] == "reading")
+    assert reading["attempts"] == 3 and reading["score_sum"] == 5.5 and reading["max_sum"] == 10
+    assert [r["attempt"] for r in incremental.leaderboard()["results"]] == ["s2_2024-05-01", "s1_2024-05-01",
+                                                                             "s3_2024-05-02"]
+
+
+def test_rebuild_replaces_existing_aggregates(tmp_path, monkeypatch):
+    analytics = CohortAnalytics(tmp_path / "analytics.sqlite3")
+    monkeypatch.setattr(storage, "RESULTS_DIR", tmp_path)
+    monkeypatch.setattr(storage, "cohort_analytics", analytics)
+    grade(tmp_path / "s1_2024-05-01", [graded("q1", "reading", 2, 2)])
+    before = aggregates(analytics)
+
+    assert rebuild(analytics) == 1
+    assert rebuild(analytics) == 1
+    assert aggregates(analytics) == before
@@ -0,0 +1,40 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+
+
+def test_failed_finish_releases_the_grading_claim(monkeypatch):
+    def unreadable(folder):
+        raise OSError("disk went away")
+
+    with TestClient(app_module.app, raise_server_exceptions=False) as client:
+        client.post("/start_exam", json={"student_id": "finish-1"})
+        monkeypatch.setattr(app_module, "read_answers", unreadable)
+        assert client.post("/finish_exam", json={"student_id": "finish-1"}).status_code == 500
+        assert client.get("/grading/status/finish-1").json()["status"] == "failed"
+
+        monkeypatch.undo()
+        response = client.post("/finish_exam", json={"student_id": "finish-1"})
+        assert response.status_code == 200
+        assert response.json()["message"] == "No answers to grade"
+
+
+def test_housekeeping_survives_a_failing_step(monkeypatch):
+    pruned = []
+
+    def locked(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(app_module.incident_aggregator, "sweep", locked)
+    monkeypatch.setattr(app_module.grading_queue, "prune", lambda: pruned.append(True))
+
+    async def run():
+        task = asyncio.create_task(app_module.housekeeping())
+        await asyncio.sleep(2.5)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(pruned) == 2
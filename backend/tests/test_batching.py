@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+from grading.batching import KeywordBatcher
+from grading.grader import parse_keyword_batch_response
+
+PASSAGE = "The river flooded the village in spring."
+RUBRIC = {"max_marks": 2, "ideas": [{"id": "flood", "marks": 2, "required_any": ["flood"]}]}
+
+
+def reply(*entries):
+    return json.dumps({"results": [{"id": n, "score": score, "feedback": "ok"} for n, score in entries]})
+
+
+def grade_all(batcher, answers, passage=PASSAGE):
+    async def run():
+        return await asyncio.gather(*(batcher.grade(answer, RUBRIC, "What happened?", passage) for answer in answers))
+    return asyncio.run(run())
+
+
+def recorder(text):
+    prompts = []
+
+    async def complete(model, prompt, temperature, max_tokens):
+        prompts.append(prompt)
+        if isinstance(text, Exception):
+            raise text
+        return text
+    return complete, prompts
+
+
+def test_batch_reply_is_split_per_item():
+    complete, prompts = recorder(reply((2, 1), (1, 2), (3, 5)))
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    results = grade_all(batcher, ["a flood", "water", "spring rain"])
+
+    assert len(prompts) == 1 and prompts[0].count(PASSAGE) == 1
+    assert [r["auto_score"] for r in results] == [2, 1, 2]
+    assert all(r["max_marks"] == 2 and r["feedback"] == "[AI] ok" for r in results)
+    assert batcher.stats() == {"batches": 1, "batched": 3, "fallbacks": 0}
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    complete, prompts = recorder(reply((1, 1), (2, 1)))
+    batcher = KeywordBatcher(complete, size=2, window=60)
+
+    results = grade_all(batcher, ["a flood", "water"])
+
+    assert len(prompts) == 1
+    assert [r["auto_score"] for r in results] == [1, 1]
+
+
+def test_passages_are_batched_separately():
+    complete, prompts = recorder(reply((1, 1), (2, 1)))
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.grade("a flood", RUBRIC, "What happened?", PASSAGE),
+            batcher.grade("water", RUBRIC, "What happened?", PASSAGE),
+            batcher.grade("the mill", RUBRIC, "What was built?", "A mill was built by the river."),
+        )
+
+    results = asyncio.run(run())
+    assert len(prompts) == 1
+    assert results[2] is None
+
+
+def test_lone_item_is_not_sent():
+    complete, prompts = recorder(reply((1, 2)))
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    assert grade_all(batcher, ["a flood"]) == [None]
+    assert prompts == []
+
+
+def test_batching_off_when_size_is_one():
+    complete, prompts = recorder(reply((1, 2), (2, 2)))
+    batcher = KeywordBatcher(complete, size=1, window=0.01)
+
+    assert grade_all(batcher, ["a flood", "water"]) == [None, None]
+    assert prompts == []
+
+
+def test_malformed_reply_falls_back_for_every_item():
+    complete, _ = recorder("Sorry, I can't grade these.")
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    assert grade_all(batcher, ["a flood", "water"]) == [None, None]
+    assert batcher.stats() == {"batches": 1, "batched": 0, "fallbacks": 2}
+
+
+def test_missing_id_falls_back_for_that_item_only():
+    complete, _ = recorder(reply((1, 2), (3, 1)))
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    results = grade_all(batcher, ["a flood", "water", "spring rain"])
+
+    assert results[0]["auto_score"] == 2
+    assert results[1] is None
+    assert results[2]["auto_score"] == 1
+    assert batcher.stats() == {"batches": 1, "batched": 2, "fallbacks": 1}
+
+
+def test_failed_request_falls_back_for_every_item():
+    complete, _ = recorder(TimeoutError("LLM timed out"))
+    batcher = KeywordBatcher(complete, size=8, window=0.01)
+
+    assert grade_all(batcher, ["a flood", "water"]) == [None, None]
+    assert batcher.stats()["fallbacks"] == 2
+
+
+def test_parse_batch_response_rejects_bad_entries():
+    text = "Here you go: " + json.dumps({"results": [
+        {"id": 1, "score": 3, "feedback": "too high"},
+        {"id": 1, "score": 0, "feedback": "duplicate"},
+        {"id": 2, "score": "two"},
+        {"id": 3, "score": True},
+        {"id": 9, "score": 1},
+        {"id": "4", "score": 1},
+        "not an entry",
+        {"id": 4, "score": -1},
+    ]})
+
+    parsed = parse_keyword_batch_response(text, [2, 2, 2, 2])
+
+    assert parsed[0] == {"auto_score": 2, "max_marks": 2, "feedback": "[AI] too high"}
+    assert parsed[1] is None and parsed[2] is None
+    assert parsed[3]["auto_score"] == 0
+
+
+def test_parse_batch_response_without_results_list():
+    assert parse_keyword_batch_response('{"score": 2}', [2, 2]) == [None, None]
+    assert parse_keyword_batch_response('{"results": {"id": 1}}', [2]) == [None]
+    assert parse_keyword_batch_response('{"results": [', [2]) == [None]
+    assert parse_keyword_batch_response("", []) == []
@@ -0,0 +1,53 @@
+import multiprocessing
+
+from storage import FolderRegistry
+
+
+def make_worker(tmp_path):
+    registry = FolderRegistry(tmp_path, tmp_path / "registry.log")
+    registry.load()
+    return registry
+
+
+def test_new_attempt_on_one_worker_is_seen_by_another(tmp_path):
+    old = tmp_path / "s1_2026-01-01"
+    old.mkdir()
+    first = make_worker(tmp_path)
+    second = make_worker(tmp_path)
+    assert second.get("s1") == old
+
+    new = tmp_path / "s1_2026-01-02"
+    new.mkdir()
+    first.set("s1", new)
+    assert second.get("s1") == new
+
+
+def test_compaction_by_another_worker_is_reread(tmp_path):
+    first = make_worker(tmp_path)
+    second = make_worker(tmp_path)
+    folder = tmp_path / "s2_2026-01-01"
+    folder.mkdir()
+    first.set("s2", folder)
+    # A third worker starting up compacts (replaces) the journal
+    make_worker(tmp_path)
+    assert second.get("s2") == folder
+
+
+def start_worker(tmp_path, student_id):
+    registry = make_worker(tmp_path)
+    folder = tmp_path / f"{student_id}_2026-01-01"
+    folder.mkdir()
+    registry.set(student_id, folder)
+
+
+def test_workers_starting_together_keep_every_entry(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=start_worker, args=(tmp_path, f"s{i}")) for i in range(16)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * 16
+
+    registry = FolderRegistry(tmp_path, tmp_path / "registry.log")
+    assert registry._read_journal() == {f"s{i}": f"s{i}_2026-01-01" for i in range(16)}
@@ -0,0 +1,25 @@
+import asyncio
+import json
+import sqlite3
+
+from grading import grader
+
+
+class LockedCache:
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def put(self, key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_locked_grading_cache_does_not_fail_grading(monkeypatch):
+    monkeypatch.setattr(grader, "grading_cache", LockedCache())
+
+    async def complete(model, prompt, temperature, max_tokens):
+        return json.dumps({"total": 31, "overall_feedback": "Clear and well organised."})
+
+    result = asyncio.run(grader.grade_speaking_with_ai_async(
+        "I would like to describe my favourite place.", {}, "Describe a place", complete
+    ))
+    assert result["ai_score"] == 31
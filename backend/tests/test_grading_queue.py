@@ -0,0 +1,26 @@
+from grading_queue import answer_fingerprint, stored_answer
+from storage import ANSWER_FIELDS
+
+
+def test_reading_answer_is_graded_without_its_selected_option():
+    ans = {"student_id": "s1", "subject": "english", "section_id": "reading", "question_id": "q1",
+           "selected_option": "B", "spoken_answer": "the sun", "question_number": 3}
+    stored = stored_answer(ans)
+    assert list(stored) == ANSWER_FIELDS
+    assert stored["selected_option"] == ""
+    assert stored["question_number"] == "3"
+    assert answer_fingerprint(stored) == answer_fingerprint(ans)
+
+
+def test_maths_answer_keeps_its_selected_option():
+    ans = {"student_id": "s1", "subject": "maths", "section_id": "maths-mcq", "question_id": "q1",
+           "selected_option": "B", "correct_answer": "B"}
+    assert stored_answer(ans)["selected_option"] == "B"
+
+
+def test_attached_speech_is_kept():
+    speech = {"word_count": 3, "wpm": 120.0, "pause_ratio": 0.1, "pauses": 1, "long_pauses": 0,
+              "response_delay": 0.5, "clarity": 0.9, "text": "I like it"}
+    ans = {"subject": "english", "section_id": "speaking", "question_id": "s1", "speech": speech}
+    assert stored_answer(ans)["speech"] is speech
+    assert answer_fingerprint(ans) != answer_fingerprint({k: v for k, v in ans.items() if k != "speech"})
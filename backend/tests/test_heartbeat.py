@@ -0,0 +1,65 @@
+from heartbeat import HeartbeatMonitor
+from shared_state import MemoryState
+
+TIMEOUT = 10
+RETENTION = 100
+
+
+def make_monitor():
+    return HeartbeatMonitor(MemoryState(), timeout=TIMEOUT, retention=RETENTION)
+
+
+def test_disconnected_student_is_kept_for_retention():
+    monitor = make_monitor()
+    ws = object()
+    monitor.connect("s1", ws, now=0)
+    assert monitor.disconnect("s1", ws, now=6)
+
+    monitor.sweep(now=16)
+    assert monitor.status("s1", now=16)["status"] == "disconnected"
+    monitor.sweep(now=6 + RETENTION - 1)
+    assert monitor.status("s1", now=6 + RETENTION - 1) is not None
+
+    monitor.sweep(now=6 + RETENTION)
+    assert monitor.status("s1", now=6 + RETENTION) is None
+    assert monitor.active() == 0
+
+
+def test_finished_student_is_kept_for_retention():
+    monitor = make_monitor()
+    ws = object()
+    monitor.connect("s1", ws, now=0)
+    monitor.finish("s1", now=4)
+    assert not monitor.disconnect("s1", ws, now=5)
+
+    monitor.sweep(now=20)
+    assert monitor.status("s1", now=20)["status"] == "finished"
+
+    monitor.sweep(now=5 + RETENTION)
+    assert monitor.status("s1", now=5 + RETENTION) is None
+
+
+def test_timed_out_student_is_kept_for_retention():
+    monitor = make_monitor()
+    ws = object()
+    monitor.connect("s1", ws, now=0)
+
+    expired = monitor.sweep(now=TIMEOUT)
+    assert expired == [("s1", ws, True)]
+    monitor.sweep(now=TIMEOUT + RETENTION - 1)
+    assert monitor.status("s1", now=TIMEOUT + RETENTION - 1)["status"] == "timed_out"
+
+    monitor.sweep(now=TIMEOUT + RETENTION)
+    assert monitor.status("s1", now=TIMEOUT + RETENTION) is None
+
+
+def test_reconnect_is_not_forgotten_by_old_session():
+    monitor = make_monitor()
+    first, second = object(), object()
+    monitor.connect("s1", first, now=0)
+    monitor.disconnect("s1", first, now=1)
+    monitor.connect("s1", second, now=2)
+
+    monitor.ping("s1", now=1 + RETENTION)
+    monitor.sweep(now=1 + RETENTION)
+    assert monitor.status("s1", now=1 + RETENTION)["status"] == "connected"
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from grading import matcher
+from grading.grader import grade_keyword
+
+
+def grade_keyword_legacy(answer: str, rubric_config: dict) -> dict:
+    """grade_keyword before rubrics were compiled: one substring check per term."""
+    if not answer:
+        return {"auto_score": 0, "max_marks": rubric_config.get("max_marks", 1), "feedback": "No answer provided"}
+
+    answer_lower = answer.lower()
+    total_score = 0
+    max_marks = rubric_config.get("max_marks", 1)
+    feedback_parts = []
+
+    correct_option = rubric_config.get("correct_option", "").lower()
+    if correct_option:
+        for wrong in [opt for opt in ["a", "b", "c", "d"] if opt != correct_option]:
+            if f"option {wrong}" in answer_lower or f"letter {wrong}" in answer_lower or f" {wrong} " in f" {answer_lower} ":
+                return {"auto_score": 0, "max_marks": max_marks,
+                        "feedback": f"Wrong option selected. Correct answer: {correct_option.upper()}"}
+
+    for idea in rubric_config.get("ideas", []):
+        idea_marks = idea.get("marks", 1)
+        if any(b.lower() in answer_lower for b in idea.get("banned", []) if b):
+            feedback_parts.append(f"[{idea.get('id')}] Contains misconception - 0 marks")
+            continue
+        if any(r.lower() in answer_lower for r in idea.get("required_any", []) if r):
+            score = idea_marks
+            if any(s and s.lower() in answer_lower for s in idea.get("supporting", [])):
+                score = min(score + 0.25, idea_marks)
+            total_score += score
+            feedback_parts.append(f"[{idea.get('id')}] Matched - {score} marks")
+        else:
+            feedback_parts.append(f"[{idea.get('id')}] Not matched - 0 marks")
+
+    return {"auto_score": min(total_score, max_marks), "max_marks": max_marks,
+            "feedback": "; ".join(feedback_parts) if feedback_parts else "Graded by keyword matching"}
+
+
+@pytest.fixture(params=["automaton", "substring"])
+def backend(request, monkeypatch):
+    if request.param == "automaton":
+        if matcher.ahocorasick is None:
+            pytest.skip("pyahocorasick is not installed")
+    else:
+        monkeypatch.setattr(matcher, "ahocorasick", None)
+    # Compiled rubrics are cached by dict identity; start each backend from scratch
+    monkeypatch.setattr(matcher, "_compiled", {})
+    return request.param
+
+
+def idea(idea_id, required=(), banned=(), supporting=(), marks=1):
+    return {"id": idea_id, "marks": marks, "required_any": list(required), "banned": list(banned),
+            "supporting": list(supporting)}
+
+
+CASES = [
+    # Overlapping and nested terms: every one of them must be found
+    ({"max_marks": 3, "ideas": [idea("i1", ["category"], supporting=["cat"]), idea("i2", ["ego"]),
+                                idea("i3", ["aba"], banned=["bab"])]},
+     ["The category is clear", "ababa", "a cat, not a category", "catego"]),
+    ({"max_marks": 2, "ideas": [idea("i1", ["he"], banned=["the end"]), idea("i2", ["the"], supporting=["he"])]},
+     ["the end", "THE END", "he went there", "then"]),
+    # Terms with their own spaces only count inside the answer, never in the padding
+    ({"max_marks": 2, "ideas": [idea("i1", [" a "]), idea("i2", ["cat "], supporting=[" dog"])]},
+     ["a cat", "cat", "I saw a cat and a dog", " dog cat "]),
+    # Wrong-option probes may use the padding: a lone "b" at either end is a wrong choice
+    ({"max_marks": 1, "correct_option": "A", "ideas": [idea("i1", ["photosynthesis"])]},
+     ["b", "B is right", "it is option c", "letter d", "photosynthesis, a", "abc photosynthesis", "a"]),
+    # Empty rubrics and empty terms
+    ({}, ["anything", ""]),
+    ({"max_marks": 2, "ideas": []}, ["anything"]),
+    ({"max_marks": 1, "ideas": [idea("i1", ["", "x"], banned=[""], supporting=[""])]}, ["x marks", "nothing"]),
+]
+
+
+@pytest.mark.parametrize("rubric,answers", CASES)
+def test_compiled_rubric_scores_like_the_legacy_scan(backend, rubric, answers):
+    for answer in answers:
+        assert grade_keyword(answer, rubric) == grade_keyword_legacy(answer, rubric), answer
+
+
+def test_random_rubrics_score_like_the_legacy_scan(backend):
+    rng = random.Random(6)
+    # A tiny alphabet makes overlapping, nested and space-edged terms common
+    def text(low, high):
+        return "".join(rng.choice("ab ") for _ in range(rng.randint(low, high)))
+
+    for _ in range(300):
+        rubric = {
+            "max_marks": rng.randint(1, 4),
+            "correct_option": rng.choice(["", "a", "b"]),
+            "ideas": [idea(f"i{i}", [text(1, 4) for _ in range(3)], [text(2, 5)], [text(1, 3)])
+                      for i in range(rng.randint(0, 4))],
+        }
+        for answer in (text(0, 12) for _ in range(5)):
+            assert grade_keyword(answer, rubric) == grade_keyword_legacy(answer, rubric), (answer, rubric)
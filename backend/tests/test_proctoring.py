@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import time
+
+from proctoring import DetectorPool, pack_frames, unpack_frames
+
+
+def test_packed_frames_carry_capture_times():
+    body = pack_frames([("s1", b"first", 1700000000123), ("s2", b"second")])
+    frames = [(student_id, bytes(image), captured_at) for student_id, image, captured_at in unpack_frames(body)]
+    assert frames == [("s1", b"first", 1700000000123), ("s2", b"second", None)]
+
+
+def test_frames_of_one_student_run_in_order():
+    pool = DetectorPool(size=4, max_pending=64)
+    seen = {}
+    lock = threading.Lock()
+
+    def analyze(frame):
+        student_id, number = frame
+        # Later frames finish sooner, so parallel runs would record them out of order
+        time.sleep(0.02 * (4 - number))
+        with lock:
+            seen.setdefault(student_id, []).append(number)
+        return frame
+
+    frames = [(student_id, number) for number in range(4) for student_id in ("s1", "s2")]
+    results = asyncio.run(pool.map_ordered(analyze, frames, key=lambda frame: frame[0]))
+    pool.shutdown()
+    assert results == frames
+    assert seen == {"s1": [0, 1, 2, 3], "s2": [0, 1, 2, 3]}
@@ -0,0 +1,79 @@
+import storage
+from results_db import GRADING_FIELDS, ResultsDB, migrate
+from storage import ANSWER_FIELDS, INCIDENT_FIELDS, answer_row
+
+
+def answer(section_id, question_id, spoken_answer):
+    return {"student_id": "s1", "subject": "english", "section_id": section_id, "question_id": question_id,
+            "question_number": question_id, "spoken_answer": spoken_answer}
+
+
+def test_latest_answers_keep_the_newest_row_per_question(tmp_path):
+    db = ResultsDB(tmp_path / "results.sqlite3")
+    db.append("answers", ANSWER_FIELDS, [
+        ("s1_2024-05-01", answer_row(answer("reading", "q1", "first"))),
+        ("s1_2024-05-01", answer_row(answer("reading", "q2", "only"))),
+        ("s2_2024-05-01", answer_row(answer("reading", "q1", "someone else"))),
+    ])
+    # Later saves land in their own transactions; q1 in another section is a different question
+    db.append("answers", ANSWER_FIELDS, [("s1_2024-05-01", answer_row(answer("listening", "q1", "other section")))])
+    db.append("answers", ANSWER_FIELDS, [("s1_2024-05-01", answer_row(answer("reading", "q1", "revised")))])
+
+    latest = db.read_latest_answers(ANSWER_FIELDS, "s1_2024-05-01")
+    assert [(a["section_id"], a["question_id"], a["spoken_answer"]) for a in latest] == [
+        ("reading", "q1", "revised"), ("reading", "q2", "only"), ("listening", "q1", "other section"),
+    ]
+    assert [a["spoken_answer"] for a in db.read("answers", ANSWER_FIELDS, "s1_2024-05-01")] == [
+        "first", "only", "other section", "revised",
+    ]
+    assert [a["spoken_answer"] for a in db.read_latest_answers(ANSWER_FIELDS, "s2_2024-05-01")] == ["someone else"]
+
+    db.reset_attempt("s1_2024-05-01")
+    assert db.read_latest_answers(ANSWER_FIELDS, "s1_2024-05-01") == []
+    assert db.read("answers", ANSWER_FIELDS, "s1_2024-05-01") == []
+    assert len(db.read_latest_answers(ANSWER_FIELDS, "s2_2024-05-01")) == 1
+
+
+def write_attempt(folder, graded=True):
+    folder.mkdir()
+    storage.init_student_files(folder)
+    for data in (answer("reading", "q1", "first"), answer("reading", "q2", "a, \"quoted\"\nanswer"),
+                 answer("reading", "q1", "revised")):
+        storage.save_answer_row(folder, data)
+    storage.save_incident_row(folder, {"incident_type": "no_face", "started_at": 1000, "ended_at": 5000,
+                                       "duration_ms": 4000, "count": 3})
+    if graded:
+        storage.save_grading_results(folder, [
+            {"question_id": "q1", "section_id": "reading", "grading_type": "keyword", "max_marks": 2,
+             "auto_score": 1, "final_score": 1.5, "feedback": "partly", "subject": "english", "exam_set": "A"},
+        ])
+        storage.save_summary(folder, {"student_id": folder.name.split("_")[0], "percentage": 75.0,
+                                      "total_score": 1.5, "total_max": 2})
+
+
+def test_migrate_round_trips_result_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "cohort_analytics", None)
+    results = tmp_path / "results"
+    results.mkdir()
+    graded, ungraded = results / "s1_2024-05-01", results / "s2_2024-05-02"
+    write_attempt(graded)
+    write_attempt(ungraded, graded=False)
+    (results / "not-an-attempt").mkdir()
+    db = ResultsDB(tmp_path / "results.sqlite3")
+
+    assert migrate(results, db) == (2, 0)
+
+    for folder in (graded, ungraded):
+        assert db.read_latest_answers(ANSWER_FIELDS, folder.name) == storage.read_answers(folder)
+        assert db.read("answers", ANSWER_FIELDS, folder.name) == storage.read_answer_history(folder)
+        assert db.read("incidents", INCIDENT_FIELDS, folder.name) == storage.read_incidents(folder)
+        assert db.read("grading", GRADING_FIELDS, folder.name) == storage.read_grading(folder)
+        assert db.read_summary(folder.name) == storage.read_summary(folder)
+    assert [attempt for attempt, _, _ in db.iter_results()] == [graded.name]
+    assert not db.has_attempt("not-an-attempt")
+
+    # Already imported attempts are skipped, or replaced (not duplicated) with force
+    assert migrate(results, db) == (0, 2)
+    assert migrate(results, db, force=True) == (2, 0)
+    assert db.read("answers", ANSWER_FIELDS, graded.name) == storage.read_answer_history(graded)
+    assert db.read("grading", GRADING_FIELDS, graded.name) == storage.read_grading(graded)
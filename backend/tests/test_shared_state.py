@@ -0,0 +1,22 @@
+import asyncio
+import threading
+
+from shared_state import SQLiteState
+
+
+def test_sqlite_updates_run_off_the_event_loop(tmp_path):
+    state = SQLiteState(tmp_path / "state.sqlite3")
+
+    def increment(student_id: str, by: int = 1):
+        def apply(record):
+            count = (record or {}).get("count", 0) + by
+            return {"count": count}, threading.get_ident()
+        return state.transact("counts", student_id, apply)
+
+    async def run():
+        threads = await asyncio.gather(*(state.call(increment, "s1", by=2) for _ in range(20)))
+        return set(threads)
+
+    threads = asyncio.run(run())
+    assert threading.get_ident() not in threads
+    assert state.get("counts", "s1") == {"count": 40}
@@ -0,0 +1,83 @@
+import asyncio
+import csv
+import multiprocessing
+
+from storage import (
+    INCIDENT_FIELDS, INCIDENTS_FILE, append_rows, incident_row, init_student_files, read_answer_history,
+    read_answers, read_incidents_file, save_answer_row
+)
+from writer import RowWriter
+
+LEGACY_HEADER = ["incident_type", "details", "question_context"]
+
+
+def write_legacy_incidents(folder, extra_rows=()):
+    with open(folder / INCIDENTS_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(LEGACY_HEADER)
+        writer.writerow(["tab_switch", "left the tab", "q3"])
+        writer.writerows(extra_rows)
+
+
+def episode(kind: str) -> dict:
+    return {"incident_type": kind, "details": "", "question_context": "", "started_at": 10,
+            "ended_at": 20, "duration_ms": 10, "count": 4}
+
+
+def assert_upgraded(folder):
+    with open(folder / INCIDENTS_FILE, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == INCIDENT_FIELDS
+    assert all(len(row) == len(INCIDENT_FIELDS) for row in rows)
+    incidents = read_incidents_file(folder)
+    assert incidents[0]["incident_type"] == "tab_switch"
+    assert incidents[0]["count"] == "1"
+    assert incidents[-1]["incident_type"] == "no_face"
+    assert incidents[-1]["count"] == "4"
+
+
+def test_append_upgrades_legacy_incident_header(tmp_path):
+    write_legacy_incidents(tmp_path)
+    append_rows(tmp_path / INCIDENTS_FILE, INCIDENT_FIELDS, [incident_row(episode("no_face"))])
+    assert_upgraded(tmp_path)
+
+
+def test_writer_upgrades_legacy_incident_header(tmp_path):
+    write_legacy_incidents(tmp_path)
+
+    async def run():
+        writer = RowWriter(flush_interval=0.01)
+        await writer.start()
+        writer.save_incident(tmp_path, episode("no_face"))
+        await writer.flush()
+        await writer.stop()
+
+    asyncio.run(run())
+    assert_upgraded(tmp_path)
+
+
+def test_mixed_file_reads_under_current_header(tmp_path):
+    # Written by a worker that appended episodes before the header upgrade existed
+    write_legacy_incidents(tmp_path, [incident_row(episode("no_face"))])
+    incidents = read_incidents_file(tmp_path)
+    assert None not in incidents[-1]
+    assert incidents[-1]["duration_ms"] == "10"
+
+
+def save_answers(folder, worker: int):
+    for i in range(25):
+        save_answer_row(folder, {"student_id": "s1", "subject": "english", "section_id": "reading",
+                                 "question_id": f"w{worker}q{i}", "spoken_answer": "an answer"})
+
+
+def test_workers_saving_to_one_folder_keep_every_latest_answer(tmp_path):
+    init_student_files(tmp_path)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=save_answers, args=(tmp_path, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(read_answer_history(tmp_path)) == 100
+    assert len(read_answers(tmp_path)) == 100
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from transcription import attach_speech, find_untranscribed, transcript_path
+from uploads import audio_file_name
+
+
+def test_reused_question_id_gets_its_own_sections_transcript(tmp_path):
+    for section_id, text in (("speaking", "spoken answer"), ("interview", "interview answer")):
+        recording = tmp_path / audio_file_name("q1", section_id)
+        recording.write_bytes(b"webm")
+        transcript_path(recording).write_text(json.dumps({"text": text}))
+
+    answers = [{"section_id": "speaking", "question_id": "q1"}, {"section_id": "interview", "question_id": "q1"},
+               {"section_id": "reading", "question_id": "q1"}]
+    attached = attach_speech(tmp_path, answers)
+    assert attached[0]["speech"]["text"] == "spoken answer"
+    assert attached[1]["speech"]["text"] == "interview answer"
+    assert "speech" not in attached[2]
+
+
+def test_recordings_are_named_by_section_and_question(tmp_path):
+    assert audio_file_name("q1") == "speaking_q1.webm"
+    assert audio_file_name("q_1", "interview") == "interview_q_1.webm"
+    with pytest.raises(ValueError):
+        audio_file_name("q1", "my_section")
+
+    folder = tmp_path / "s1_2026-01-01"
+    folder.mkdir()
+    (folder / audio_file_name("q1", "interview")).write_bytes(b"webm")
+    assert [path.name for path in find_untranscribed(tmp_path)] == ["interview_q1.webm"]
@@ -0,0 +1,49 @@
+import asyncio
+import multiprocessing
+
+from uploads import append_stream
+
+
+async def chunks(*parts, delay: float = 0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+def test_retried_final_chunk_is_reported_complete(tmp_path):
+    target = tmp_path / "speaking_q1.webm"
+
+    async def run():
+        await append_stream(chunks(b"abc"), target, 0, False)
+        await append_stream(chunks(b"def"), target, 3, True)
+        return await append_stream(chunks(b"def"), target, 3, True)
+
+    assert asyncio.run(run()) == {"offset": 6, "complete": True}
+    assert target.read_bytes() == b"abcdef"
+
+
+def append_slowly(target, results):
+    async def run():
+        try:
+            await append_stream(chunks(b"de", b"f", delay=0.1), target, 3, False)
+            results.put("appended")
+        except Exception as exc:
+            results.put(type(exc).__name__)
+
+    asyncio.run(run())
+
+
+def test_workers_retrying_one_chunk_append_it_once(tmp_path):
+    target = tmp_path / "speaking_q1.webm"
+    asyncio.run(append_stream(chunks(b"abc"), target, 0, False))
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=append_slowly, args=(target, results)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(results.get() for _ in workers) == ["OffsetMismatch", "appended"]
+    assert (tmp_path / "speaking_q1.webm.part").read_bytes() == b"abcdef"
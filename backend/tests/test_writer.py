@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from storage import ANSWERS_FILE, ANSWERS_LATEST_FILE, init_student_files, read_answers_file
+from writer import RowWriter
+
+
+def answer(question_id: str) -> dict:
+    return {"student_id": "s1", "subject": "english", "section_id": "reading", "question_id": question_id,
+            "spoken_answer": "an answer"}
+
+
+def test_bad_batch_does_not_stop_the_writer(tmp_path):
+    async def run():
+        writer = RowWriter(flush_interval=0.01)
+        await writer.start()
+        init_student_files(tmp_path)
+        (tmp_path / ANSWERS_LATEST_FILE).write_text("{not json")
+        writer.save_answer(tmp_path, answer("q1"))
+        await asyncio.wait_for(writer.flush(), 5)
+
+        (tmp_path / ANSWERS_LATEST_FILE).unlink()
+        writer.save_answer(tmp_path, answer("q2"))
+        await asyncio.wait_for(writer.flush(), 5)
+        assert writer.running
+        await writer.stop()
+
+    asyncio.run(run())
+    assert [row["question_id"] for row in read_answers_file(tmp_path)] == ["q1", "q2"]
+    assert (tmp_path / ANSWERS_FILE).exists()
+
+
+def test_flush_fails_when_writer_is_cancelled(tmp_path):
+    async def run():
+        writer = RowWriter()
+        await writer.start()
+        await asyncio.sleep(0)
+        # Queued behind a writer that is cancelled before it gets to it
+        barrier = asyncio.get_running_loop().create_future()
+        writer.save_answer(tmp_path, answer("q1"))
+        writer._queue.put_nowait(barrier)
+        writer._task.cancel()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(barrier, 5)
+
+    asyncio.run(run())
+
+
+def test_rows_saved_from_another_thread_are_flushed(tmp_path):
+    async def run():
+        writer = RowWriter()
+        await writer.start()
+        init_student_files(tmp_path)
+        await asyncio.to_thread(writer.save_answer, tmp_path, answer("q1"))
+        await asyncio.wait_for(writer.flush(), 5)
+        await writer.stop()
+
+    asyncio.run(run())
+    assert [row["question_id"] for row in read_answers_file(tmp_path)] == ["q1"]
@@ -0,0 +1,296 @@
+"""Offline transcription of saved speaking recordings.
+
+Finished uploads are queued for a small pool of worker threads, each with
+its own local speech model (faster-whisper on the CPU, loaded on first
+use). A worker writes <section_id>_<question_id>.transcript.json next to
+the recording: the model's transcript plus timing features (speaking rate,
+pauses, word confidence) that speaking grading passes to the LLM for the
+pronunciation/fluency categories. The queue is bounded; recordings that
+do not fit, or were saved while transcription was off, are picked up by
+
+    python transcription.py backfill
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from metrics import Counter, Histogram
+from storage import RESULTS_DIR, FOLDER_NAME_PATTERN, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Off by default: faster-whisper is an optional dependency (pip install faster-whisper)
+TRANSCRIPTION_ENABLED = os.getenv("TRANSCRIPTION_ENABLED", "0").lower() in ("1", "true", "yes")
+# faster-whisper model name or local path; base.en transcribes a minute of speech in a few CPU seconds
+TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "base.en")
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "1"))
+# Threads each model uses for inference
+TRANSCRIPTION_THREADS = int(os.getenv("TRANSCRIPTION_THREADS", "2"))
+# Recordings queued or in progress before new ones are left for backfill
+TRANSCRIPTION_MAX_PENDING = int(os.getenv("TRANSCRIPTION_MAX_PENDING", "200"))
+# How long /finish_exam waits for the student's recordings still being transcribed (s)
+TRANSCRIPTION_FINISH_WAIT = float(os.getenv("TRANSCRIPTION_FINISH_WAIT", "10"))
+
+# A gap between words longer than this (s) counts as a pause; LONG_PAUSE and up as a long one
+PAUSE_THRESHOLD = 0.3
+LONG_PAUSE = 1.0
+
+AUDIO_SUFFIX = ".webm"
+TRANSCRIPT_SUFFIX = ".transcript.json"
+
+TRANSCRIBE_TIME = Histogram("transcription_seconds", "Time to transcribe one recording",
+                            buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300))
+TRANSCRIBED_AUDIO = Counter("transcribed_audio_seconds_total", "Seconds of recorded audio transcribed")
+TRANSCRIPTIONS = Counter("transcriptions_total", "Recordings by transcription outcome", ("outcome",))
+
+# (path) -> {"text": str, "duration": float, "words": [(start, end, word, probability), ...]}
+TranscribeFn = Callable[[Path], dict]
+
+
+_models = threading.local()
+
+
+def get_model():
+    """Speech model for the calling thread, loaded on first use."""
+    model = getattr(_models, "model", None)
+    if model is None:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(TRANSCRIPTION_MODEL, device="cpu", compute_type="int8", cpu_threads=TRANSCRIPTION_THREADS)
+        _models.model = model
+    return model
+
+
+def transcribe_audio(path: Path) -> dict:
+    # Greedy decoding keeps up with a cohort on a few cores; VAD skips silence but
+    # timestamps stay relative to the original recording, so pauses are preserved
+    segments, info = get_model().transcribe(
+        str(path), language="en", beam_size=1, word_timestamps=True, vad_filter=True
+    )
+    texts, words = [], []
+    for segment in segments:
+        texts.append(segment.text.strip())
+        words.extend((w.start, w.end, w.word.strip(), w.probability) for w in segment.words or ())
+    return {"text": " ".join(t for t in texts if t), "duration": info.duration, "words": words}
+
+
+def timing_features(words: list, duration: float) -> dict:
+    """Speaking rate and pausing from word timestamps [(start, end, word, probability), ...].
+
+    Rate and pause ratio are measured over the spoken span (first word to
+    last), so silence before the student starts is reported separately as
+    response_delay instead of counting against fluency.
+    """
+    if not words:
+        return {"word_count": 0, "wpm": 0.0, "pause_ratio": 0.0, "pauses": 0, "long_pauses": 0,
+                "mean_pause": 0.0, "response_delay": round(duration, 2), "clarity": 0.0}
+    span = max(words[-1][1] - words[0][0], 1e-6)
+    gaps = [b[0] - a[1] for a, b in zip(words, words[1:])]
+    pauses = [gap for gap in gaps if gap > PAUSE_THRESHOLD]
+    return {
+        "word_count": len(words),
+        "wpm": round(len(words) / span * 60, 1),
+        "pause_ratio": round(sum(pauses) / span, 3),
+        "pauses": len(pauses),
+        "long_pauses": sum(1 for gap in pauses if gap >= LONG_PAUSE),
+        "mean_pause": round(sum(pauses) / len(pauses), 2) if pauses else 0.0,
+        "response_delay": round(words[0][0], 2),
+        "clarity": round(sum(w[3] for w in words) / len(words), 3)
+    }
+
+
+def transcript_path(audio_file: Path) -> Path:
+    return audio_file.with_suffix(TRANSCRIPT_SUFFIX)
+
+
+def transcribe_file(audio_file: Path, transcribe: TranscribeFn = transcribe_audio) -> Optional[dict]:
+    """Transcribe one recording and write its transcript; None if the recording changed meanwhile."""
+    before = audio_file.stat()
+    started = time.perf_counter()
+    raw = transcribe(audio_file)
+    elapsed = time.perf_counter() - started
+    after = audio_file.stat()
+    if (before.st_mtime_ns, before.st_size) != (after.st_mtime_ns, after.st_size):
+        # Re-uploaded while we worked; the job queued for the new upload writes its transcript
+        TRANSCRIPTIONS.labels("stale").inc()
+        return None
+
+    TRANSCRIBE_TIME.observe(elapsed)
+    TRANSCRIBED_AUDIO.inc(raw["duration"])
+    transcript = {
+        "text": raw["text"],
+        "duration": round(raw["duration"], 2),
+        **timing_features(raw["words"], raw["duration"]),
+        "model": TRANSCRIPTION_MODEL,
+        "transcribed_at": datetime.now().isoformat()
+    }
+    with atomic_write(transcript_path(audio_file)) as f:
+        json.dump(transcript, f)
+    TRANSCRIPTIONS.labels("ok").inc()
+    return transcript
+
+
+def read_transcripts(folder: Path) -> dict:
+    """{(section_id, question_id): transcript} for the recordings in a student folder that have one."""
+    transcripts = {}
+    for path in folder.glob(f"*_*{TRANSCRIPT_SUFFIX}"):
+        # Named after the recording, <section_id>_<question_id>; section ids never contain "_"
+        section_id, _, question_id = path.name[:-len(TRANSCRIPT_SUFFIX)].partition("_")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                transcripts[(section_id, question_id)] = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable transcript %s", path)
+    return transcripts
+
+
+def attach_speech(folder: Path, answers: list) -> list:
+    """Add each spoken answer's transcript (as "speech") for grading to use.
+
+    Matched on (section_id, question_id), the key answers_latest.json and
+    the grader use, so a question id reused by another section gets none.
+    """
+    transcripts = read_transcripts(folder)
+    if not transcripts:
+        return answers
+    attached = []
+    for ans in answers:
+        speech = transcripts.get((ans.get("section_id", ""), ans.get("question_id", "")))
+        attached.append({**ans, "speech": speech} if speech is not None else ans)
+    return attached
+
+
+class TranscriptionPool:
+    """Transcribes finished recordings on a fixed set of worker threads, one model each.
+
+    submit() never blocks an upload: beyond max_pending queued or running
+    recordings it returns False and the recording waits for backfill. A
+    recording that is re-uploaded while still queued is only transcribed
+    once, from the newest file.
+    """
+
+    def __init__(self, transcribe: TranscribeFn = transcribe_audio, workers: int = TRANSCRIPTION_WORKERS,
+                 max_pending: int = TRANSCRIPTION_MAX_PENDING):
+        self.transcribe = transcribe
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._futures = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._futures)
+
+    def submit(self, audio_file: Path) -> bool:
+        with self._lock:
+            if audio_file in self._queued:
+                return True
+            if len(self._futures) >= self.max_pending:
+                TRANSCRIPTIONS.labels("rejected").inc()
+                return False
+            self._queued.add(audio_file)
+            future = self._executor.submit(self._run, audio_file)
+            self._futures[audio_file] = future
+        future.add_done_callback(lambda done: self._forget(audio_file, done))
+        return True
+
+    def _run(self, audio_file: Path) -> Optional[dict]:
+        with self._lock:
+            self._queued.discard(audio_file)
+        try:
+            return transcribe_file(audio_file, self.transcribe)
+        except Exception:
+            TRANSCRIPTIONS.labels("failed").inc()
+            logger.exception("Transcription failed for %s", audio_file)
+            return None
+
+    def _forget(self, audio_file: Path, future):
+        with self._lock:
+            if self._futures.get(audio_file) is future:
+                del self._futures[audio_file]
+
+    async def wait(self, folder: Path, timeout: float):
+        """Wait up to timeout seconds for the folder's recordings that are queued or running."""
+        with self._lock:
+            futures = [asyncio.wrap_future(f) for path, f in self._futures.items() if path.parent == folder]
+        if futures and timeout > 0:
+            await asyncio.wait(futures, timeout=timeout)
+
+    def warmup(self, timeout: float = 120):
+        """Load every worker thread's model now instead of on its first recording."""
+        barrier = threading.Barrier(self.workers)
+
+        def build():
+            get_model()
+            try:
+                barrier.wait(timeout)
+            except threading.BrokenBarrierError:
+                pass
+
+        for future in [self._executor.submit(build) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+transcription_pool = TranscriptionPool() if TRANSCRIPTION_ENABLED else None
+
+
+def find_untranscribed(results_dir: Path, force: bool = False) -> list:
+    """Recordings with no transcript, or one older than the recording."""
+    recordings = []
+    for entry in os.scandir(results_dir):
+        if not (entry.is_dir() and FOLDER_NAME_PATTERN.match(entry.name)):
+            continue
+        for audio_file in Path(entry.path).glob(f"*_*{AUDIO_SUFFIX}"):
+            transcript = transcript_path(audio_file)
+            if force or not transcript.exists() or transcript.stat().st_mtime < audio_file.stat().st_mtime:
+                recordings.append(audio_file)
+    return sorted(recordings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="transcribe recordings that have no up-to-date transcript")
+    backfill.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    backfill.add_argument("--workers", type=int, default=TRANSCRIPTION_WORKERS)
+    backfill.add_argument("--force", action="store_true", help="redo recordings that already have a transcript")
+    args = parser.parse_args(argv)
+
+    recordings = find_untranscribed(args.results_dir, args.force)
+    print(f"{len(recordings)} recordings to transcribe")
+    started = time.monotonic()
+    audio_seconds = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="transcribe") as pool:
+        for audio_file, outcome in zip(recordings, pool.map(_backfill_one, recordings)):
+            if isinstance(outcome, Exception):
+                failed += 1
+                print(f"  failed {audio_file}: {outcome!r}")
+            elif outcome is not None:
+                audio_seconds += outcome["duration"]
+    elapsed = time.monotonic() - started
+    print(f"transcribed {audio_seconds / 60:.1f} min of audio in {elapsed:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+def _backfill_one(audio_file: Path):
+    try:
+        return transcribe_file(audio_file)
+    except Exception as exc:
+        return exc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
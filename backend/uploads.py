@@ -0,0 +1,146 @@
+import asyncio
+import fcntl
+import os
+import re
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+AUDIO_CHUNK_SIZE = int(os.getenv("AUDIO_CHUNK_SIZE", str(256 * 1024)))
+AUDIO_MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", str(100 * 1024 * 1024)))
+
+AUDIO_NAME_PATTERN = re.compile(r"^[^/\\\x00]{0,128}$")
+# Section ids name the recording before the first "_", so they may not contain one
+AUDIO_SECTION_PATTERN = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+# Section assumed for uploads that do not name one (the only section clients used to record)
+DEFAULT_AUDIO_SECTION = "speaking"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"upload is at offset {offset}")
+        self.offset = offset
+
+
+def audio_file_name(question_id: str, section_id: str = DEFAULT_AUDIO_SECTION) -> str:
+    """<section_id>_<question_id>.webm, refusing ids that could escape the student folder."""
+    if not AUDIO_NAME_PATTERN.match(question_id) or question_id.startswith("."):
+        raise ValueError("Invalid question ID")
+    if not AUDIO_SECTION_PATTERN.match(section_id):
+        raise ValueError("Invalid section ID")
+    return f"{section_id}_{question_id}.webm"
+
+
+def part_path(target: Path) -> Path:
+    return target.with_name(target.name + ".part")
+
+
+async def upload_chunks(upload) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(AUDIO_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _write_chunks(f, chunks: AsyncIterator[bytes], written: int, limit: int) -> int:
+    batch = []
+    pending = 0
+    async for chunk in chunks:
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge()
+        batch.append(chunk)
+        pending += len(chunk)
+        # Hand writes to a thread in AUDIO_CHUNK_SIZE batches so the loop never blocks on disk
+        if pending >= AUDIO_CHUNK_SIZE:
+            await asyncio.to_thread(f.writelines, batch)
+            batch, pending = [], 0
+    if batch:
+        await asyncio.to_thread(f.writelines, batch)
+    return written
+
+
+async def save_stream(chunks: AsyncIterator[bytes], target: Path, limit: int = AUDIO_MAX_BYTES) -> int:
+    """Write a whole upload to a temp file next to `target` and rename it into place."""
+    temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    f = await asyncio.to_thread(open, temp, "wb")
+    try:
+        size = await _write_chunks(f, chunks, 0, limit)
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, temp, target)
+        return size
+    except BaseException:
+        f.close()
+        temp.unlink(missing_ok=True)
+        raise
+
+
+# One lock per partial file while any request is using it
+_part_locks = weakref.WeakValueDictionary()
+# How often a request waiting for another worker's append retries the file lock (s)
+FILE_LOCK_POLL = 0.01
+
+
+@asynccontextmanager
+async def _file_lock(target: Path):
+    """Exclusive fcntl lock shared with other worker processes, held on a .lock file beside target."""
+    with open(target.with_name(f".{target.name}.lock"), "a") as f:
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(FILE_LOCK_POLL)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def upload_offset(target: Path) -> dict:
+    part = part_path(target)
+    if part.exists():
+        return {"offset": part.stat().st_size, "complete": False}
+    if target.exists():
+        return {"offset": target.stat().st_size, "complete": True}
+    return {"offset": 0, "complete": False}
+
+
+async def append_stream(chunks: AsyncIterator[bytes], target: Path, offset: int, final: bool,
+                        limit: int = AUDIO_MAX_BYTES) -> dict:
+    """Append one chunk of a resumable upload at `offset`.
+
+    The partial file is `<target>.part`; a chunk must start exactly where
+    the partial file ends (otherwise OffsetMismatch carries the offset to
+    resume from), except that offset 0 always starts the upload over. The
+    final chunk renames the partial file over `target`; a chunk retried
+    after that (say the reply to the final one was lost) is answered as
+    complete. The asyncio lock queues requests in this worker, the file
+    lock those of other workers.
+    """
+    part = part_path(target)
+    lock = _part_locks.get(part)
+    if lock is None:
+        lock = _part_locks[part] = asyncio.Lock()
+    async with lock, _file_lock(target):
+        if offset and not part.exists() and target.exists() and offset <= target.stat().st_size:
+            return {"offset": target.stat().st_size, "complete": True}
+        current = part.stat().st_size if part.exists() and offset else 0
+        if offset != current:
+            raise OffsetMismatch(current)
+        f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+        try:
+            # Bytes that arrived before a dropped connection stay; the client resumes after them
+            size = await _write_chunks(f, chunks, current, limit)
+        finally:
+            await asyncio.to_thread(f.close)
+        if final:
+            await asyncio.to_thread(os.replace, part, target)
+        return {"offset": size, "complete": final}
@@ -0,0 +1,224 @@
+import asyncio
+import csv
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+
+from metrics import Counter
+from storage import (
+    ANSWERS_FILE, ANSWERS_LATEST_FILE, INCIDENTS_FILE, ANSWER_FIELDS, INCIDENT_FIELDS, RESULT_TABLES, STORAGE_IO,
+    results_store, answer_row, file_lock, incident_row, save_answer_row, save_incident_row, update_latest_answers,
+    upgrade_csv_header
+)
+
+logger = logging.getLogger(__name__)
+
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", "256"))
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL_MS", "200")) / 1000
+WRITER_MAX_OPEN_FILES = int(os.getenv("WRITER_MAX_OPEN_FILES", "512"))
+# "none": flush to the OS after each batch, "batch": also fsync every file a batch touched
+WRITER_FSYNC = os.getenv("WRITER_FSYNC", "none")
+
+_STOP = object()
+
+WRITE_BATCH_TIME = STORAGE_IO.labels("write_batch")
+ROWS_WRITTEN = Counter("writer_rows_total", "Answer and incident rows written by the background writer", ("table",))
+
+
+class RowWriter:
+    """Background writer for answer and incident rows.
+
+    Handlers enqueue rows without touching the disk; a single writer task
+    groups them into batches (flushed when WRITER_BATCH_SIZE rows are pending
+    or WRITER_FLUSH_INTERVAL has elapsed) and appends them through file handles
+    kept open per student file, or as one transaction per table with the
+    SQLite results backend. flush() is a barrier that resolves once every
+    row enqueued before it is on disk. Rows may also be saved from other
+    threads (shared-state updates persist incident episodes off the event
+    loop); they are queued in the order they were saved.
+    """
+
+    def __init__(self, batch_size: int = WRITER_BATCH_SIZE, flush_interval: float = WRITER_FLUSH_INTERVAL,
+                 fsync: str = WRITER_FSYNC, max_open_files: int = WRITER_MAX_OPEN_FILES):
+        if fsync not in ("none", "batch"):
+            raise ValueError(f"Unknown fsync mode: {fsync}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_open_files = max_open_files
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._loop_thread = None
+        self._handles = OrderedDict()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._close_all)
+
+    def save_answer(self, folder: Path, data: dict):
+        if not self.running:
+            save_answer_row(folder, data)
+            return
+        self._put((folder / ANSWERS_FILE, ANSWER_FIELDS, answer_row(data)))
+
+    def save_incident(self, folder: Path, data: dict):
+        if not self.running:
+            save_incident_row(folder, data)
+            return
+        self._put((folder / INCIDENTS_FILE, INCIDENT_FIELDS, incident_row(data)))
+
+    def _put(self, item: tuple):
+        if threading.get_ident() == self._loop_thread:
+            self._queue.put_nowait(item)
+        else:
+            # asyncio.Queue belongs to the loop; hand the row over instead of touching it from here
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def flush(self):
+        if not self.running:
+            return
+        barrier = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(barrier)
+        await barrier
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = None
+        item = None
+
+        try:
+            while True:
+                item = None
+                timeout = None if not batch else max(0.0, deadline - loop.time())
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+                if isinstance(item, tuple):
+                    if not batch:
+                        deadline = loop.time() + self.flush_interval
+                    batch.append(item)
+                    if len(batch) < self.batch_size:
+                        continue
+
+                if batch:
+                    try:
+                        await asyncio.to_thread(self._write_batch, batch)
+                    except Exception:
+                        # One bad batch must not take the writer (and every later flush()) down with it
+                        logger.exception("Failed to write a batch of %d rows", len(batch))
+                    batch = []
+
+                if item is _STOP:
+                    return
+                if isinstance(item, asyncio.Future) and not item.done():
+                    item.set_result(None)
+        finally:
+            self._fail_waiting(item, batch)
+
+    def _fail_waiting(self, item, batch: list):
+        """Fail flush() barriers the exiting writer will never reach, and report rows it drops."""
+        barriers = [item] if isinstance(item, asyncio.Future) else []
+        dropped = len(batch)
+        while not self._queue.empty():
+            queued = self._queue.get_nowait()
+            if isinstance(queued, asyncio.Future):
+                barriers.append(queued)
+            elif isinstance(queued, tuple):
+                dropped += 1
+        for barrier in barriers:
+            if not barrier.done():
+                barrier.set_exception(RuntimeError("Row writer stopped before flushing"))
+        if dropped:
+            logger.error("Row writer stopped with %d rows unwritten", dropped)
+
+    def _handle(self, path: Path, header: list):
+        f = self._handles.get(path)
+        if f is not None:
+            self._handles.move_to_end(path)
+            return f
+        if len(self._handles) >= self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        upgrade_csv_header(path, header)
+        f = open(path, "a", newline="", encoding="utf-8")
+        if f.tell() == 0:
+            csv.writer(f).writerow(header)
+        self._handles[path] = f
+        return f
+
+    def _write_batch(self, batch: list):
+        with WRITE_BATCH_TIME.time():
+            self._write_rows(batch)
+        for path, _, _ in batch:
+            ROWS_WRITTEN.labels(RESULT_TABLES.get(path.name, path.name)).inc()
+
+    def _write_rows(self, batch: list):
+        if results_store is not None:
+            self._write_batch_db(batch)
+            return
+        grouped = OrderedDict()
+        for path, header, row in batch:
+            grouped.setdefault((path, tuple(header)), []).append(row)
+
+        for (path, header), rows in grouped.items():
+            answers = path.name == ANSWERS_FILE
+            try:
+                with file_lock(path.parent / ANSWERS_LATEST_FILE) if answers else nullcontext():
+                    f = self._handle(path, list(header))
+                    csv.writer(f).writerows(rows)
+                    f.flush()
+                    if self.fsync == "batch":
+                        os.fsync(f.fileno())
+                    if answers:
+                        update_latest_answers(path.parent, rows)
+            except Exception:
+                # e.g. a disk error, or a corrupt answers_latest.json; the other files in the batch still go out
+                logger.exception("Failed to write %d rows to %s", len(rows), path)
+                stale = self._handles.pop(path, None)
+                if stale is not None:
+                    stale.close()
+
+    def _write_batch_db(self, batch: list):
+        grouped = OrderedDict()
+        for path, header, row in batch:
+            grouped.setdefault((RESULT_TABLES[path.name], tuple(header)), []).append((path.parent.name, row))
+
+        for (table, header), rows in grouped.items():
+            try:
+                results_store.append(table, list(header), rows)
+            except Exception:
+                logger.exception("Failed to write %d rows to %s", len(rows), table)
+
+    def _close_all(self):
+        while self._handles:
+            _, f = self._handles.popitem()
+            f.close()
+
+
+row_writer = RowWriter()
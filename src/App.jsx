@@ -496,6 +496,7 @@ export default function App() {
                 <div className="bg-slate-100 rounded-lg p-3 border border-slate-300">
                   <h4 className="text-xs font-semibold text-slate-700 mb-2">Camera Monitor</h4>
                   <CameraMonitor
+                    studentId={studentId}
                     onIncident={(type, payload) => proctoring.handleIncident(type, payload, showWarning)}
                     onSnapshot={proctoring.handleSnapshot}
                     onStatus={(s) => console.log("[Camera]", s)}
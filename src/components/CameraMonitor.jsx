@@ -1,5 +1,5 @@
 import React, { useEffect, useRef, useState } from "react";
-import { API_BASE_URL } from "../config.js";
+import { API_BASE_URL, WS_BASE_URL } from "../config.js";
 
 const PROCTOR_INTERVAL_MS = 2500;
 const SNAPSHOT_INTERVAL_MS = 10000;
@@ -13,11 +13,14 @@ export default function CameraMonitor({
   onSnapshot,
   onStatus,
   useBackend=true,
-  backendUrl=API_BASE_URL
+  backendUrl=API_BASE_URL,
+  streamUrl=WS_BASE_URL,
+  studentId
 }) {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
   const streamRef = useRef(null);
+  const frameSocketRef = useRef(null);
   const [error, setError] = useState(null);
   const [faces, setFaces] = useState(null);
   const [gazeStatus, setGazeStatus] = useState(null);
@@ -95,6 +98,77 @@ export default function CameraMonitor({
     });
   };
 
+  const handleAnalysisRef = useRef(null);
+  const handleAnalysis = (data) => {
+    if (data.error) return;
+    setFaces(data.faces);
+    
+    if (data.faces === 0) {
+      consecutiveNoFaceRef.current++;
+      consecutiveMultipleFacesRef.current = 0;
+      consecutiveGazeAwayRef.current = 0;
+      setGazeStatus(null);
+      if (consecutiveNoFaceRef.current >= NO_FACE_THRESHOLD && canTriggerIncident("no_face")) {
+        onIncident?.("no_face", { ts: data.timestamp });
+      }
+    } else if (data.faces > 1) {
+      consecutiveNoFaceRef.current = 0;
+      consecutiveMultipleFacesRef.current++;
+      consecutiveGazeAwayRef.current = 0;
+      setGazeStatus(null);
+      if (consecutiveMultipleFacesRef.current >= MULTIPLE_FACE_THRESHOLD && canTriggerIncident("multiple_faces")) {
+        onIncident?.("multiple_faces", { ts: data.timestamp, count: data.faces });
+      }
+    } else {
+      consecutiveNoFaceRef.current = 0;
+      consecutiveMultipleFacesRef.current = 0;
+      if (data.flag === "gaze_away") {
+        consecutiveGazeAwayRef.current++;
+        setGazeStatus("away");
+        if (consecutiveGazeAwayRef.current >= GAZE_THRESHOLD && canTriggerIncident("gaze_away")) {
+          onIncident?.("gaze_away", { ts: data.timestamp, yaw: data.yaw, pitch: data.pitch });
+        }
+      } else {
+        consecutiveGazeAwayRef.current = 0;
+        setGazeStatus("ok");
+      }
+    }
+  };
+  handleAnalysisRef.current = handleAnalysis;
+
+  useEffect(() => {
+    if (!active || !useBackend || !studentId) return;
+    let closed = false;
+    let retryTimer = null;
+    let socket = null;
+    
+    // Frames go over a persistent socket; the server answers with one JSON result per analyzed frame
+    const connect = () => {
+      const ws = new WebSocket(`${streamUrl}/stream/${encodeURIComponent(studentId)}`);
+      socket = ws;
+      ws.onopen = () => { frameSocketRef.current = ws; };
+      ws.onmessage = (event) => {
+        try {
+          handleAnalysisRef.current(JSON.parse(event.data));
+        } catch (err) {
+          console.error("Proctor stream message failed:", err);
+        }
+      };
+      ws.onclose = () => {
+        if (frameSocketRef.current === ws) frameSocketRef.current = null;
+        if (!closed) retryTimer = setTimeout(connect, PROCTOR_INTERVAL_MS);
+      };
+      ws.onerror = (err) => console.error("Proctor stream error:", err);
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+      frameSocketRef.current = null;
+    };
+  }, [active, useBackend, studentId, streamUrl]);
+
   useEffect(() => {
     if (!active || !useBackend) return;
     let timer = null;
@@ -104,42 +178,15 @@ export default function CameraMonitor({
       if (!blob) return schedule();
       
       try {
-        const formData = new FormData();
-        formData.append("file", blob, "frame.jpg");
-        const res = await fetch(`${backendUrl}/analyze`, { method: "POST", body: formData });
-        const data = await res.json();
-        
-        setFaces(data.faces);
-        
-        if (data.faces === 0) {
-          consecutiveNoFaceRef.current++;
-          consecutiveMultipleFacesRef.current = 0;
-          consecutiveGazeAwayRef.current = 0;
-          setGazeStatus(null);
-          if (consecutiveNoFaceRef.current >= NO_FACE_THRESHOLD && canTriggerIncident("no_face")) {
-            onIncident?.("no_face", { ts: data.timestamp });
-          }
-        } else if (data.faces > 1) {
-          consecutiveNoFaceRef.current = 0;
-          consecutiveMultipleFacesRef.current++;
-          consecutiveGazeAwayRef.current = 0;
-          setGazeStatus(null);
-          if (consecutiveMultipleFacesRef.current >= MULTIPLE_FACE_THRESHOLD && canTriggerIncident("multiple_faces")) {
-            onIncident?.("multiple_faces", { ts: data.timestamp, count: data.faces });
-          }
+        const ws = frameSocketRef.current;
+        if (ws && ws.readyState === WebSocket.OPEN) {
+          ws.send(blob);
         } else {
-          consecutiveNoFaceRef.current = 0;
-          consecutiveMultipleFacesRef.current = 0;
-          if (data.flag === "gaze_away") {
-            consecutiveGazeAwayRef.current++;
-            setGazeStatus("away");
-            if (consecutiveGazeAwayRef.current >= GAZE_THRESHOLD && canTriggerIncident("gaze_away")) {
-              onIncident?.("gaze_away", { ts: data.timestamp, yaw: data.yaw, pitch: data.pitch });
-            }
-          } else {
-            consecutiveGazeAwayRef.current = 0;
-            setGazeStatus("ok");
-          }
+          const formData = new FormData();
+          formData.append("file", blob, "frame.jpg");
+          if (studentId) formData.append("student_id", studentId);
+          const res = await fetch(`${backendUrl}/analyze`, { method: "POST", body: formData });
+          handleAnalysis(await res.json());
         }
       } catch (err) {
         console.error("Proctor check failed:", err);
@@ -150,7 +197,7 @@ export default function CameraMonitor({
     const schedule = () => { timer = setTimeout(runProctorCheck, PROCTOR_INTERVAL_MS); };
     runProctorCheck();
     return () => clearTimeout(timer);
-  }, [active, useBackend, backendUrl, onIncident]);
+  }, [active, useBackend, backendUrl, studentId, onIncident]);
 
   useEffect(() => {
     if (!active) return;
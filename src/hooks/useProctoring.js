@@ -1,6 +1,9 @@
 import { useState, useRef, useCallback } from "react";
 import { API_BASE_URL } from "../config.js";
 
+// Flags the server derives from frame analysis and persists itself as episodes
+const SERVER_TRACKED = new Set(["no_face", "multiple_faces", "gaze_away"]);
+
 export function useProctoring(studentId) {
   const [incidents, setIncidents] = useState([]);
   const [shots, setShots] = useState([]);
@@ -29,6 +32,7 @@ export function useProctoring(studentId) {
   const registerIncident = useCallback(
     (type, payload = {}, questionContext = "") => {
       setIncidents((prev) => [...prev, { type, questionContext, ...payload }]);
+      if (SERVER_TRACKED.has(type)) return;
       persistIncident(type, payload.message || "", questionContext);
     },
     [persistIncident]
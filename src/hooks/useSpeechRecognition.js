@@ -1,6 +1,52 @@
 import { useState, useRef, useCallback, useMemo, useEffect } from "react";
 import { API_BASE_URL } from "../config.js";
 
+const AUDIO_CHUNK_BYTES = 512 * 1024;
+const AUDIO_MAX_RETRIES = 5;
+
+// Upload a recording in chunks; after a failure, ask the server how much it
+// has and resume from there instead of resending the whole file.
+async function uploadAudio(blob, studentId, sectionId, questionId) {
+  const url = `${API_BASE_URL}/save_audio/${encodeURIComponent(studentId)}/${encodeURIComponent(questionId)}?section_id=${encodeURIComponent(sectionId)}`;
+  let offset = 0;
+  let failures = 0;
+  while (true) {
+    const end = Math.min(offset + AUDIO_CHUNK_BYTES, blob.size);
+    const final = end >= blob.size;
+    try {
+      const res = await fetch(`${url}&offset=${offset}&final=${final}`, {
+        method: "PUT",
+        body: blob.slice(offset, end),
+      });
+      if (res.status === 413) throw Object.assign(new Error("Recording too large"), { fatal: true });
+      if (res.ok || res.status === 409) {
+        const data = await res.json();
+        if (res.ok && data.complete) return;
+        offset = res.ok ? data.offset : data.detail.offset;
+        if (res.ok) {
+          failures = 0;
+          continue;
+        }
+      }
+      throw new Error(`Upload failed with status ${res.status}`);
+    } catch (err) {
+      if (err.fatal || ++failures > AUDIO_MAX_RETRIES) {
+        console.error("Failed to upload recording", err);
+        return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** failures));
+      try {
+        const res = await fetch(url);
+        if (res.ok) {
+          const data = await res.json();
+          if (data.complete && data.offset === blob.size) return;
+          if (!data.complete) offset = data.offset;
+        }
+      } catch {}
+    }
+  }
+}
+
 export function useSpeechRecognition(showWarning) {
   const [status, setStatus] = useState(null);
   const [transcript, setTranscript] = useState("");
@@ -201,14 +247,7 @@ export function useSpeechRecognition(showWarning) {
           const audioBlob = new Blob(audioChunksRef.current, {
             type: "audio/webm",
           });
-          const formData = new FormData();
-          formData.append("file", audioBlob, "speaking.webm");
-          formData.append("student_id", studentId);
-          formData.append("question_id", currentQuestion?.id || "speaking");
-          fetch(`${API_BASE_URL}/save_audio`, {
-            method: "POST",
-            body: formData,
-          });
+          uploadAudio(audioBlob, studentId, activeSection.id, currentQuestion?.id || "speaking");
         }
 
         recorder.stream?.getTracks().forEach((track) => track.stop());